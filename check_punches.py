@@ -149,30 +149,12 @@ def check_and_read_tsv_file():
         print("Unknown error when reading tsv file")
         exit()
 
-# First make sure the selected tsv file exists and is properly formatted
-check_and_read_tsv_file()
-# Next, prompt the user to add more cards and missing controls
-append_tsv_file()
-# Update the correct variables again now that the file has possibly been modified
-check_and_read_tsv_file()
-
-# Done creating input list, now start checking the read backup data
-print("***** Start checking backup log data *****")
-
-# Read all the .csv files in the same directory. 
-# Sort on creation time, oldest first.
-
-# Find all files in current dir and retrieve stats
-file_names = (fn for fn in os.listdir('.'))
-file_info = ((os.stat(name), name) for name in file_names)
-
-# Keep only regular files and insert timestamp
-file_info = ((stat[ST_CTIME], name)
-           for stat, name in file_info if S_ISREG(stat[ST_MODE]))
-
-
-for date, file_name in sorted(file_info):
-    if(file_name.endswith(".csv")):
+def match_punches(file_names, check_list, controls):
+    """Search backup CSV files for punches by the SI-cards at the controls in check_list.
+    Controls that have punches in any of the files are removed from the set controls.
+    Returns a list of (si_card, control, punch_time, file_name) for the matches."""
+    matches = []
+    for file_name in file_names:
         with open(file_name, newline='') as csvfile:
             si_reader = csv.reader(csvfile, delimiter=';')
             si_reader.__next__()
@@ -184,20 +166,44 @@ for date, file_name in sorted(file_info):
                     check_card = check[0]
                     check_control = check[1]
                     if check_control == control and check_card == si_card:
-                        punch_time = row[3]
-                        print ("Match on card: " + '{:8}'.format(int(si_card)) + 
-                               " control: " + '{:3}'.format(control) + 
-                               " time: " + punch_time + 
-                               " file: " + file_name)
+                        matches.append((si_card, control, row[3], file_name))
+    return matches
 
-if len(controls) > 0:
-    print("Missing logs from the following controls:")
-    for code in sorted(controls):
-        print(code)
 
+if __name__ == '__main__':
+    # First make sure the selected tsv file exists and is properly formatted
+    check_and_read_tsv_file()
+    # Next, prompt the user to add more cards and missing controls
+    append_tsv_file()
+    # Update the correct variables again now that the file has possibly been modified
+    check_and_read_tsv_file()
 
-print("***** Script finished *****")
-        
+    # Done creating input list, now start checking the read backup data
+    print("***** Start checking backup log data *****")
 
+    # Read all the .csv files in the same directory. 
+    # Sort on creation time, oldest first.
 
-        
+    # Find all files in current dir and retrieve stats
+    file_names = (fn for fn in os.listdir('.'))
+    file_info = ((os.stat(name), name) for name in file_names)
+
+    # Keep only regular files and insert timestamp
+    file_info = ((stat[ST_CTIME], name)
+               for stat, name in file_info if S_ISREG(stat[ST_MODE]))
+
+    csv_files = [file_name for date, file_name in sorted(file_info)
+                 if file_name.endswith(".csv")]
+    for si_card, control, punch_time, file_name in match_punches(csv_files, check_list, controls):
+        print ("Match on card: " + '{:8}'.format(int(si_card)) + 
+               " control: " + '{:3}'.format(control) + 
+               " time: " + punch_time + 
+               " file: " + file_name)
+
+    if len(controls) > 0:
+        print("Missing logs from the following controls:")
+        for code in sorted(controls):
+            print(code)
+
+
+    print("***** Script finished *****")
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+#
+#    Copyright (C)    2026  Per Magnusson <per.magnusson@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+si_benchmark.py
+Benchmarks of the protocol, decoding and export code in sireader2 and of the
+matching in check_punches.py. No station is needed, the benchmarks run on
+synthetic data shaped like what the stations send (see siemulator.py).
+
+si_benchmark.py                        run all benchmarks
+si_benchmark.py --filter decode        only run benchmarks with 'decode' in the name
+si_benchmark.py --save results.json    save the results
+si_benchmark.py --compare base.json    compare the results with saved results
+
+The import_ benchmarks start a new Python interpreter for each call, and report
+the time to start it and import sireader2 (or a script) as us/call. Compare with
+startup_python, which only starts the interpreter.
+
+For each benchmark, the number of items (frames, cards, records etc) processed
+per second is reported, together with the peak memory allocated while processing
+one batch of items and the memory still allocated after it.
+"""
+
+from sireader2 import SIReader, SIFrameParser, SILegacyFrameParser
+from check_punches import match_punches
+from siemulator import (card_image, course, frame, backup_record_extended,
+                        backup_record_legacy, legacy_frame, legacy_trans_rec)
+from datetime import datetime, timedelta
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import timeit
+import tracemalloc
+
+
+class BytesSerial(object):
+    """Serial port like object that returns the given bytes, used to benchmark
+    the parsing of frames without a station."""
+
+    port = 'benchmark'
+    name = 'benchmark'
+    baudrate = 38400
+    timeout = 2
+
+    def __init__(self, data=b''):
+        self._data = data
+        self._pos = 0
+
+    def rewind(self):
+        self._pos = 0
+
+    def read(self, size=1):
+        ret = self._data[self._pos:self._pos+size]
+        self._pos += size
+        return ret
+
+    def inWaiting(self):
+        return max(0, len(self._data) - self._pos)
+
+    def write(self, data):
+        return len(data)
+
+    def flushInput(self):
+        self._pos = len(self._data)
+
+    def flushOutput(self):
+        pass
+
+    def close(self):
+        pass
+
+
+#####################################################
+# Benchmarks
+
+def make_benchmarks(tmpdir):
+    """Create the benchmarks.
+    @param tmpdir: directory for files written by the benchmarks
+    @return:       list of (name, items per call, function)
+    """
+    rnd = random.Random(1)
+    benchmarks = []
+    now = datetime.now().replace(microsecond=0)
+
+    # CRC of a card block reply
+    block = bytes(rnd.getrandbits(8) for i in range(128))
+    body = SIReader.C_GET_SI9 + b'\x83\x00\x1F\x00' + block
+    benchmarks.append(('crc_block', 1, lambda: SIReader._crc(body)))
+
+    # Parsing of frames
+    si = SIReader(serial=BytesSerial(), noconnect=True)
+    blocks = BytesSerial(b''.join(frame(SIReader.C_GET_SI9, b'\x00' + block)
+                                  for i in range(20)))
+    def read_blocks():
+        si._serial = blocks
+        blocks.rewind()
+        for i in range(20):
+            si._read_command()
+    benchmarks.append(('read_command_block', 20, read_blocks))
+
+    punches = BytesSerial(b''.join(
+        frame(SIReader.C_TRANS_REC,
+              (8000000 + i).to_bytes(4, 'big') + bytes([0x03, 0x10, i, 0]) +
+              (0x100 + 8*i).to_bytes(3, 'big'))
+        for i in range(100)))
+    def read_punches():
+        si._serial = punches
+        punches.rewind()
+        for i in range(100):
+            si._read_command()
+    benchmarks.append(('read_command_punch', 100, read_punches))
+
+    # The same with metrics enabled
+    si_metrics = SIReader(serial=BytesSerial(), noconnect=True, metrics=True)
+    def read_punches_metrics():
+        si_metrics._serial = punches
+        punches.rewind()
+        for i in range(100):
+            si_metrics._read_command()
+    benchmarks.append(('read_command_punch_metrics', 100, read_punches_metrics))
+
+    # The same punches split in 64 byte reads, parsed by SIFrameParser
+    stream = punches._data
+    chunks = [stream[i:i+64] for i in range(0, len(stream), 64)]
+    def parse_punches():
+        parser = SIFrameParser()
+        for chunk in chunks:
+            parser.feed(chunk)
+            parser.frames()
+    benchmarks.append(('parse_frames_punch', 100, parse_punches))
+
+    # Legacy autosend punches, DLE escaped, in 64 byte reads
+    legacy = b''.join(legacy_frame(SIReader.BC_TRANS_REC2,
+                                   legacy_trans_rec(31, 8000000 + i, now, 0x100 + 8*i))
+                      for i in range(100))
+    legacy_chunks = [legacy[i:i+64] for i in range(0, len(legacy), 64)]
+    def parse_legacy():
+        parser = SILegacyFrameParser()
+        for chunk in legacy_chunks:
+            parser.feed(chunk)
+            parser.frames()
+    benchmarks.append(('parse_legacy_punch', 100, parse_legacy))
+
+    # Card numbers of all card series
+    cardnrs = [b'\x00' + n.to_bytes(3, 'big') for n in
+               [rnd.randrange(1, 65000) for i in range(25)] +
+               [rnd.randrange(200001, 465000) for i in range(25)] +
+               [rnd.randrange(500000, 9999999) for i in range(50)]]
+    def decode_cardnrs():
+        for n in cardnrs:
+            SIReader._decode_cardnr(n)
+    benchmarks.append(('decode_cardnr', len(cardnrs), decode_cardnrs))
+
+    # Card data, with a typical number of punches for each card type
+    for card_type, cardnr, count in (('SI5', 212345, 25), ('SI6', 654321, 30),
+                                     ('SI8', 2123456, 30), ('SI9', 1123456, 18),
+                                     ('pCard', 4123456, 20), ('SI10', 8123456, 40)):
+        data = card_image(card_type, cardnr, course(count), now - timedelta(hours=3),
+                          now - timedelta(hours=2), now - timedelta(hours=3, minutes=5))
+        benchmarks.append(('decode_carddata_' + card_type, 1,
+                           lambda data=data, card_type=card_type:
+                           SIReader._decode_carddata(data, card_type, now)))
+
+    # Backup memory, 1000 punches
+    times = [now - timedelta(hours=4) + timedelta(seconds=13*i) for i in range(1000)]
+    cards = [rnd.randrange(500000, 9999999) for i in range(1000)]
+    bak_ext = b''.join(backup_record_extended(c, t) for c, t in zip(cards, times))
+    benchmarks.append(('decode_backup_extended', 1000,
+                       lambda: SIReader._decode_backup(bak_ext, True, now)))
+    cards_legacy = [rnd.randrange(2, 5)*100000 + rnd.randrange(1, 65000) for i in range(1000)]
+    bak_leg = b''.join(backup_record_legacy(c, t) for c, t in zip(cards_legacy, times))
+    benchmarks.append(('decode_backup_legacy', 1000,
+                       lambda: SIReader._decode_backup(bak_leg, False, now)))
+
+    # Export to CSV
+    backup = SIReader._decode_backup(bak_ext, True, now)
+    csvname = os.path.join(tmpdir, 'backup.csv')
+    benchmarks.append(('write_backup_csv', len(backup),
+                       lambda: si.write_backup_csv(backup, code=31, serno=123456,
+                                                   mode='Control', filename=csvname,
+                                                   readtime=now)))
+
+    # Matching of cards and controls in check_punches.py, 20 stations
+    files = []
+    for code in range(31, 51):
+        data = [(t, c, '') for t, c in zip(times[:500], cards[:500])]
+        files.append(si.write_backup_csv(data, code=code, serno=100000+code, mode='Control',
+                                         filename=os.path.join(tmpdir, 'check_%d.csv' % code),
+                                         readtime=now))
+    check_list = [[str(cards[i*5]), 31 + i % 30] for i in range(100)]
+    check_controls = set(check[1] for check in check_list)
+    benchmarks.append(('check_punches_join', 20*500,
+                       lambda: match_punches(files, check_list, set(check_controls))))
+
+    # Start of a program, in a new interpreter. The modules are compiled by the
+    # first run, like when they are installed.
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name, code in (('startup_python', 'pass'),
+                       ('import_sireader2', 'from sireader2 import SIReader, SIReaderException'),
+                       ('import_sireader2_all', 'from sireader2 import *'),
+                       ('import_si_read_backup', 'import si_read_backup')):
+        run = lambda code=code: subprocess.run([sys.executable, '-c', code], cwd=here,
+                                               env=env, check=True)
+        run()
+        benchmarks.append((name, 1, run))
+
+    return benchmarks
+
+
+def measure(fn, items, repeat):
+    """Measure the speed and memory usage of a benchmark.
+    @return: dict with the results
+    """
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat, number)) / number
+
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    result = fn()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+
+    return {'items_per_call': items,
+            'items_per_s': items / best,
+            'us_per_call': best * 1e6,
+            'peak_kib': (peak - base) / 1024.0,
+            'retained_bytes': current - base}
+
+
+def compare(results, baseline, threshold):
+    """Print a comparison with the baseline.
+    @return: number of benchmarks that are slower than the baseline by more
+             than threshold percent
+    """
+    slower = 0
+    print('')
+    print('%-26s %12s %12s %8s' % ('Compared to baseline', 'items/s', 'baseline', 'change'))
+    for name, res in results.items():
+        if name not in baseline:
+            print('%-26s %12.0f %12s' % (name, res['items_per_s'], '-'))
+            continue
+        base = baseline[name]['items_per_s']
+        change = 100.0 * (res['items_per_s'] - base) / base
+        flag = ''
+        if change < -threshold:
+            flag = ' SLOWER'
+            slower += 1
+        elif change > threshold:
+            flag = ' faster'
+        print('%-26s %12.0f %12.0f %+7.1f%%%s' % (name, res['items_per_s'], base, change, flag))
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks of sireader2.')
+    parser.add_argument('--filter', default='', help='only run benchmarks containing this')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of timing runs, the best is used (default: 5)')
+    parser.add_argument('--save', metavar='FILE', help='save the results as JSON')
+    parser.add_argument('--compare', metavar='FILE', help='compare with saved results')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='percent change reported as slower/faster (default: 10)')
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='si_benchmark_')
+    try:
+        results = {}
+        print('%-26s %12s %10s %10s %10s' %
+              ('Benchmark', 'items/s', 'us/call', 'peak KiB', 'retained'))
+        for name, items, fn in make_benchmarks(tmpdir):
+            if args.filter not in name:
+                continue
+            res = measure(fn, items, args.repeat)
+            results[name] = res
+            print('%-26s %12.0f %10.1f %10.1f %10d' %
+                  (name, res['items_per_s'], res['us_per_call'], res['peak_kib'],
+                   res['retained_bytes']))
+    finally:
+        shutil.rmtree(tmpdir)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'date': datetime.now().isoformat(timespec='seconds'),
+                       'python': platform.python_version(),
+                       'platform': platform.platform(),
+                       'results': results}, f, indent=2)
+        print('Results saved to ' + args.save)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        if compare(results, baseline, args.threshold) > 0:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
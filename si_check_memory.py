@@ -22,16 +22,31 @@ To select a specific serial port, provide it's name as the first command line
 parameter to the program:
 
 si_check_memory.py COM4
+
+With --hub, the station is used through a running si_hub.py instead, so that
+other programs can use it at the same time:
+
+si_check_memory.py --hub COM4
 """
 
 from sireader2 import SIReader, SIReaderException, byte2int
 import sys
 
 
+hub = '--hub' in sys.argv
+args = [arg for arg in sys.argv[1:] if arg != '--hub']
 try:
-    if len(sys.argv) > 1:
+    si = None
+    if hub:
+        # Use the station through si_hub.py if the hub is running. Only
+        # imported when needed, it loads most of sireader2.
+        from si_hub import hub_station
+        si = hub_station(args[0] if args else None)
+    if si is not None:
+        print('Using station through si_hub.py')
+    elif args:
         # Use command line argument as serial port name
-        si = SIReader(port = sys.argv[1])
+        si = SIReader(port = args[0])
     else:
         # Find serial port automatically
         si = SIReader()
@@ -76,7 +91,7 @@ while True:
     errmsg = ''
     for ii in range(0, maxretries):
         try:
-            si._update_proto_config()
+            si.update_proto_config()
             ok = True
             break;
         except SIReaderException as msg:
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+#
+#    Copyright (C)    2026  Per Magnusson <per.magnusson@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+si_fleet_prepare.py
+Script to prepare many remote stations with several master stations at once,
+e.g. BSM masters plugged into a USB hub. Each master is handled by a thread of
+its own, which runs the workflow of si_normalize_station.py or 
+si_set_legacy_4800.py on the stations placed at it, as soon as they are placed
+(like the --auto option of those scripts).
+
+si_fleet_prepare.py normalize                    use all masters that are found
+si_fleet_prepare.py legacy4800 COM4 COM5 COM6    use the given masters
+si_fleet_prepare.py normalize --count 150        stop after 150 stations
+
+The results of all masters are saved to one CSV file, with the port of the
+master in the last column. The number of stations done at each master is
+printed after each station. A station is only processed once, also if it is 
+placed at another master later. Press Ctrl-C to quit.
+"""
+
+from sireader2 import SIReader, SIReaderException, SIStationStatus
+from si_normalize_station import log_writer, connect
+from serial.serialutil import SerialException
+from datetime import datetime
+import argparse
+import csv
+import queue
+import threading
+import si_normalize_station
+import si_set_legacy_4800
+
+
+# The workflows, functions (si, log, retries) processing the station at a master
+WORKFLOWS = {'normalize': si_normalize_station.process,
+             'legacy4800': si_set_legacy_4800.process}
+
+# Time between checks of the stop flag while waiting for a station, in seconds
+STOP_INTERVAL = 0.5
+
+
+class FleetProgress(object):
+    """Progress of all masters, shared by the threads."""
+
+    def __init__(self, count=None):
+        """@param count: stop when this many stations are done, None to never stop"""
+        self.count = count
+        self.stop = threading.Event()
+        self._lock = threading.Lock()
+        self._claimed = set()   # Serial numbers of stations being processed or done
+        self.done = {}          # Port: number of stations done
+        self.failed = {}        # Port: number of stations that failed
+
+    def claim(self, serno):
+        """Claim a station for processing.
+        @return: False if the station has already been claimed
+        """
+        with self._lock:
+            if serno in self._claimed:
+                return False
+            self._claimed.add(serno)
+            return True
+
+    def finish(self, port, serno, ok):
+        """Record the result of a station.
+        @return: a progress message
+        """
+        with self._lock:
+            if ok:
+                self.done[port] = self.done.get(port, 0) + 1
+            else:
+                # Try again if it is placed at a master again
+                self._claimed.discard(serno)
+                self.failed[port] = self.failed.get(port, 0) + 1
+            total = sum(self.done.values())
+            if self.count is not None and total >= self.count:
+                self.stop.set()
+            return 'Stations done: %d (%s), failed: %d' % (
+                total, ', '.join('%s: %d' % item for item in sorted(self.done.items())),
+                sum(self.failed.values()))
+
+
+def prepare_master(port, process, items, progress, retries):
+    """Process the stations placed at one master until progress.stop is set. 
+    Run in a thread.
+    @param port:    serial port of the master
+    @param process: workflow, see WORKFLOWS
+    @param items:   queue of the log writer
+    """
+    def log(kind, value):
+        if kind == 'row':
+            items.put((kind, value + [port_name]))
+        else:
+            items.put((kind, '%s: %s' % (port_name, value)))
+
+    port_name = port
+    si = connect(port)
+    if si is None:
+        return
+    port_name = si.port
+    serno = None
+    try:
+        while not progress.stop.is_set():
+            new = si.wait_for_station(serno, timeout=STOP_INTERVAL)
+            if new is None:
+                # Keep serno, the station handled last may still be at the master
+                continue
+            serno = new
+            if not progress.claim(serno):
+                log('print', 'Station %d (serial number %d) has already been processed' %
+                    (si._station_code, serno))
+                continue
+            ok = process(si, log, retries)
+            log('print', progress.finish(port_name, serno, ok))
+    except (SIReaderException, SerialException, OSError) as msg:
+        # E.g. the master was unplugged
+        log('print', 'ERROR: %s' % msg)
+    finally:
+        si.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prepare remote Sportident stations with '
+                                     'several master stations at once.')
+    parser.add_argument('workflow', choices=sorted(WORKFLOWS),
+                        help='normalize: as si_normalize_station.py, '
+                        'legacy4800: as si_set_legacy_4800.py')
+    parser.add_argument('ports', nargs='*',
+                        help='serial ports of the masters (default: all that are found)')
+    parser.add_argument('--count', type=int, help='stop after this many stations')
+    parser.add_argument('--retries', type=int, default=5,
+                        help='attempts to process a station (default: 5)')
+    args = parser.parse_args()
+
+    ports = args.ports or SIReader.guessSerialPorts()
+    if not ports:
+        print('No serial ports found.')
+        exit()
+
+    datestr = datetime.now().strftime("%Y-%m-%d_%H.%M.%S")
+    csv_filename = 'Log_fleet_' + args.workflow + '_' + datestr + '.csv'
+    progress = FleetProgress(args.count)
+    with open(csv_filename, 'w', newline='') as csvfile:
+        csvwriter = csv.writer(csvfile, delimiter=';',
+                               quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        csvwriter.writerow(SIStationStatus.CSV_HEADER + ['Port'])
+        items = queue.Queue()
+        writer = threading.Thread(target=log_writer, args=(items, csvfile, csvwriter))
+        writer.start()
+
+        threads = [threading.Thread(target=prepare_master,
+                                    args=(port, WORKFLOWS[args.workflow], items, progress,
+                                          args.retries),
+                                    daemon=True)
+                   for port in ports]
+        for t in threads:
+            t.start()
+        print('Place the stations at the masters. Press Ctrl-C to quit.')
+        try:
+            while any(t.is_alive() for t in threads) and not progress.stop.is_set():
+                progress.stop.wait(STOP_INTERVAL)
+        except KeyboardInterrupt:
+            print('')
+        finally:
+            # The stations being processed are finished first
+            progress.stop.set()
+            for t in threads:
+                t.join()
+            items.put(None)
+            writer.join()
+
+    print('Log file is: %s' % csv_filename)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,599 @@
+#!/usr/bin/env python3
+#
+#    Copyright (C)    2026  Per Magnusson <per.magnusson@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+si_hub.py
+Station hub: a long running process that owns the connections to one or more
+Sportident stations and lets several programs use them at the same time over
+a local socket (a Unix socket, or a named pipe on Windows).
+
+si_hub.py                       open the first station found
+si_hub.py --port COM4 --port COM5
+si_hub.py --socket /run/si_hub.sock --mode readout --partial
+
+Programs connect to the hub with SIHubClient. A station on the hub is used
+through a proxy object that has the same methods and attributes as the
+SIReader object in the hub, e.g.
+
+    from si_hub import SIHubClient
+    si = SIHubClient().station('COM4')
+    si.set_remote()
+    backup = si.read_backup()
+
+The calls of all programs are queued and executed one at a time by the thread
+that owns the station. A program that needs several calls in a row without
+other programs' calls in between can use "with si.exclusive():".
+
+Cards read out and punches received by the stations can be subscribed to:
+
+    for kind, port, data in SIHubClient().subscribe('COM4'):
+        print(kind, data)
+
+When a station in readout mode has subscribers, the hub reads out the inserted
+cards (and beeps unless --no-ack is given) and sends the card data to the
+subscribers. Punches of stations in autosend mode are sent in the same way.
+When a station has no subscribers, the hub does not read anything from it
+unless asked to, so that programs can also poll the station themselves.
+
+si_read_backup.py and si_check_memory.py use a running hub with --hub.
+
+Only the user running the hub can use it. The clients must know a key, which
+the hub writes to a file only readable by that user (see key_file()) and the 
+clients read from there. The socket and the key file are in a directory of 
+that user, $XDG_RUNTIME_DIR or si_hub-<uid> in the temporary directory, and
+the clients only use a key file that belongs to them and that no one else 
+can read. Only the public methods of the readers can be called.
+"""
+
+from sireader2 import (SIReader, SIReaderReadout, SIReaderControl, SIReaderException,
+                       SIReaderTimeout, SIReaderCardChanged)
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+from collections import deque
+from contextlib import contextmanager
+from time import monotonic
+import argparse
+import inspect
+import os
+import queue
+import stat
+import sys
+import tempfile
+import threading
+
+
+if sys.platform.startswith('win'):
+    DEFAULT_ADDRESS = r'\\.\pipe\si_hub'
+elif os.path.isdir(os.environ.get('XDG_RUNTIME_DIR', '')):
+    DEFAULT_ADDRESS = os.path.join(os.environ['XDG_RUNTIME_DIR'], 'si_hub.sock')
+else:
+    # Created by the hub, see private_dir()
+    DEFAULT_ADDRESS = os.path.join(tempfile.gettempdir(), 'si_hub-%d' % os.getuid(),
+                                   'si_hub.sock')
+
+# Arguments forced in calls from the clients: progress output of read_backup()
+# would end up on the console of the hub
+FORCED_ARGUMENTS = {'read_backup': {'progress': 0}}
+
+# Exceptions that are raised again in the client
+EXCEPTIONS = {'SIReaderException': SIReaderException,
+              'SIReaderTimeout': SIReaderTimeout,
+              'SIReaderCardChanged': SIReaderCardChanged}
+
+# Kinds of events that can be subscribed to
+EVENTS = ('cards', 'punches')
+
+
+def key_file(address):
+    """Return the name of the file holding the key of the hub listening on address."""
+    if address.startswith('\\\\'):
+        # Named pipe
+        return os.path.join(tempfile.gettempdir(), address.split('\\')[-1] + '.key')
+    return address + '.key'
+
+
+def read_key(address):
+    """Return the key of the hub listening on address, from key_file().
+    @raise PermissionError: if the file belongs to another user or others 
+                            than the user can access it
+    """
+    with open(key_file(address), 'rb') as f:
+        if hasattr(os, 'getuid'):
+            st = os.fstat(f.fileno())
+            if st.st_uid != os.getuid() or st.st_mode & 0o077:
+                raise PermissionError('The key file %s of the hub can be accessed by '
+                                      'other users' % key_file(address))
+        return f.read()
+
+
+def private_dir(address):
+    """Create the directory si_hub-<uid> of the default Unix socket address in
+    the shared temporary directory if needed, and check that it is the user's
+    own, since another user could have created it first.
+    @raise PermissionError: if the directory belongs to another user or others
+                            than the user can access it
+    """
+    path = os.path.dirname(os.path.abspath(address))
+    if path != os.path.join(tempfile.gettempdir(), 'si_hub-%d' % os.getuid()):
+        return
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise PermissionError('%s, the directory of the socket, can be accessed by other '
+                              'users' % path)
+
+
+#####################################################
+# Hub
+
+class StationWorker(object):
+    """Owns one station. Calls from the clients are put in a queue and executed
+    one at a time by the worker thread, which also polls the station for cards
+    and punches when someone has subscribed to them."""
+
+    def __init__(self, hub, si):
+        self.hub = hub
+        self.si = si
+        self.port = si.port
+        self.info = {'port': si.port, 'class': type(si).__name__,
+                     'methods': [name for name in dir(si)
+                                 if callable(getattr(si, name, None)) and
+                                 not name.startswith('_')]}
+        self._requests = queue.Queue()
+        self._deferred = deque()    # Requests waiting for an exclusive client
+        self._owner = None          # Client with exclusive access
+        self._subscribers = []      # (event queue, kinds, client)
+        self._last_poll = 0
+        self._thread = threading.Thread(target=self._run, name='station ' + si.port,
+                                        daemon=True)
+        self._thread.start()
+
+    def submit(self, client, op, *args):
+        """Queue a request and wait for the reply.
+        @return: ('ok', result) or ('error', exception name, message)
+        """
+        reply = queue.SimpleQueue()
+        self._requests.put((client, op, args, reply))
+        return reply.get()
+
+    def post(self, client, op, *args):
+        """Queue a request without waiting for it to be executed."""
+        self._requests.put((client, op, args, None))
+
+    def _run(self):
+        while True:
+            if self._subscribers and self._owner is None:
+                timeout = max(0.0, self._last_poll + self.hub.poll_interval - monotonic())
+            else:
+                timeout = None
+            try:
+                request = self._requests.get(timeout=timeout)
+            except queue.Empty:
+                request = None
+            if request is not None:
+                if request[1] == 'stop':
+                    break
+                self._handle(request)
+                # Requests from others that waited for an exclusive client
+                while self._owner is None and self._deferred:
+                    self._handle(self._deferred.popleft())
+            if (self._subscribers and self._owner is None and
+                monotonic() - self._last_poll >= self.hub.poll_interval):
+                self._poll()
+        self.si.disconnect()
+
+    def _handle(self, request):
+        client, op, args, reply = request
+        if (self._owner is not None and client is not self._owner and
+            op not in ('disconnect', 'unsubscribe')):
+            self._deferred.append(request)
+            return
+        try:
+            if op == 'call':
+                name, call_args, call_kwargs = args
+                if name not in self.info['methods']:
+                    raise SIReaderException('%s can not be called through the hub' % name)
+                method = getattr(self.si, name)
+                if name in FORCED_ARGUMENTS:
+                    bound = inspect.signature(method).bind(*call_args, **call_kwargs)
+                    bound.arguments.update(FORCED_ARGUMENTS[name])
+                    call_args, call_kwargs = bound.args, bound.kwargs
+                result = ('ok', method(*call_args, **call_kwargs))
+            elif op == 'get':
+                if args[0].startswith('__') or callable(getattr(self.si, args[0])):
+                    raise SIReaderException('%s can not be read through the hub' % args[0])
+                result = ('ok', getattr(self.si, args[0]))
+            elif op == 'lock':
+                self._owner = client
+                result = ('ok', None)
+            elif op == 'unlock':
+                if self._owner is client:
+                    self._owner = None
+                result = ('ok', None)
+            elif op == 'subscribe':
+                events, kinds = args
+                self._subscribers.append((events, kinds, client))
+                result = ('ok', None)
+            elif op in ('unsubscribe', 'disconnect'):
+                if self._owner is client:
+                    self._owner = None
+                self._subscribers = [s for s in self._subscribers if s[2] is not client]
+                result = ('ok', None)
+            else:
+                result = ('error', 'SIReaderException', 'Unknown hub request: %s' % op)
+        except Exception as msg:
+            result = ('error', type(msg).__name__, str(msg))
+        if reply is not None:
+            reply.put(result)
+
+    def _poll(self):
+        """Read cards or punches and send them to the subscribers."""
+        self._last_poll = monotonic()
+        si = self.si
+        try:
+            if isinstance(si, SIReaderReadout):
+                if si.poll_sicard() and si.sicard is not None:
+                    card = si.read_sicard(partial=self.hub.partial)
+                    card['card_type'] = si.cardtype
+                    if self.hub.ack:
+                        si.ack_sicard()
+                    self._publish('cards', card)
+            elif isinstance(si, SIReaderControl):
+                for punch in si.poll_punch(timeout=0):
+                    self._publish('punches', punch)
+        except SIReaderCardChanged:
+            pass
+        except (SIReaderException, SIReaderTimeout) as msg:
+            print('%s: %s' % (self.port, msg))
+
+    def _publish(self, kind, data):
+        for events, kinds, client in self._subscribers:
+            if kind in kinds:
+                events.put((kind, self.port, data))
+
+
+class SIHub(object):
+    """Serves the stations to the clients. Each client connection is handled
+    by a thread of its own."""
+
+    def __init__(self, address=DEFAULT_ADDRESS, authkey=None, mode='auto', ack=True,
+                 partial=False, poll_interval=0.02):
+        """
+        @param address:       Unix socket path or Windows named pipe to listen on
+        @param authkey:       Key (bytes) the clients must know, None for a
+                              random key. It is written to key_file(address).
+        @param mode:          Reader class to open stations with: 'readout'
+                              (SIReaderReadout), 'control' (SIReaderControl),
+                              'plain' (SIReader) or 'auto' to choose from the
+                              configuration of the station.
+        @param ack:           Beep the station when a card has been read for the
+                              subscribers
+        @param partial:       Read cards with read_sicard(partial=True)
+        @param poll_interval: Time in s between polls for cards and punches
+        """
+        self.address = address
+        self.authkey = authkey if authkey is not None else os.urandom(32)
+        self.mode = mode
+        self.ack = ack
+        self.partial = partial
+        self.poll_interval = poll_interval
+        self.stations = {}  # port: StationWorker
+        self._lock = threading.Lock()
+        self._listener = None
+
+    def open_station(self, port=None, **kwargs):
+        """Open a station, unless it is already open.
+        @param port: Serial port, or None for an already open station or the
+                     first station found
+        @return:     StationWorker
+        """
+        with self._lock:
+            if port is None and self.stations:
+                return next(iter(self.stations.values()))
+            if port in self.stations:
+                return self.stations[port]
+            if port is None:
+                si = SIReader(**kwargs)
+            else:
+                si = SIReader(port=port, **kwargs)
+            cls = {'readout': SIReaderReadout, 'control': SIReaderControl,
+                   'plain': SIReader}.get(self.mode)
+            if cls is None:
+                if si.proto_config['mode'] == SIReader.M_READOUT:
+                    cls = SIReaderReadout
+                elif si.proto_config['auto_send']:
+                    cls = SIReaderControl
+                else:
+                    cls = SIReader
+            if cls is not SIReader:
+                # Reconnect over the same serial port with the right class
+                ser = si._serial
+                si._serial = None
+                si = cls(serial=ser, **kwargs)
+            return self.add_reader(si)
+
+    def add_reader(self, si):
+        """Serve an already connected reader.
+        @return: StationWorker
+        """
+        worker = StationWorker(self, si)
+        self.stations[si.port] = worker
+        return worker
+
+    def serve_forever(self):
+        if not self.address.startswith('\\\\'):
+            private_dir(self.address)
+            if os.path.exists(self.address):
+                # Left behind by a hub that was not shut down
+                os.unlink(self.address)
+        self._write_key()
+        self._listener = Listener(self.address, authkey=self.authkey)
+        while True:
+            try:
+                conn = self._listener.accept()
+            except AuthenticationError:
+                # A client without the key
+                continue
+            except OSError:
+                if self._listener is None:
+                    break
+                continue
+            threading.Thread(target=self._client, args=(conn,), daemon=True).start()
+
+    def close(self):
+        listener = self._listener
+        self._listener = None
+        if listener is not None:
+            listener.close()
+            try:
+                os.unlink(key_file(self.address))
+            except OSError:
+                pass
+        for worker in list(self.stations.values()):
+            worker.post(None, 'stop')
+
+    def _write_key(self):
+        """Write the key to a new file that only the user can read."""
+        name = key_file(self.address)
+        if os.path.lexists(name):
+            # Left behind, or planted by someone else
+            os.unlink(name)
+        fd = os.open(name, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 
+                     0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(self.authkey)
+
+    def _client(self, conn):
+        client = object()   # Identifies the client in the station workers
+        try:
+            while True:
+                msg = conn.recv()
+                op = msg[0]
+                try:
+                    if op == 'stations':
+                        reply = ('ok', [w.info for w in self.stations.values()])
+                    elif op == 'open':
+                        reply = ('ok', self.open_station(msg[1], **msg[2]).info)
+                    elif op == 'subscribe':
+                        self._stream(conn, client, self.open_station(msg[1]), msg[2])
+                        return
+                    elif msg[1] in self.stations:
+                        reply = self.stations[msg[1]].submit(client, op, *msg[2:])
+                    else:
+                        reply = ('error', 'SIReaderException', 'Station %s is not open' % msg[1])
+                except Exception as e:
+                    reply = ('error', type(e).__name__, str(e))
+                try:
+                    conn.send(reply)
+                except (TypeError, AttributeError) as e:
+                    # The result could not be pickled
+                    conn.send(('error', 'SIReaderException', 'Cannot send the result: %s' % e))
+        except (EOFError, OSError):
+            pass
+        finally:
+            for worker in list(self.stations.values()):
+                worker.post(client, 'disconnect')
+            conn.close()
+
+    def _stream(self, conn, client, worker, kinds):
+        """Send the subscribed events to the client until it disconnects."""
+        events = queue.SimpleQueue()
+        worker.submit(client, 'subscribe', events, tuple(kinds))
+        conn.send(('ok', worker.info))
+        while True:
+            conn.send(events.get())
+
+
+#####################################################
+# Client
+
+class SIHubClient(object):
+    """Connection to a running si_hub.py."""
+
+    def __init__(self, address=DEFAULT_ADDRESS, authkey=None):
+        """
+        @param address: Address of the hub
+        @param authkey: Key of the hub, None to read it from key_file(address)
+        """
+        self.address = address
+        self.authkey = authkey if authkey is not None else read_key(address)
+        self._conn = Client(address, authkey=self.authkey)
+        self._lock = threading.Lock()
+
+    def request(self, *msg):
+        with self._lock:
+            self._conn.send(msg)
+            reply = self._conn.recv()
+        if reply[0] == 'ok':
+            return reply[1]
+        raise EXCEPTIONS.get(reply[1], SIReaderException)(reply[2])
+
+    def stations(self):
+        """Return a list of dicts with information about the open stations."""
+        return self.request('stations')
+
+    def station(self, port=None, **kwargs):
+        """Return a proxy of a station, which is opened by the hub if needed.
+        @param port:   Serial port, or None for the first station of the hub
+        @param kwargs: Parameters to SIReader if the hub has to open the station
+        """
+        return SIHubStation(self, self.request('open', port, kwargs))
+
+    def subscribe(self, port=None, kinds=EVENTS):
+        """Subscribe to cards and/or punches of a station.
+        @return: iterator of (kind, port, data) where data is the card data as
+                 returned by read_sicard() with the card type added as
+                 'card_type', or a punch (cardnr, time) as returned by
+                 poll_punch()
+        """
+        conn = Client(self.address, authkey=self.authkey)
+        conn.send(('subscribe', port, tuple(kinds)))
+        reply = conn.recv()
+        if reply[0] != 'ok':
+            conn.close()
+            raise EXCEPTIONS.get(reply[1], SIReaderException)(reply[2])
+        return SIHubSubscription(conn)
+
+    def close(self):
+        self._conn.close()
+
+
+class SIHubSubscription(object):
+    """Iterator of the events of a subscription."""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return self._conn.recv()
+        except (EOFError, OSError):
+            raise StopIteration
+
+    def poll(self, timeout=0):
+        """Return the next event, or None if there is none within timeout seconds."""
+        if self._conn.poll(timeout):
+            return next(self)
+        return None
+
+    def close(self):
+        self._conn.close()
+
+
+class SIHubStation(object):
+    """Proxy of an SIReader object in the hub. Methods are called and
+    attributes are read in the hub. Class constants like M_READOUT are taken
+    from SIReader directly."""
+
+    # Methods that only use attributes of the reader, and are better run
+    # locally, e.g. so that files end up in the current directory.
+    LOCAL_METHODS = ('write_backup_csv',)
+
+    def __init__(self, client, info):
+        self._hub = client
+        self._hub_info = info
+        self.port = info['port']
+
+    def __getattr__(self, name):
+        if name.startswith('_hub'):
+            raise AttributeError(name)
+        if name in SIHubStation.LOCAL_METHODS:
+            return getattr(SIReader, name).__get__(self)
+        if name in self._hub_info['methods']:
+            def call(*args, **kwargs):
+                return self._hub.request('call', self.port, name, args, kwargs)
+            call.__name__ = name
+            return call
+        if name.isupper() and hasattr(SIReader, name):
+            return getattr(SIReader, name)
+        return self._hub.request('get', self.port, name)
+
+    def lock(self):
+        """Get exclusive access to the station. The calls of other clients are
+        queued until unlock() is called or this client disconnects."""
+        self._hub.request('lock', self.port)
+
+    def unlock(self):
+        self._hub.request('unlock', self.port)
+
+    @contextmanager
+    def exclusive(self):
+        self.lock()
+        try:
+            yield self
+        finally:
+            self.unlock()
+
+    def subscribe(self, kinds=EVENTS):
+        return self._hub.subscribe(self.port, kinds)
+
+
+def hub_station(port=None, address=DEFAULT_ADDRESS, authkey=None):
+    """Return a proxy of a station on a running hub, or None if no hub is running.
+    @param port: Serial port, or None for the first station of the hub
+    """
+    try:
+        client = SIHubClient(address, authkey)
+    except (OSError, EOFError):
+        return None
+    return client.station(port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Share Sportident stations between programs.')
+    parser.add_argument('--socket', default=DEFAULT_ADDRESS,
+                        help='Unix socket or named pipe to listen on (default: %s)' %
+                        DEFAULT_ADDRESS)
+    parser.add_argument('--port', action='append', default=[],
+                        help='serial port of a station to open at start, can be repeated '
+                        '(default: the first station found)')
+    parser.add_argument('--mode', choices=('auto', 'readout', 'control', 'plain'),
+                        default='auto', help='how to use the stations (default: from the '
+                        'station configuration)')
+    parser.add_argument('--no-ack', action='store_true',
+                        help='do not beep when a card has been read for the subscribers')
+    parser.add_argument('--partial', action='store_true',
+                        help='only read the card blocks that hold punches')
+    parser.add_argument('--authkey', help='key that the clients must give (default: a '
+                        'random key, that the clients read from a file next to the socket)')
+    args = parser.parse_args()
+
+    hub = SIHub(args.socket, authkey=args.authkey.encode() if args.authkey else None,
+                mode=args.mode, ack=not args.no_ack, partial=args.partial)
+    try:
+        for port in args.port or [None]:
+            worker = hub.open_station(port)
+            print('Opened station on port %s (%s)' % (worker.port, worker.info['class']))
+    except (SIReaderException, SIReaderTimeout) as msg:
+        print('Failed to open station: %s' % msg)
+        exit()
+    print('Listening on %s' % args.socket)
+    try:
+        hub.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        hub.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+#
+#    Copyright (C)    2026  Per Magnusson <per.magnusson@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+si_loadtest.py
+Load test of sireader2 against an emulated station (see siemulator.py).
+
+Readout: runners arrive at a finish line readout station at a given rate with a
+mix of card types. Each runner waits for the station to be free, inserts the
+card and removes it when the station beeps. The readout loop is the same as in
+a normal readout program: poll_sicard(), read_sicard() and ack_sicard().
+
+si_loadtest.py readout --rate 20 --mix SI5:1,SI6:1,SI8:2,SI10:4 --duration 60
+
+Control: a radio control in autosend mode sends punches in bursts, and some of
+the frames are lost on the way. The punches are read with poll_punch(), which
+recovers lost punches from the backup memory of the station.
+
+si_loadtest.py control --burst 50 --interval 5 --loss 0.05 --duration 60
+
+The latency from card insertion (or punch) to decoded result is reported as
+percentiles, together with throughput, errors and lost or recovered punches.
+"""
+
+from sireader2 import (SIReader, SIReaderReadout, SIReaderControl, SIReaderException,
+                       SIReaderTimeout, SIReaderCardChanged)
+from siemulator import SIStationEmulator, course
+from collections import deque
+from datetime import datetime
+from time import monotonic, sleep
+import argparse
+import random
+import threading
+
+
+# First card number of each card type
+CARD_SERIES = {'SI5': 200001, 'SI6': 500000, 'SI8': 2000000, 'SI9': 1000000,
+               'pCard': 4000000, 'SI10': 8000000}
+
+
+def percentile(values, p):
+    """Return the p:th percentile of values (nearest rank)."""
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    k = max(0, min(len(values) - 1, int(round(p / 100.0 * len(values) + 0.5)) - 1))
+    return values[k]
+
+
+def print_latency(name, values):
+    print('%-28s p50 %7.1f ms  p95 %7.1f ms  p99 %7.1f ms  max %7.1f ms' %
+          (name, percentile(values, 50) * 1000, percentile(values, 95) * 1000,
+           percentile(values, 99) * 1000, (max(values) if values else float('nan')) * 1000))
+
+
+def parse_mix(mix):
+    """Parse a card mix like 'SI5:1,SI10:3' into a list of (card_type, weight)."""
+    ret = []
+    for part in mix.split(','):
+        card_type, weight = part.split(':')
+        if card_type not in CARD_SERIES:
+            raise ValueError('Unknown card type: ' + card_type)
+        ret.append((card_type, float(weight)))
+    return ret
+
+
+def finish_line(emu, runners, inserted, stop, remove_delay):
+    """Runners arriving at the readout station. Run in a thread.
+    @param runners:  list of (arrival time, card_type, cardnr, punch count), sorted
+    @param inserted: dict filled in with cardnr: (arrival time, insertion time)
+    """
+    waiting = deque()
+    ii = 0
+    acks = emu.acks
+    acked_at = None
+    max_queue = 0
+    while not stop.is_set():
+        now = monotonic()
+        while ii < len(runners) and runners[ii][0] <= now:
+            waiting.append(runners[ii])
+            ii += 1
+        max_queue = max(max_queue, len(waiting))
+        if emu.card is None:
+            if waiting:
+                arrival, card_type, cardnr, count = waiting.popleft()
+                punches = course(count)
+                emu.insert_card(card_type, cardnr, punches,
+                                punches[0][1].replace(second=0), punches[-1][1],
+                                punches[0][1].replace(second=0, minute=0))
+                inserted[cardnr] = (arrival, emu.inserted_at)
+                acks = emu.acks
+                acked_at = None
+            elif ii >= len(runners):
+                break
+        elif acked_at is None:
+            if emu.acks > acks:
+                acked_at = now
+            elif now - emu.inserted_at > 10:
+                # The station never beeped, the runner gives up
+                emu.remove_card()
+        elif now - acked_at >= remove_delay:
+            emu.remove_card()
+        sleep(0.001)
+    finish_line.max_queue = max_queue
+
+
+def run_readout(args):
+    rnd = random.Random(args.seed)
+    mix = parse_mix(args.mix)
+    emu = SIStationEmulator(mode=SIReader.M_READOUT, baudrate=args.baudrate,
+                            latency=args.latency, realtime=not args.fast)
+    si = SIReaderReadout(serial=emu)
+
+    # Arrivals of runners, Poisson distributed
+    runners = []
+    numbers = dict(CARD_SERIES)
+    start = monotonic() + 0.1
+    t = start
+    while True:
+        t += rnd.expovariate(args.rate / 60.0)
+        if t > start + args.duration:
+            break
+        card_type = rnd.choices([m[0] for m in mix], [m[1] for m in mix])[0]
+        cardnr = numbers[card_type]
+        numbers[card_type] += 1
+        count = min(rnd.randint(args.min_punches, args.max_punches),
+                    SIReader.CARD[card_type]['PM'])
+        runners.append((t, card_type, cardnr, count))
+
+    inserted = {}
+    stop = threading.Event()
+    runner_thread = threading.Thread(target=finish_line,
+                                     args=(emu, runners, inserted, stop, args.remove_delay))
+    runner_thread.start()
+
+    latency = []
+    total = []
+    errors = 0
+    wrong = 0
+    cards = 0
+    try:
+        while runner_thread.is_alive():
+            try:
+                if si.poll_sicard() and si.sicard is not None:
+                    cardnr = si.sicard
+                    card_type = si.cardtype
+                    data = si.read_sicard(partial=args.partial)
+                    si.ack_sicard()
+                    now = monotonic()
+                    arrival, insertion = inserted[cardnr]
+                    latency.append(now - insertion)
+                    total.append(now - arrival)
+                    cards += 1
+                    if data['card_number'] != cardnr:
+                        wrong += 1
+            except SIReaderCardChanged:
+                pass
+            except (SIReaderException, SIReaderTimeout) as msg:
+                errors += 1
+                if args.verbose:
+                    print('Error: %s' % msg)
+            sleep(args.poll_interval)
+    finally:
+        stop.set()
+        runner_thread.join()
+
+    elapsed = monotonic() - start
+    print('Runners:             %d' % len(runners))
+    print('Cards read:          %d (%.1f cards/min)' % (cards, cards * 60.0 / elapsed))
+    print('Wrong card numbers:  %d' % wrong)
+    print('Errors:              %d' % errors)
+    print('Max runners waiting: %d' % getattr(finish_line, 'max_queue', 0))
+    print_latency('Insertion to decoded card', latency)
+    print_latency('Arrival to decoded card', total)
+
+
+def radio_control(emu, stop, args, sent):
+    """A control sending punches in bursts. Run in a thread.
+    @param sent: dict filled in with cardnr: (punch time, lost)
+    """
+    rnd = random.Random(args.seed)
+    cardnr = 500000
+    end = monotonic() + args.duration
+    while monotonic() < end and not stop.is_set():
+        burst = max(1, int(rnd.expovariate(1.0 / args.burst)))
+        gap_left = 0
+        for i in range(burst):
+            if gap_left == 0 and rnd.random() < args.gap_rate:
+                gap_left = rnd.randint(1, args.gap_length)
+            lost = gap_left > 0 or rnd.random() < args.loss
+            if gap_left > 0:
+                gap_left -= 1
+            sent[cardnr] = (monotonic(), lost)
+            emu.punch(cardnr, datetime.now(), send=not lost)
+            cardnr += 1
+            sleep(args.spacing)
+        stop.wait(rnd.expovariate(1.0 / args.interval))
+
+
+def run_control(args):
+    emu = SIStationEmulator(mode=SIReader.M_CONTROL, baudrate=args.baudrate,
+                            latency=args.latency, realtime=not args.fast)
+    si = SIReaderControl(serial=emu)
+
+    sent = {}
+    received = {}
+    duplicates = 0
+    errors = 0
+    stop = threading.Event()
+    control_thread = threading.Thread(target=radio_control, args=(emu, stop, args, sent))
+    start = monotonic()
+    control_thread.start()
+    idle_since = None
+    try:
+        while True:
+            try:
+                punches = si.poll_punch(timeout=args.poll_interval)
+            except (SIReaderException, SIReaderTimeout) as msg:
+                errors += 1
+                if args.verbose:
+                    print('Error: %s' % msg)
+                punches = []
+            now = monotonic()
+            for cardnr, t in punches:
+                if cardnr in received:
+                    duplicates += 1
+                else:
+                    received[cardnr] = now
+            if control_thread.is_alive() or punches:
+                idle_since = None
+            elif idle_since is None:
+                idle_since = now
+            elif now - idle_since > args.drain:
+                break
+    finally:
+        stop.set()
+        control_thread.join()
+
+    elapsed = monotonic() - start
+    lost = [c for c in sent if sent[c][1]]
+    recovered = [c for c in lost if c in received]
+    missing = [c for c in sent if c not in received]
+    # Card numbers that were never punched, i.e. wrongly decoded frames
+    unknown = [c for c in received if c not in sent]
+    live = [received[c] - sent[c][0] for c in sent if c in received and not sent[c][1]]
+    late = [received[c] - sent[c][0] for c in recovered]
+    print('Punches:             %d (%.1f punches/s)' % (len(sent), len(sent) / elapsed))
+    print('Received:            %d' % (len(received) - len(unknown)))
+    print('Lost frames:         %d' % len(lost))
+    print('Recovered:           %d' % len(recovered))
+    print('Missing:             %d' % len(missing))
+    print('Duplicates:          %d' % duplicates)
+    print('Unknown cards:       %d' % len(unknown))
+    print('Errors:              %d' % errors)
+    print_latency('Punch to received (live)', live)
+    print_latency('Punch to recovered', late)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test of sireader2 against an '
+                                     'emulated station.')
+    parser.add_argument('--duration', type=float, default=30, help='seconds (default: 30)')
+    parser.add_argument('--seed', type=int, default=1, help='random seed')
+    parser.add_argument('--baudrate', type=int, default=38400)
+    parser.add_argument('--latency', type=float, default=0.002,
+                        help='station processing time per command in s (default: 0.002)')
+    parser.add_argument('--fast', action='store_true',
+                        help='no serial transfer time, replies are available immediately')
+    parser.add_argument('--poll-interval', type=float, default=0.01,
+                        help='time between polls of the station in s (default: 0.01)')
+    parser.add_argument('--verbose', action='store_true', help='print errors')
+    sub = parser.add_subparsers(dest='scenario', required=True)
+
+    readout = sub.add_parser('readout', help='finish line readout station')
+    readout.add_argument('--rate', type=float, default=20, help='runners per minute')
+    readout.add_argument('--mix', default='SI5:1,SI6:1,SI8:2,SI10:4',
+                         help='card types and weights (default: SI5:1,SI6:1,SI8:2,SI10:4)')
+    readout.add_argument('--min-punches', type=int, default=8)
+    readout.add_argument('--max-punches', type=int, default=30)
+    readout.add_argument('--remove-delay', type=float, default=0.3,
+                         help='time from beep until the card is removed in s (default: 0.3)')
+    readout.add_argument('--partial', action='store_true',
+                         help='only read the card blocks that hold punches')
+
+    control = sub.add_parser('control', help='radio control in autosend mode')
+    control.add_argument('--burst', type=float, default=20,
+                         help='mean number of punches in a burst (default: 20)')
+    control.add_argument('--interval', type=float, default=3,
+                         help='mean time between bursts in s (default: 3)')
+    control.add_argument('--spacing', type=float, default=0.01,
+                         help='time between punches in a burst in s (default: 0.01)')
+    control.add_argument('--loss', type=float, default=0.02,
+                         help='probability that a frame is lost (default: 0.02)')
+    control.add_argument('--gap-rate', type=float, default=0.01,
+                         help='probability that a radio outage starts (default: 0.01)')
+    control.add_argument('--gap-length', type=int, default=20,
+                         help='max number of frames lost in an outage (default: 20)')
+    control.add_argument('--drain', type=float, default=2,
+                         help='time to keep polling after the last punch in s (default: 2)')
+
+    args = parser.parse_args()
+    if args.scenario == 'readout':
+        run_readout(args)
+    else:
+        run_control(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -25,27 +25,38 @@ parameter to the program:
 
 si_normalize_station.py COM4
 
-The following settings are made:
+The following settings are made, but only if they differ from the wanted ones:
 - Clear the backup memory.
 - Set the active time.
-- Set the time to that of the computer.
+- Set the time to that of the computer, compensated for the transfer time
+  (see SIReader.sync_time()).
 - Disable "SI-Card with 192 punches", except for clear stations.
 - Enable optical feedback.
 - Enable audible feedback.
 - Disable autosend on readout stations.
-- Turn the station off.
+The settings are then read back to verify them, and the station is turned off.
+
+With --auto, the stations are processed without pressing any keys, as soon as 
+they are placed at the master station (see SIReader.wait_for_station()). A 
+station that has already been processed is skipped. Press Ctrl-C to quit.
+
+si_normalize_station.py --auto COM4
 
 The progress is saved to a CSV file. Each station that is processed 
-gets two lines in the file; one line with information about the state
-before the changes and a second line with information about the state
-after the changes. 
+gets two lines in the file (see SIStationStatus.csv_row()); one line with 
+information about the state before the changes and a second line with 
+information about the state after the changes. The file is written, and 
+the results are printed, by a separate thread, so that the next station is
+detected meanwhile.
 """
 
-from sireader2 import SIReader, SIReaderException, SIReaderControl, SIReaderReadout
+from sireader2 import SIReader, SIReaderException, SIReaderTimeout, SIStationStatus
 from time import sleep
 from datetime import datetime, timedelta
-import sys
+import argparse
 import csv
+import queue
+import threading
 
 
 #####################################################
@@ -53,203 +64,218 @@ import csv
 active_minutes = 4*60
 #####################################################
 
+# The time of the station is set if it differs more than this from the computer
+TIME_TOLERANCE = timedelta(seconds=0.05)
 
-def get_station_status(si):
-    """Read out some status information from an SI station.
-    @param si: SIReader object
-    @return:   A list with data suitable for writing to a CSV file
+def wanted_changes(status, minutes=None):
+    """Find the settings that differ from the wanted ones.
+    @param status:  SIStationStatus from SIReader.status_snapshot()
+    @param minutes: the wanted active time, default active_minutes
+    @return:        list of (description, function taking an SIReader object)
     """
-    now_time = datetime.now()
-    si_time = si.get_time()
-    time_delta = si_time-now_time
-    ms = timedelta(microseconds=1000)
-    if time_delta >= timedelta(0):
-        time_delta_str = str(time_delta)
-    else:
-        time_delta = -time_delta
-        time_delta_str = '-' + str(time_delta)
-    time_delta_str = time_delta_str[0:-3]  # Truncate to ms
-    si.refresh_sysval()
-
-    serno = si.sysval_serno()
-    model = si.sysval_model_str()
-    build_date = si.sysval_build_date()
-    fwver = si.sysval_fwver()
-    mem_size = si.sysval_mem_size()
-    mem_size_str = "%d K" % mem_size
-    bat_date = si.sysval_battery_date()
-    bat_cap = si.sysval_battery_capacity()
-    bat_cap_str = "%d" % int(round(bat_cap, 0))
-    bat_use = si.sysval_used_battery()
-    bat_use_str = "%4.1f %%" % bat_use
-    volt = si.sysval_volt()
-    volt_str = "%4.2f" % volt
-    code = si.sysval_code()
-    mode = si.sysval_mode_str()
-    active_time = si.sysval_active_time()
-    active_hours = active_time//60
-    active_minutes = active_time%60
-    active_str = "%02d:%02d:00" % (active_hours, active_minutes)
-    protocol = si.sysval_protocol()
-    si6_192 = si.sysval_192_punches()
-    feedback = si.sysval_feedback()
-
-    autosend_str = '-'
-    if protocol & 0b10:
-        autosend_str = 'Autosend'
-
-    legacy_str = 'LegacyProtocol!'
-    if protocol & 0b1:
-        legacy_str = '-'
-
-    if si6_192 is True:
-        si6_192_str = 'Card6With192Records!'
-    elif si6_192 is False:
-        si6_192_str = '-'
-    else:
-        si6_192_str = '0x%02x' % si6_192
-        
-    optical_str = ''
-    if feedback & 0b1:
-        optical_str = 'OpticalSignal1'
-    audible_str = ''
-    if feedback & 0b100:
-        audible_str = 'AcousticSignal'
-
-    date = now_time.strftime("%Y-%m-%d")
-    time = now_time.strftime("%H:%M:%S")
-    
-    row = [date, time, serno, model, fwver, bat_date, bat_use_str, volt_str,
-           code, mode, time_delta_str, active_str, autosend_str, legacy_str,
-           si6_192_str, audible_str, optical_str, build_date, mem_size_str,
-           bat_cap_str ]
-
-    return row
-
-
-try:
-    if len(sys.argv) > 1:
-        # Use command line argument as serial port name
-        si = SIReader(port = sys.argv[1])
-    else:
-        # Find serial port automatically
-        si = SIReader()
-    print('Connected to station on port ' + si.port)
-except SIReaderException as e:
-    print('ERROR: ' + str(e))
-    print('Failed to connect to an SI station on any of the available serial ports.')
-    exit()
-except Exception as e:
-    print('Error: ' + str(e))
-    exit()
-    
-
-# Set station in remote mode
-ok = False
-errmsg = ''
-for ii in range(0,3):
-    try:
-        si.set_direct()
-        sleep(.1)
-        si.set_baud_rate_38400()
-        sleep(.1)
-        si.set_remote()
-        ok = True
-        break;
-    except SIReaderException as msg:
-        print(str(msg))
-        errmsg = msg
-if not ok:
-    print('ERROR: Failed to set station in remote mode: %s' % errmsg)
-    exit()
-
-
-# Create a csv log file 
-datestr = datetime.now().strftime("%Y-%m-%d_%H.%M.%S")
-csv_filename = 'Log_SI_normalize_' + datestr + '.csv'
-with open(csv_filename, 'w', newline='') as csvfile:
-    csvwriter = csv.writer(csvfile, delimiter=';',
-                           quotechar='"', quoting=csv.QUOTE_MINIMAL)
-    # This structure is similar to the log from SI Config+, but lacks some fields,
-    # has some fields in a different order (to put more interesting information 
-    # more to the left on the long rows) and has an extra TimeDiff field.
-    header = ['Date', 'Time', 'SerialNo', 'Hardware', 'Software', 'BatteryDate',
-              'BattUsage', 'Voltage', 'CodeNo', 'Mode', 'TimeDiff', 'OpTime', 'Autosend',
-              'LegacyProtocol', 'Card6with192punches', 'AcousticSignal', 
-              'OpticalSignal1', 'ProductionDate', 'MemorySize', 'BatteryCapacity']
-    csvwriter.writerow(header)
-
-    # Loop over stations
-    print('Ready to normalize remote station.')
-    maxretries = 5
+    if minutes is None:
+        minutes = active_minutes
+    changes = []
+    if status.clock_offset is None or abs(status.clock_offset) > TIME_TOLERANCE:
+        changes.append(('time', lambda si: si.sync_time()))
+    if status.backup_end > 0x100:
+        # The backup memory starts at 0x100
+        changes.append(('backup memory', lambda si: si.erase_backup()))
+    if status.feedback & 0b101 != 0b101:
+        changes.append(('feedback', lambda si: si.set_feedback(True, True)))
+    if status.active_time != minutes:
+        changes.append(('active time', lambda si: si.set_active_time(minutes)))
+    si6_192 = status.mode == "Clear"
+    if status.si6_192 is not si6_192:
+        changes.append(('SI-Card 6 192 punches', lambda si: si.set_si6_192(si6_192)))
+    if status.mode == "Readout" and status.protocol & 0b10:
+        changes.append(('autosend', lambda si: si.set_autosend(False)))
+    return changes
+
+
+def normalize(si, log):
+    """Normalize the settings of the station, verify them and turn the station off.
+    @param log: function taking ('row', CSV row) or ('print', message)
+    @return:    True if the station was normalized
+    """
+    # Read status information from the station
+    status = si.status_snapshot()
+    log('row', status.csv_row())
+
+    code = status.code
+    volt = status.volt
+    log('print', 'code: %3d, volt: %4.2f V, mode: %s' % (code, volt, status.mode))
+    if volt < 3.1:
+        log('print', 'WARNING: VERY low battery: %4.2f V' % volt)
+        si.beep(2)
+    elif volt < 3.2:
+        log('print', 'Warning: low battery: %4.2f V' % volt)
+        si.beep()
+    if status.fwver < "656":
+        log('print', 'WARNING: Old firmware: %s' % status.fwver)
+        si.beep()
+
+    # Normalize the station's settings
+    changes = wanted_changes(status)
+    for name, change in changes:
+        change(si)
+
+    # Read the station's updated settings, write them to the CSV file and check them
+    status = si.status_snapshot()
+    log('row', status.csv_row())
+    failed = [name for name, change in wanted_changes(status)]
+    if failed:
+        log('print', 'ERROR: Station %d: could not set %s' % (code, ', '.join(failed)))
+        return False
+    log('print', '    changed: %s, clock offset: %+.1f ms' % 
+        (', '.join(name for name, change in changes) or '-',
+         status.clock_offset.total_seconds() * 1000))
+
+    # Turn the remote station off
+    si.poweroff()
+    return True
+
+
+def process(si, log, retries):
+    """Normalize the station, with retries.
+    @return: True if the station was normalized
+    """
+    errmsg = ''
+    for ii in range(0, retries):
+        try:
+            return normalize(si, log)
+        except (SIReaderException, SIReaderTimeout) as msg:
+            log('print', str(msg))
+            errmsg = msg
+    log('print', 'ERROR: Failed to talk to the station: %s' % errmsg)
+    log('print', 'Maybe the station is not connected or not awake?')
+    return False
+
+
+def log_writer(items, csvfile, csvwriter):
+    """Write CSV rows and print messages from the queue until None is received. 
+    Run in a thread."""
     while True:
-        inp = input('Press <Enter> to process remote station. Press q to quit: ')
-        if inp == 'q':
+        item = items.get()
+        if item is not None:
+            kind, value = item
+            if kind == 'row':
+                csvwriter.writerow(value)
+                csvfile.flush()
+            else:
+                print(value)
+        items.task_done()
+        if item is None:
             break
-        elif inp == '':
-            pass
+
+
+def connect(port):
+    """Connect to the station and set it in remote mode.
+    @return: SIReader object, None on failure
+    """
+    try:
+        if port is not None:
+            # Use command line argument as serial port name
+            si = SIReader(port = port, adaptive_timeout = True)
         else:
-            print('    Unrecognized input')
-            continue
-
-        # Try a few times if it does not work the first time
-        ok = False
-        errmsg = ''
-        for ii in range(0, maxretries):
-            try:
-                # Read status information from the station
-                row = get_station_status(si)
-                #row = [date, time, serno, model, fwver, bat_date, bat_use_str, volt_str,
-                #       code, mode, time_delta_str, active_str, autosend_str, legacy_str,
-                #       si6_192_str, audible_str, optical_str, build_date, mem_size_str,
-                #       bat_cap_str ]
-                fwver = row[4]
-                volt = float(row[7])
-                code = row[8]
-                mode = row[9]
-                
-                # Write old status to CSV file
-
-                csvwriter.writerow(row)
-
-                print('code: %3d, volt: %4.2f V, mode: %s' % (code, volt, mode))
-                if volt < 3.1:
-                    print('WARNING: VERY low battery: %4.2f V' % volt)
-                    si.beep(2)
-                elif volt < 3.2:
-                    print('Warning: low battery: %4.2f V' % volt)
-                    si.beep
-                if fwver < "656":
-                    print('WARNING: Old firmware: %s' % fwver)
-                    si.beep
-
-    
-                # Normalize the station's settings
-                si.set_time(datetime.now())
-                si.erase_backup()
-                si.set_feedback(True, True)
-                si.set_active_time(active_minutes)
-                if mode == "Clear":
-                    si.set_si6_192(True)
-                else:
-                    si.set_si6_192(False)
-                if mode == "Readout":
-                    si.set_autosend(False)
-
-                # Reead the station's updated settings and write it to the CSV file
-                row = get_station_status(si)
-                csvwriter.writerow(row)
-
-                # Turn the remote station off
-                si.poweroff()
-                
-                ok = True
-                break;
-            except SIReaderException as msg:
-                print(str(msg))
-        if not ok:
-            print('ERROR: Failed to talk to the station: %s' % errmsg)
-            print('Maybe the station is not connected or not awake?')
-            continue
-
-print('Log file is: %s' % csv_filename)
+            # Find serial port automatically
+            si = SIReader(adaptive_timeout = True)
+        print('Connected to station on port ' + si.port)
+    except SIReaderException as e:
+        print('ERROR: ' + str(e))
+        print('Failed to connect to an SI station on any of the available serial ports.')
+        return None
+    except Exception as e:
+        print('Error: ' + str(e))
+        return None
+
+    # Set station in remote mode
+    errmsg = ''
+    for ii in range(0,3):
+        try:
+            si.set_direct()
+            sleep(.1)
+            si.set_baud_rate_38400()
+            sleep(.1)
+            si.set_remote()
+            return si
+        except (SIReaderException, SIReaderTimeout) as msg:
+            print(str(msg))
+            errmsg = msg
+    print('ERROR: Failed to set station in remote mode: %s' % errmsg)
+    return None
+
+
+def run(si, process, csv_prefix, auto, retries):
+    """Process remote stations one at a time, and log them to a new CSV file.
+    @param process:    function (si, log, retries) processing the station at the
+                       master, returning True if successful
+    @param csv_prefix: start of the name of the CSV file
+    @param auto:       process the stations as they are placed at the master if 
+                       True, otherwise when the user presses <Enter>
+    @return:           the name of the CSV file
+    """
+    datestr = datetime.now().strftime("%Y-%m-%d_%H.%M.%S")
+    csv_filename = csv_prefix + datestr + '.csv'
+    with open(csv_filename, 'w', newline='') as csvfile:
+        csvwriter = csv.writer(csvfile, delimiter=';',
+                               quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        csvwriter.writerow(SIStationStatus.CSV_HEADER)
+        items = queue.Queue()
+        writer = threading.Thread(target=log_writer, args=(items, csvfile, csvwriter))
+        writer.start()
+        log = lambda kind, value: items.put((kind, value))
+
+        try:
+            if auto:
+                print('Place the stations at the master one at a time. Press Ctrl-C to quit.')
+                done = set()
+                serno = None
+                while True:
+                    serno = si.wait_for_station(serno)
+                    if serno in done:
+                        log('print', 'Station %d (serial number %d) has already been processed' %
+                            (si._station_code, serno))
+                    elif process(si, log, retries):
+                        done.add(serno)
+                        log('print', '%d stations processed' % len(done))
+            else:
+                print('Ready to process remote station.')
+                while True:
+                    # Let the writer catch up so that the prompt comes last
+                    items.join()
+                    inp = input('Press <Enter> to process remote station. Press q to quit: ')
+                    if inp == 'q':
+                        break
+                    elif inp == '':
+                        process(si, log, retries)
+                    else:
+                        print('    Unrecognized input')
+        except KeyboardInterrupt:
+            print('')
+        finally:
+            items.put(None)
+            writer.join()
+    return csv_filename
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Set up remote Sportident stations '
+                                     'to standard values.')
+    parser.add_argument('port', nargs='?', help='serial port of the master station')
+    parser.add_argument('--auto', action='store_true',
+                        help='process the stations as they are placed at the master, '
+                        'without pressing any keys')
+    parser.add_argument('--retries', type=int, default=5,
+                        help='attempts to process a station (default: 5)')
+    args = parser.parse_args()
+
+    si = connect(args.port)
+    if si is None:
+        exit()
+    csv_filename = run(si, process, 'Log_SI_normalize_', args.auto, args.retries)
+    print('Log file is: %s' % csv_filename)
+
+
+if __name__ == '__main__':
+    main()
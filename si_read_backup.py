@@ -21,91 +21,175 @@ To select a specific serial port, provide it's name as the first command line
 parameter to the program:
 
 si_read_backup.py COM4
+
+With --hub, the station is used through a running si_hub.py instead, so that
+other programs can use it at the same time.
+
+si_read_backup.py --hub COM4
+
+With --auto, the stations are read without pressing any keys. The master 
+station is polled for a remote station (see SIReader.wait_for_station()), and
+a station is read as soon as it is placed at the master, after which the master
+beeps. A station that has already been read is not read again, unless it has 
+new punches. Press Ctrl-C to quit.
+
+si_read_backup.py --auto COM4
 """
 
-from sireader2 import SIReader, SIReaderException
+from sireader2 import SIReader, SIReaderException, SIReaderTimeout
+import argparse
 import sys
 
 
-try:
-    if len(sys.argv) > 1:
-        # Use command line argument as serial port name
-        si = SIReader(port = sys.argv[1])
-    else:
-        # Find serial port automatically
-        si = SIReader()
-    print('Connected to station on port ' + si.port)
-except:
-    print('Failed to connect to an SI station on any of the available serial ports.')
-    exit()
-    
-
-# Set station in remote mode
-ok = False
-errmsg = ''
-for ii in range(0,3):
+def connect(port, hub=False):
+    """Connect to the station, through si_hub.py if hub is True and the hub is running.
+    @return: SIReader object or a hub proxy of one, None on failure
+    """
     try:
-        si.set_remote()
-        ok = True
-        break;
-    except SIReaderException as msg:
-        errmsg = msg
-if not ok:
-    print('ERROR: Failed to set station in remote mode: %s' % errmsg)
-    exit()
-
-
-print('Ready to read backup memory of SI station.')
-maxretries = 5
-while True:
-    inp = input('    Press <Enter> to read remote station, d to read direct station or q to quit: ')
-    if inp == 'q':
-        break
-    elif inp == 'd':
-        if not si.direct:
-            si.set_direct()
-    elif inp == '':
-        if si.direct:
-            si.set_remote()
-    else:
-        print('    Unrecognized input')
-        continue
-        
-    ok = False
+        si = None
+        if hub:
+            # Only imported when needed, it loads most of sireader2
+            from si_hub import hub_station
+            si = hub_station(port)
+        if si is not None:
+            print('Using station through si_hub.py')
+        elif port is not None:
+            # Use command line argument as serial port name
+            si = SIReader(port = port, adaptive_timeout = True)
+        else:
+            # Find serial port automatically
+            si = SIReader(adaptive_timeout = True)
+        print('Connected to station on port ' + si.port)
+        return si
+    except:
+        print('Failed to connect to an SI station on any of the available serial ports.')
+        return None
+
+
+def set_remote(si):
+    """Set station in remote mode.
+    @return: True if successful
+    """
     errmsg = ''
-    for ii in range(0, maxretries):
+    for ii in range(0,3):
         try:
-            si._update_proto_config()
-            ok = True
-            break;
-        except SIReaderException as msg:
+            si.set_remote()
+            return True
+        except (SIReaderException, SIReaderTimeout) as msg:
             errmsg = msg
-    if not ok:
-        print('ERROR: Failed to talk to the station: %s' % errmsg)
-        print('Maybe the station is not connected or not awake?')
-        continue
-        
+    print('ERROR: Failed to set station in remote mode: %s' % errmsg)
+    return False
+
+
+def read_station(si, retries):
+    """Read the backup memory of the station and write it to a CSV file.
+    @return: True if successful
+    """
     if not si.proto_config['mode'] in si.SUPPORTED_READ_BACKUP_MODES:
         print("ERROR: Station is in mode %s, which is not supported for backup readout" % 
               si.MODE2NAME[si.proto_config['mode']])
-        continue
+        return False
 
-    ok = False
-    for ii in range(0, maxretries):
+    errmsg = ''
+    for ii in range(0, retries):
         try:
             print('    Trying to read backup memory of station: ' + str(si._station_code) + ' ', end='')
             sys.stdout.flush()
-            backup = si.read_backup(progress=1)
+            backup = si.read_backup(progress=1, fast_baud=True)
             csvfilename = si.write_backup_csv(backup)
             print(csvfilename + ' was created')
-            ok = True
             si.beep()
-            break
-        except SIReaderException as msg:
+            return True
+        except (SIReaderException, SIReaderTimeout) as msg:
             print('')
             errmsg = msg
-    if not ok:
-        print('ERROR: Failed to talk to the station: %s' % errmsg)
-        print('Maybe the station is not connected, not awake or not in a supported mode?')
-        continue
+    print('ERROR: Failed to talk to the station: %s' % errmsg)
+    print('Maybe the station is not connected, not awake or not in a supported mode?')
+    return False
+
+
+def interactive(si, retries):
+    """Read a station each time the user presses <Enter>."""
+    print('Ready to read backup memory of SI station.')
+    while True:
+        inp = input('    Press <Enter> to read remote station, d to read direct station or q to quit: ')
+        if inp == 'q':
+            break
+        elif inp != 'd' and inp != '':
+            print('    Unrecognized input')
+            continue
+            
+        ok = False
+        errmsg = ''
+        for ii in range(0, retries):
+            try:
+                if inp == 'd' and not si.direct:
+                    si.set_direct()
+                elif inp == '' and si.direct:
+                    si.set_remote()
+                si.update_proto_config()
+                ok = True
+                break;
+            except (SIReaderException, SIReaderTimeout) as msg:
+                errmsg = msg
+        if not ok:
+            print('ERROR: Failed to talk to the station: %s' % errmsg)
+            print('Maybe the station is not connected or not awake?')
+            continue
+
+        read_station(si, retries)
+
+
+def automatic(si, retries):
+    """Read the remote stations as they are placed at the master, until Ctrl-C.
+    A station is identified by its serial number, and is read again only if
+    the end of its used backup memory has grown since it was read.
+    """
+    print('Place the stations at the master one at a time. Press Ctrl-C to quit.')
+    done = {}           # Serial number: end of the backup memory when read
+    serno = None
+    try:
+        while True:
+            serno = si.wait_for_station(serno)
+            try:
+                end = si.sysval_backup_end()
+                if serno in done and end <= done[serno]:
+                    print('    Station %d (serial number %d) has already been read' % 
+                          (si._station_code, serno))
+                    continue
+                if read_station(si, retries):
+                    done[serno] = end
+                    print('    %d stations read' % len(done))
+            except (SIReaderException, SIReaderTimeout) as msg:
+                # E.g. the station was removed, try again when it is placed again
+                print('ERROR: %s' % msg)
+                serno = None
+    except KeyboardInterrupt:
+        print('')
+        print('%d stations read' % len(done))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Read out the backup memories of '
+                                     'Sportident stations.')
+    parser.add_argument('port', nargs='?', help='serial port of the master station')
+    parser.add_argument('--auto', action='store_true',
+                        help='read the stations as they are placed at the master, '
+                        'without pressing any keys')
+    parser.add_argument('--retries', type=int, default=5,
+                        help='attempts to read a station (default: 5)')
+    parser.add_argument('--hub', action='store_true',
+                        help='use the station through si_hub.py if it is running')
+    args = parser.parse_args()
+
+    si = connect(args.port, args.hub)
+    if si is None or not set_remote(si):
+        exit()
+    if args.auto:
+        automatic(si, args.retries)
+    else:
+        interactive(si, args.retries)
+
 
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+#
+#    Copyright (C)    2026  Per Magnusson <per.magnusson@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+si_replay.py
+Script to play back protocol logs, written when the logfile parameter is given
+to SIReader, through the decoding code in sireader2. This makes it possible
+to re-derive card readouts, punches and backup memory contents after a fix in
+the decoding code, and to measure the decoding throughput.
+
+si_replay.py --mode readout event.silog
+si_replay.py --mode control --speed 1 radio.silog
+si_replay.py --mode backup --csv backup.silog
+
+Modes:
+readout - Card insertions are read with _read_command() and the cards with read_sicard().
+control - Punches are read with poll_punch().
+backup  - Backup memory readouts are decoded with read_backup().
+
+Commands in the log that are not part of the replayed operations (e.g. beeps
+and mode changes) are sent again as recorded so that the session can continue.
+"""
+
+from sireader2 import (SIReader, SIReaderReadout, SIReaderControl, SIReplaySerial,
+                       SIProtocolLog, SIReaderException, SIReaderTimeout,
+                       SIReaderCardChanged)
+from itertools import chain
+from time import perf_counter, sleep
+import argparse
+import mmap
+
+
+def parse_frame(frame):
+    """Split a recorded command frame.
+    @param frame: raw frame as written to the station
+    @return:      (wakeup, command, parameters) or None if the frame is not
+                  a normal command frame (e.g. an ACK)
+    """
+    wakeup = frame[0:1] == SIReader.WAKEUP
+    if wakeup:
+        frame = frame[1:]
+    if len(frame) < 6 or frame[0:1] != SIReader.STX or frame[-1:] != SIReader.ETX:
+        return None
+    length = frame[2]
+    if len(frame) != length + 6:
+        return None
+    return (wakeup, frame[1:2], frame[3:3+length])
+
+
+def resend(si, ser):
+    """Send the next recorded command again, so that the session can continue."""
+    frame = ser.pending_writes()[0]
+    parsed = parse_frame(frame)
+    if parsed is None:
+        si._serial.write(frame)
+        return
+    wakeup, command, parameters = parsed
+    try:
+        si._send_command(command, parameters, skipwakeup=not wakeup)
+    except (SIReaderException, SIReaderTimeout, SIReaderCardChanged):
+        pass
+
+
+def recorded_partial(ser):
+    """Find out if the card being read was read with read_sicard(partial=True)
+    when the log was recorded."""
+    writes = ser.pending_writes()
+    if not writes:
+        return False
+    parsed = parse_frame(writes[0])
+    return parsed is not None and parsed[2] != SIReader.P_SI6_CB
+
+
+def replay_readout(si, ser):
+    """Replay card readouts.
+    @return: number of cards read
+    """
+    cards = 0
+    while not ser.done:
+        # poll_sicard() is not used since it only reports state changes, which
+        # would hide a card that is removed and inserted again when replaying
+        # faster than recorded.
+        inserted = False
+        try:
+            si._read_command(timeout=0)
+        except SIReaderCardChanged:
+            inserted = si.sicard is not None
+        except SIReaderTimeout:
+            pass
+        except SIReaderException as msg:
+            print('Error: %s' % msg)
+            continue
+        if inserted:
+            try:
+                card = si.read_sicard(partial=recorded_partial(ser))
+            except SIReaderCardChanged:
+                continue
+            except (SIReaderException, SIReaderTimeout) as msg:
+                print('Error reading card %s: %s' % (si.sicard, msg))
+                continue
+            cards += 1
+            print('Card %d (%s): start %s, finish %s, %d punches' %
+                  (card['card_number'], si.cardtype, card['start'], card['finish'],
+                   len(card['punches'])))
+            for code, tim in card['punches']:
+                print('    %3d %s' % (code, tim.isoformat(sep=' ')))
+        elif ser.inWaiting() == 0:
+            if ser.pending_writes():
+                resend(si, ser)
+            elif not ser.done:
+                # Waiting for the next frame when replaying at recorded speed
+                sleep(0.001)
+    return cards
+
+
+def replay_control(si, ser):
+    """Replay punches sent by a station in autosend mode.
+    @return: number of punches
+    """
+    count = 0
+    while not ser.done:
+        try:
+            punches = si.poll_punch(timeout=0)
+        except (SIReaderException, SIReaderTimeout) as msg:
+            print('Error: %s' % msg)
+            continue
+        for cardnr, tim in punches:
+            print('%8d %s' % (cardnr, tim))
+        count += len(punches)
+        if not punches and ser.inWaiting() == 0:
+            if ser.pending_writes():
+                resend(si, ser)
+            elif not ser.done:
+                sleep(0.001)
+    return count
+
+
+def replay_backup(si, ser, write_csv=False):
+    """Replay backup memory readouts.
+    @return: number of backup records
+    """
+    # read_backup() starts with reading SYS_VAL twice, followed by the reads
+    # of the backup memory.
+    signature = [SIReader.C_GET_SYS_VAL, SIReader.C_GET_SYS_VAL, SIReader.C_GET_BACKUP]
+    count = 0
+    while not ser.done:
+        writes = [parse_frame(f) for f in ser.pending_writes(len(signature))]
+        if [w[1] if w else None for w in writes] == signature:
+            try:
+                backup = si.read_backup()
+            except (SIReaderException, SIReaderTimeout) as msg:
+                print('Error reading backup: %s' % msg)
+                continue
+            count += len(backup)
+            print('Station %s, serial number %d: %d records' %
+                  (si._station_code, si._serno, len(backup)))
+            if write_csv:
+                print('    ' + si.write_backup_csv(backup) + ' was created')
+        elif writes:
+            resend(si, ser)
+        else:
+            # Data the station sent without being asked
+            try:
+                si._read_command()
+            except (SIReaderException, SIReaderTimeout):
+                pass
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play back sireader2 protocol logs.')
+    parser.add_argument('logfile', help='protocol log written by SIReader')
+    parser.add_argument('--mode', choices=('readout', 'control', 'backup'),
+                        default='readout', help='what to decode (default: readout)')
+    parser.add_argument('--speed', type=float, default=0,
+                        help='1 = recorded speed, 10 = ten times faster, '
+                        '0 = as fast as possible (default)')
+    parser.add_argument('--noconnect', action='store_true',
+                        help='the session was recorded with noconnect=True')
+    parser.add_argument('--csv', action='store_true',
+                        help='write CSV files of backup readouts')
+    args = parser.parse_args()
+
+    classes = {'readout': SIReaderReadout, 'control': SIReaderControl, 'backup': SIReader}
+    with open(args.logfile, 'rb') as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    records = SIProtocolLog.iter_records(buf)
+
+    sessions = 0
+    frames = 0
+    nbytes = 0
+    outputs = 0
+    mismatches = 0
+    start = perf_counter()
+    while records is not None:
+        ser = SIReplaySerial(records, speed=args.speed, port=args.logfile)
+        if ser.done:
+            break
+        sessions += 1
+        print('Session %d' % sessions)
+        try:
+            si = classes[args.mode](serial=ser, noconnect=args.noconnect)
+            if args.mode == 'readout':
+                outputs += replay_readout(si, ser)
+            elif args.mode == 'control':
+                outputs += replay_control(si, ser)
+            else:
+                outputs += replay_backup(si, ser, args.csv)
+        except (SIReaderException, SIReaderTimeout) as msg:
+            print('Error: %s' % msg)
+        frames += ser.frames
+        nbytes += ser.bytes
+        mismatches += ser.mismatches
+        if ser.next_session is None:
+            records = None
+        else:
+            records = chain([ser.next_session], records)
+    elapsed = perf_counter() - start
+
+    print('')
+    print('Sessions: %d, frames: %d, bytes: %d, decoded %s: %d' %
+          (sessions, frames, nbytes,
+           {'readout': 'cards', 'control': 'punches', 'backup': 'records'}[args.mode],
+           outputs))
+    if elapsed > 0:
+        print('Replay time: %.3f s, %.0f frames/s, %.1f kB/s' %
+              (elapsed, frames / elapsed, nbytes / elapsed / 1000.0))
+    if mismatches > 0:
+        print('WARNING: %d commands differed from the recorded ones' % mismatches)
+
+
+if __name__ == '__main__':
+    main()
@@ -25,16 +25,26 @@ parameter to the program:
 
 si_set_legacy_4800.py COM4
 
+This is also the way to set a station back to 4800 baud if it was left at 
+38400 baud by an interrupted si_read_backup.py (see SIReader.fast_baud_rate()).
+Place it at the master like any other station.
+
 The following settings are made:
 - Clear the backup memory.
 - Set the active time.
-- Set the time to that of the computer.
+- Set the time to that of the computer, compensated for the transfer time.
 - Disable "SI-Card with 192 punches", except for clear stations.
 - Enable optical feedback.
 - Enable audible feedback.
 - Enable autosend.
 - Set the baud rate to 4800.
+- Set legacy protocol.
 - Turn the station off.
+The first six are only made if they differ from the wanted settings, like in
+si_normalize_station.py.
+
+With --auto, the stations are processed without pressing any keys, as soon as 
+they are placed at the master station. Press Ctrl-C to quit.
 
 The progress is saved to a CSV file. Each station that is processed 
 gets two lines in the file; one line with information about the state
@@ -42,11 +52,10 @@ before the changes and a second line with information about the state
 after the changes. 
 """
 
-from sireader2 import SIReader, SIReaderException, SIReaderControl, SIReaderReadout
+from sireader2 import SIReaderException, SIReaderTimeout
+from si_normalize_station import wanted_changes, connect, run
 from time import sleep
-from datetime import datetime, timedelta
-import sys
-import csv
+import argparse
 
 
 #####################################################
@@ -55,219 +64,99 @@ active_minutes = 4*60
 #####################################################
 
 
-def get_station_status(si):
-    """Read out some status information from an SI station.
-    @param si: SIReader object
-    @return:   A list with data suitable for writing to a CSV file
+def configure(si, log):
+    """Configure the station for legacy autosend at 4800 baud, verify the settings
+    and turn the station off.
+    @param log: function taking ('row', CSV row) or ('print', message)
+    @return:    True if the station was configured
     """
-    now_time = datetime.now()
-    si_time = si.get_time()
-    time_delta = si_time-now_time
-    ms = timedelta(microseconds=1000)
-    if time_delta >= timedelta(0):
-        time_delta_str = str(time_delta)
-    else:
-        time_delta = -time_delta
-        time_delta_str = '-' + str(time_delta)
-    time_delta_str = time_delta_str[0:-3]  # Truncate to ms
-    si.refresh_sysval()
-
-    serno = si.sysval_serno()
-    model = si.sysval_model_str()
-    build_date = si.sysval_build_date()
-    fwver = si.sysval_fwver()
-    mem_size = si.sysval_mem_size()
-    mem_size_str = "%d K" % mem_size
-    bat_date = si.sysval_battery_date()
-    bat_cap = si.sysval_battery_capacity()
-    bat_cap_str = "%d" % int(round(bat_cap, 0))
-    bat_use = si.sysval_used_battery()
-    bat_use_str = "%4.1f %%" % bat_use
-    volt = si.sysval_volt()
-    volt_str = "%4.2f" % volt
-    code = si.sysval_code()
-    mode = si.sysval_mode_str()
-    active_time = si.sysval_active_time()
-    active_hours = active_time//60
-    active_minutes = active_time%60
-    active_str = "%02d:%02d:00" % (active_hours, active_minutes)
-    protocol = si.sysval_protocol()
-    si6_192 = si.sysval_192_punches()
-    feedback = si.sysval_feedback()
-
-    autosend_str = '-'
-    if protocol & 0b10:
-        autosend_str = 'Autosend'
-
-    legacy_str = 'LegacyProtocol!'
-    if protocol & 0b1:
-        legacy_str = '-'
-
-    if si6_192 is True:
-        si6_192_str = 'Card6With192Records!'
-    elif si6_192 is False:
-        si6_192_str = '-'
-    else:
-        si6_192_str = '0x%02x' % si6_192
-        
-    optical_str = ''
-    if feedback & 0b1:
-        optical_str = 'OpticalSignal1'
-    audible_str = ''
-    if feedback & 0b100:
-        audible_str = 'AcousticSignal'
-
-    date = now_time.strftime("%Y-%m-%d")
-    time = now_time.strftime("%H:%M:%S")
-    
-    row = [date, time, serno, model, fwver, bat_date, bat_use_str, volt_str,
-           code, mode, time_delta_str, active_str, autosend_str, legacy_str,
-           si6_192_str, audible_str, optical_str, build_date, mem_size_str,
-           bat_cap_str ]
-
-    return row
-
-
-try:
-    if len(sys.argv) > 1:
-        # Use command line argument as serial port name
-        si = SIReader(port = sys.argv[1])
-    else:
-        # Find serial port automatically
-        si = SIReader()
-    print('Connected to station on port ' + si.port)
-except SIReaderException as e:
-    print('ERROR: ' + str(e))
-    print('Failed to connect to an SI station on any of the available serial ports.')
-    exit()
-except Exception as e:
-    print('Error: ' + str(e))
-    exit()
-    
-
-# Set station in remote mode
-ok = False
-errmsg = ''
-for ii in range(0,3):
-    try:
-        si.set_direct()
-        sleep(.1)
-        si.set_baud_rate_38400()
-        sleep(.1)
-        si.set_remote()
-        ok = True
-        break;
-    except SIReaderException as msg:
-        print(str(msg))
-        errmsg = msg
-if not ok:
-    print('ERROR: Failed to set station in remote mode: %s' % errmsg)
-    exit()
-
-
-# Create a csv log file 
-datestr = datetime.now().strftime("%Y-%m-%d_%H.%M.%S")
-csv_filename = 'Log_legacy_4800_' + datestr + '.csv'
-with open(csv_filename, 'w', newline='') as csvfile:
-    csvwriter = csv.writer(csvfile, delimiter=';',
-                           quotechar='"', quoting=csv.QUOTE_MINIMAL)
-    # This structure is similar to the log from SI Config+, but lacks some fields,
-    # has some fields in a different order (to put more interesting information 
-    # more to the left on the long rows) and has an extra TimeDiff field.
-    header = ['Date', 'Time', 'SerialNo', 'Hardware', 'Software', 'BatteryDate',
-              'BattUsage', 'Voltage', 'CodeNo', 'Mode', 'TimeDiff', 'OpTime', 'Autosend',
-              'LegacyProtocol', 'Card6with192punches', 'AcousticSignal', 
-              'OpticalSignal1', 'ProductionDate', 'MemorySize', 'BatteryCapacity']
-    csvwriter.writerow(header)
-
-    # Loop over stations
-    print('Ready to configure remote station.')
-    maxretries = 5
-    while True:
-        inp = input('Press <Enter> to process remote station. Press q to quit: ')
-        if inp == 'q':
-            break
-        elif inp == '':
-            pass
-        else:
-            print('    Unrecognized input')
-            continue
-
-        # Try a few times if it does not work the first time
-        ok = False
-        errmsg = ''
-        for ii in range(0, maxretries):
-            try:
-                # Read status information from the station
-                row = get_station_status(si)
-                #row = [date, time, serno, model, fwver, bat_date, bat_use_str, volt_str,
-                #       code, mode, time_delta_str, active_str, autosend_str, legacy_str,
-                #       si6_192_str, audible_str, optical_str, build_date, mem_size_str,
-                #       bat_cap_str ]
-                fwver = row[4]
-                volt = float(row[7])
-                code = row[8]
-                mode = row[9]
-                
-                # Write old status to CSV file
-
-                csvwriter.writerow(row)
-
-                print('code: %3d, volt: %4.2f V, mode: %s' % (code, volt, mode))
-                if mode != "Control":
-                    print('WARNING: Not in Control mode!')
-                    si.beep
-                elif code < 31:
-                    print('WARNING: Code is less than 31 despite being in Control mode!')
-                    si.beep
-                if volt < 3.1:
-                    print('WARNING: VERY low battery: %4.2f V' % volt)
-                    si.beep(2)
-                elif volt < 3.2:
-                    print('Warning: low battery: %4.2f V' % volt)
-                    si.beep
-                if fwver < "656":
-                    print('WARNING: Old firmware: %s' % fwver)
-                    si.beep
-
-    
-                # Configure the station's settings
-                si.set_time(datetime.now())
-                si.erase_backup()
-                si.set_feedback(True, True)
-                si.set_active_time(active_minutes)
-                if mode == "Clear":
-                    si.set_si6_192(True)
-                else:
-                    si.set_si6_192(False)
-                print('Set autosend')
-                si.set_autosend(True) # Set autosend mode
-                print('Set 4800')
-                si.set_baud_rate_4800() # 4800 baud on the remote station
-                print('Set legacy')
-                si.set_extended_protocol(False) # Set legacy mode
-                print('Done')
-
-
-                # Read the station's updated settings and write it to the CSV file
-                si.set_direct()
-                sleep(.1)
-                si.set_baud_rate_38400()
-                sleep(.1)
-                si.set_remote()
-                row = get_station_status(si)
-                csvwriter.writerow(row)
-
-                # Turn the remote station off
-                si.poweroff()
-                
-                ok = True
-                break;
-            except SIReaderException as msg:
-                print(str(msg))
-        if not ok:
-            print('ERROR: Failed to talk to the station: %s' % errmsg)
-            print('Maybe the station is not connected or not awake?')
-            continue
-
-print('Log file is: %s' % csv_filename)
+    # Read status information from the station
+    status = si.status_snapshot()
+    log('row', status.csv_row())
+
+    code = status.code
+    volt = status.volt
+    mode = status.mode
+    log('print', 'code: %3d, volt: %4.2f V, mode: %s' % (code, volt, mode))
+    if mode != "Control":
+        log('print', 'WARNING: Not in Control mode!')
+        si.beep()
+    elif code < 31:
+        log('print', 'WARNING: Code is less than 31 despite being in Control mode!')
+        si.beep()
+    if volt < 3.1:
+        log('print', 'WARNING: VERY low battery: %4.2f V' % volt)
+        si.beep(2)
+    elif volt < 3.2:
+        log('print', 'Warning: low battery: %4.2f V' % volt)
+        si.beep()
+    if status.fwver < "656":
+        log('print', 'WARNING: Old firmware: %s' % status.fwver)
+        si.beep()
+
+    # Configure the station's settings
+    for name, change in wanted_changes(status, active_minutes):
+        change(si)
+    si.set_autosend(True) # Set autosend mode
+    si.set_baud_rate_4800() # 4800 baud on the remote station
+    si.set_extended_protocol(False) # Set legacy mode
+
+    # Read the station's updated settings and write it to the CSV file
+    si.set_direct()
+    sleep(.1)
+    si.set_baud_rate_38400()
+    sleep(.1)
+    si.set_remote()
+    status = si.status_snapshot()
+    log('row', status.csv_row())
+    failed = [name for name, change in wanted_changes(status, active_minutes)]
+    if not status.protocol & 0b10:
+        failed.append('autosend')
+    if status.protocol & 0b1:
+        failed.append('legacy protocol')
+    if failed:
+        log('print', 'ERROR: Station %d: could not set %s' % (code, ', '.join(failed)))
+        return False
+    log('print', '    done')
+
+    # Turn the remote station off
+    si.poweroff()
+    return True
+
+
+def process(si, log, retries):
+    """Configure the station, with retries.
+    @return: True if the station was configured
+    """
+    errmsg = ''
+    for ii in range(0, retries):
+        try:
+            return configure(si, log)
+        except (SIReaderException, SIReaderTimeout) as msg:
+            log('print', str(msg))
+            errmsg = msg
+    log('print', 'ERROR: Failed to talk to the station: %s' % errmsg)
+    log('print', 'Maybe the station is not connected or not awake?')
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Set up remote Sportident stations '
+                                     'for legacy autosend at 4800 baud.')
+    parser.add_argument('port', nargs='?', help='serial port of the master station')
+    parser.add_argument('--auto', action='store_true',
+                        help='process the stations as they are placed at the master, '
+                        'without pressing any keys')
+    parser.add_argument('--retries', type=int, default=5,
+                        help='attempts to process a station (default: 5)')
+    args = parser.parse_args()
+
+    si = connect(args.port)
+    if si is None:
+        exit()
+    csv_filename = run(si, process, 'Log_legacy_4800_', args.auto, args.retries)
+    print('Log file is: %s' % csv_filename)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,501 @@
+#!/usr/bin/env python3
+#
+#    Copyright (C)    2026  Per Magnusson <per.magnusson@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+siemulator.py - Software emulation of a Sportident BSM station, and functions to
+build synthetic card images, frames and backup memory records.
+
+The emulator is a serial port like object that can be given to SIReader with the
+serial parameter:
+
+    emu = SIStationEmulator(mode=SIReader.M_READOUT)
+    si = SIReaderReadout(serial=emu)
+    emu.insert_card('SI10', 8123456, course(12))
+
+Cards can be inserted and removed and punches can be generated from other threads
+than the one talking to the station. Replies are delayed as if they were sent
+over a serial link with the configured baud rate, plus a processing latency.
+"""
+
+from sireader2 import SIReader
+from datetime import datetime, timedelta
+from time import monotonic
+import threading
+
+
+#####################################################
+# Synthetic data
+
+def encode_time(t):
+    """Encode a time the way it is stored on SI cards.
+    @param t: datetime
+    @return:  (ptd, th, tl) where ptd holds weekday and am/pm, and th, tl the
+              seconds since midnight or noon
+    """
+    ptd = ((t.isoweekday() % 7) << 1) | (t.hour // 12)
+    secs = (t.hour % 12)*3600 + t.minute*60 + t.second
+    return ptd, secs >> 8, secs & 0xFF
+
+
+def card_image(card_type, cardnr, punches, start=None, finish=None, check=None):
+    """Build the data of an SI card in the layout returned by a full readout.
+    @param card_type: 'SI5', 'SI6', 'SI8', 'SI9', 'pCard' or 'SI10'
+    @param cardnr:    card number
+    @param punches:   list of (code, datetime)
+    @param start:     start time (datetime) or None
+    @param finish:    finish time (datetime) or None
+    @param check:     check (and clear) time (datetime) or None
+    @return:          bytes
+    """
+    card = SIReader.CARD[card_type]
+    if card_type == 'SI5':
+        data = bytearray(128)
+        data[card['CN2']] = cardnr // 100000
+        data[card['CN1']] = (cardnr % 100000) >> 8
+        data[card['CN0']] = (cardnr % 100000) & 0xFF
+    else:
+        size = SIReader.CARD_BLOCK_SIZE * len(SIReader.CARD_BLOCKS[card_type])
+        data = bytearray(b'\xEE' * size)
+        data[card['CN2']] = (cardnr >> 16) & 0xFF
+        data[card['CN1']] = (cardnr >> 8) & 0xFF
+        data[card['CN0']] = cardnr & 0xFF
+    # The clear time (only on SI6) is set to the check time
+    for key, t in (('S', start), ('F', finish), ('C', check), ('L', check)):
+        if card[key+'T'] is None:
+            continue
+        if t is None:
+            data[card[key+'T']:card[key+'T']+2] = SIReader.TIME_RESET
+            continue
+        ptd, th, tl = encode_time(t)
+        data[card[key+'T']] = th
+        data[card[key+'T']+1] = tl
+        if card[key+'TD'] is not None:
+            data[card[key+'TD']] = ptd
+    if card_type == 'SI5':
+        data[card['RC']] = len(punches) + 1
+    else:
+        data[card['RC']] = len(punches)
+    i = card['P1']
+    for code, t in punches:
+        if card_type == 'SI5' and i % 16 == 0:
+            i += 1
+        ptd, th, tl = encode_time(t)
+        if card['PTD'] is not None:
+            data[i + card['PTD']] = ptd | ((code >> 8) << 6)
+        data[i + card['CN']] = code & 0xFF
+        data[i + card['PTH']] = th
+        data[i + card['PTL']] = tl
+        i += card['PL']
+    return bytes(data)
+
+
+def course(count, first=None):
+    """Return a list of (code, datetime) for a runner punching count controls."""
+    if first is None:
+        first = datetime.now().replace(microsecond=0) - timedelta(hours=3)
+    return [(31 + (i*7) % 200, first + timedelta(seconds=97*(i+1)))
+            for i in range(count)]
+
+
+def frame(command, data, station=b'\x00\x1F'):
+    """Build a frame as sent by a station."""
+    body = command + bytes([len(data) + 2]) + station + data
+    return SIReader.STX + body + SIReader._crc(body) + SIReader.ETX
+
+
+def legacy_frame(command, data):
+    """Build a legacy protocol frame, with the bytes below 0x20 in the data
+    preceded by DLE."""
+    escaped = bytearray()
+    for b in data:
+        if b < 0x20:
+            escaped += SIReader.DLE
+        escaped.append(b)
+    return SIReader.STX + command + bytes(escaped) + SIReader.ETX
+
+
+def legacy_trans_rec(code, cardnr, t, offset):
+    """Build the data of a BC_TRANS_REC2 frame (legacy autosend), in the 12 byte
+    layout of SIReader.LT_LAYOUTS."""
+    ptd, th, tl = encode_time(t)
+    return (bytes([code & 0xFF]) + cardnr.to_bytes(4, 'big') +
+            bytes([ptd | ((code >> 8) << 6), th, tl, t.microsecond * 256 // 1000000]) +
+            offset.to_bytes(3, 'big'))
+
+
+def backup_record_extended(cardnr, t):
+    """Encode a punch as an 8 byte backup memory record (extended protocol)."""
+    ampm = t.hour // 12
+    secs = (t.hour % 12)*3600 + t.minute*60 + t.second
+    return (cardnr.to_bytes(3, 'big') +
+            bytes([((t.year - 2000) << 2) | (t.month >> 2),
+                   ((t.month & 0x3) << 6) | (t.day << 1) | ampm]) +
+            secs.to_bytes(2, 'big') + bytes([t.microsecond * 256 // 1000000]))
+
+
+def backup_record_legacy(cardnr, t):
+    """Encode a punch as a 6 byte backup memory record (legacy protocol)."""
+    ampm = t.hour // 12
+    secs = (t.hour % 12)*3600 + t.minute*60 + t.second
+    return ((cardnr % 100000).to_bytes(2, 'big') + secs.to_bytes(2, 'big') +
+            bytes([((t.isoweekday() % 7) << 1) | ampm, cardnr // 100000]))
+
+
+def trans_rec(cardnr, t, offset):
+    """Build the data of a C_TRANS_REC frame (punch sent by a station in autosend mode)."""
+    ptd, th, tl = encode_time(t)
+    return (cardnr.to_bytes(4, 'big') + bytes([ptd, th, tl, t.microsecond * 256 // 1000000]) +
+            offset.to_bytes(3, 'big'))
+
+
+#####################################################
+# Station emulator
+
+class SIStationEmulator(object):
+    """Serial port like object emulating a BSM7/8 station in extended protocol mode."""
+
+    BACKUP_START = 0x100  # Address of the first record in the backup memory
+
+    def __init__(self, mode=SIReader.M_READOUT, code=None, serno=123456,
+                 autosend=None, baudrate=38400, latency=0.002, realtime=True,
+                 port='emulator'):
+        """
+        @param mode:     Operating mode, SIReader.M_READOUT, M_CONTROL etc
+        @param code:     Station code. Default 10 in readout mode, otherwise 31.
+        @param serno:    Serial number
+        @param autosend: Autosend mode. Default True in control mode.
+        @param baudrate: The baud rate used to compute the transfer time of replies
+        @param latency:  Time in seconds the station takes to process a command
+        @param realtime: If False, replies are available immediately
+        @param port:     Name reported as port
+        """
+        if code is None:
+            code = 10 if mode == SIReader.M_READOUT else 31
+        if autosend is None:
+            autosend = mode == SIReader.M_CONTROL
+        self.port = port
+        self.name = port
+        self.portstr = port
+        self.baudrate = baudrate
+        self.timeout = 2
+        self.latency = latency
+        self.realtime = realtime
+        self.serno = serno
+        self.direct = True
+        self.card = None        # (card_type, cardnr, data) of the inserted card
+        self.inserted_at = None # monotonic() when the card was inserted
+        self.acks = 0           # Number of ACKs received
+        self.commands = 0       # Number of commands received
+        self.backup = bytearray()
+        self._radio_offsets = {} # Control code: next backup memory address, see radio_punch()
+        self.clock_offset = timedelta(0)
+        self._cond = threading.Condition()
+        self._out = []          # List of [available_at, bytes]
+        self.sysval = bytearray(0x80)
+        self.sysval[0x00:0x04] = serno.to_bytes(4, 'big')
+        self.sysval[0x05:0x08] = b'656'
+        self.sysval[0x08:0x0B] = bytes([19, 3, 14])
+        self.sysval[0x0B:0x0D] = b'\x91\x98'
+        self.sysval[0x0D] = 128
+        self.sysval[0x15:0x18] = bytes([22, 6, 1])
+        self.sysval[0x19:0x1B] = (1400 * 225 // 16).to_bytes(2, 'big')
+        self.sysval[0x33] = 0xC1
+        self.sysval[0x35:0x38] = (360).to_bytes(3, 'big')
+        self.sysval[0x50:0x52] = (int(3.35 * 65536 / 5)).to_bytes(2, 'big')
+        self.sysval[0x71] = mode
+        self.sysval[0x72] = code & 0xFF
+        self.sysval[0x73] = 0b00000101 | ((code >> 8) << 6)
+        self.sysval[0x74] = 0b00000001 | (autosend << 1) | ((not autosend) << 2)
+        self.sysval[0x7E:0x80] = (240).to_bytes(2, 'big')
+        self._update_backup_ptr()
+
+    @property
+    def code(self):
+        return self.sysval[0x72] + ((self.sysval[0x73] & 0b11000000) << 2)
+
+    #####################################################
+    # Serial port interface
+
+    def write(self, data):
+        data = bytes(data)
+        while data[:1] == SIReader.WAKEUP:
+            data = data[1:]
+        if data == SIReader.ACK:
+            with self._cond:
+                self.acks += 1
+            return 1
+        if data[:1] == SIReader.STX and len(data) >= 6:
+            command = data[1:2]
+            parameters = data[3:3+data[2]]
+            with self._cond:
+                self.commands += 1
+                replies = self._handle(command, parameters)
+                now = monotonic()
+                for reply in replies:
+                    self._queue(reply, now + self.latency)
+        return len(data)
+
+    def read(self, size=1):
+        with self._cond:
+            if self.timeout is None:
+                deadline = None
+            else:
+                deadline = monotonic() + self.timeout
+            while True:
+                available = self._available(monotonic())
+                if available >= size:
+                    break
+                wait = self._next_due()
+                if deadline is not None:
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        break
+                    if wait is None or wait > remaining:
+                        wait = remaining
+                self._cond.wait(wait)
+            return self._take(size)
+
+    def inWaiting(self):
+        with self._cond:
+            return self._available(monotonic())
+
+    @property
+    def in_waiting(self):
+        return self.inWaiting()
+
+    def flushInput(self):
+        with self._cond:
+            now = monotonic()
+            self._out = [chunk for chunk in self._out if chunk[0] > now]
+
+    def flushOutput(self):
+        pass
+
+    reset_input_buffer = flushInput
+    reset_output_buffer = flushOutput
+
+    def close(self):
+        pass
+
+    #####################################################
+    # Things happening at the station
+
+    def insert_card(self, card_type, cardnr, punches, start=None, finish=None, check=None):
+        """Insert a card into the station (readout mode)."""
+        data = card_image(card_type, cardnr, punches, start, finish, check)
+        with self._cond:
+            self.card = (card_type, cardnr, data)
+            self.inserted_at = monotonic()
+            if card_type == 'SI5':
+                det = frame(SIReader.C_SI5_DET, b'\x00' + data[6:7] + data[4:6], self._station())
+            elif card_type == 'SI6':
+                det = frame(SIReader.C_SI6_DET, cardnr.to_bytes(4, 'big'), self._station())
+            else:
+                det = frame(SIReader.C_SI9_DET, cardnr.to_bytes(4, 'big'), self._station())
+            self._queue(det, monotonic())
+
+    def remove_card(self):
+        """Remove the inserted card."""
+        with self._cond:
+            if self.card is None:
+                return
+            self._queue(frame(SIReader.C_SI_REM, self.card[1].to_bytes(4, 'big'),
+                              self._station()), monotonic())
+            self.card = None
+            self.inserted_at = None
+
+    def punch(self, cardnr, t=None, send=True):
+        """Punch at the station (control mode). The punch is stored in the backup
+        memory and, if the station is in autosend mode and send is True, sent.
+        @param send: set to False to emulate a frame lost on the way to the computer
+        @return:     the backup memory address of the punch
+        """
+        if t is None:
+            t = datetime.now()
+        with self._cond:
+            offset = SIStationEmulator.BACKUP_START + len(self.backup)
+            self.backup += backup_record_extended(cardnr, t)
+            self._update_backup_ptr()
+            if send and self.sysval[0x74] & 0b10:
+                self._queue(frame(SIReader.C_TRANS_REC, trans_rec(cardnr, t, offset),
+                                  self._station()), monotonic())
+            return offset
+
+    def radio_punch(self, code, cardnr, t=None, send=True):
+        """A punch at a control that sends it over radio to this station (e.g. an
+        SRR dongle). Each control has a backup memory of its own.
+        @param send: set to False to emulate a frame lost on the way
+        @return:     the backup memory address of the punch in the control
+        """
+        if t is None:
+            t = datetime.now()
+        with self._cond:
+            offset = self._radio_offsets.get(code, SIStationEmulator.BACKUP_START)
+            self._radio_offsets[code] = offset + SIReader.REC_LEN
+            if send:
+                self._queue(frame(SIReader.C_TRANS_REC, trans_rec(cardnr, t, offset),
+                                  code.to_bytes(2, 'big')), monotonic())
+            return offset
+
+    def radio_ping(self, code):
+        """A heartbeat from a control linked over radio."""
+        with self._cond:
+            self._queue(frame(SIReader.C_SRR_PING, b'\x00', code.to_bytes(2, 'big')), monotonic())
+
+    def legacy_punch(self, cardnr, t=None, send=True):
+        """A punch sent in legacy protocol autosend mode (BC_TRANS_REC2), like
+        from a station set up with si_set_legacy_4800.py.
+        @param send: set to False to emulate a frame lost on the way
+        @return:     the backup memory address of the punch
+        """
+        if t is None:
+            t = datetime.now()
+        with self._cond:
+            offset = SIStationEmulator.BACKUP_START + len(self.backup)
+            self.backup += backup_record_extended(cardnr, t)
+            self._update_backup_ptr()
+            if send:
+                self._queue(legacy_frame(SIReader.BC_TRANS_REC2,
+                                         legacy_trans_rec(self.code, cardnr, t, offset)),
+                            monotonic())
+            return offset
+
+    #####################################################
+    # Internals
+
+    def _station(self):
+        return self.code.to_bytes(2, 'big')
+
+    def _update_backup_ptr(self):
+        end_ptr = SIStationEmulator.BACKUP_START + len(self.backup)
+        self.sysval[0x1C:0x1E] = (end_ptr >> 16).to_bytes(2, 'big')
+        self.sysval[0x21:0x23] = (end_ptr & 0xFFFF).to_bytes(2, 'big')
+
+    def _queue(self, data, at):
+        """Add data to the output, available after the transfer time."""
+        if self.realtime:
+            if self._out and self._out[-1][0] > at:
+                # The serial line is busy with the previous output
+                at = self._out[-1][0]
+            at += len(data) * 10.0 / self.baudrate
+        else:
+            at = 0
+        self._out.append([at, data])
+        self._cond.notify_all()
+
+    def _available(self, now):
+        return sum(len(chunk[1]) for chunk in self._out if chunk[0] <= now)
+
+    def _next_due(self):
+        now = monotonic()
+        for chunk in self._out:
+            if chunk[0] > now:
+                return chunk[0] - now
+        return None
+
+    def _take(self, size):
+        now = monotonic()
+        ret = b''
+        while self._out and len(ret) < size and self._out[0][0] <= now:
+            chunk = self._out[0]
+            n = size - len(ret)
+            ret += chunk[1][:n]
+            if n >= len(chunk[1]):
+                self._out.pop(0)
+            else:
+                chunk[1] = chunk[1][n:]
+        return ret
+
+    def _now(self):
+        return datetime.now() + self.clock_offset
+
+    def _handle(self, command, parameters):
+        """Handle a command.
+        @return: list of frames to send back
+        """
+        station = self._station()
+        if command == SIReader.C_SET_MS:
+            self.direct = parameters == SIReader.P_MS_DIRECT
+            return [frame(command, parameters, station)]
+        elif command == SIReader.C_GET_SYS_VAL:
+            start = parameters[0]
+            return [frame(command, bytes([start]) + self.sysval[start:start+parameters[1]],
+                          station)]
+        elif command == SIReader.C_SET_SYS_VAL:
+            start = parameters[0]
+            self.sysval[start:start+len(parameters)-1] = parameters[1:]
+            return [frame(command, parameters[0:1], self._station())]
+        elif command == SIReader.C_GET_TIME:
+            t = self._now()
+            ptd, th, tl = encode_time(t)
+            return [frame(command, bytes([t.year - 2000, t.month, t.day, ptd, th, tl,
+                                          t.microsecond * 256 // 1000000]), station)]
+        elif command == SIReader.C_SET_TIME:
+            p = parameters
+            secs = ((p[3] & 1) * 12 * 3600 + (p[4] << 8) + p[5])
+            t = (datetime(2000 + p[0], p[1], p[2]) +
+                 timedelta(seconds=secs, microseconds=p[6] * 1000000 // 256))
+            self.clock_offset = t - datetime.now()
+            return [frame(command, parameters, station)]
+        elif command == SIReader.C_BEEP:
+            return [frame(command, parameters, station)]
+        elif command == SIReader.C_SET_BAUD:
+            # The baud rate is shared with the serial port side, which changes
+            # it to the same value when talking to the direct station
+            self.baudrate = 38400 if parameters[0:1] == b'\x01' else 4800
+            return [frame(command, parameters, station)]
+        elif command == SIReader.C_OFF:
+            return [frame(command, b'', station)]
+        elif command == SIReader.C_ERASE_BACKUP:
+            self.backup = bytearray()
+            self._radio_offsets = {}
+            self._update_backup_ptr()
+            return [frame(command, b'', station)]
+        elif command == SIReader.C_GET_BACKUP:
+            addr = int.from_bytes(parameters[0:3], 'big')
+            start = addr - SIStationEmulator.BACKUP_START
+            data = bytes(self.backup[start:start+parameters[3]])
+            data += b'\x00' * (parameters[3] - len(data))
+            return [frame(command, parameters[0:3] + data, station)]
+        elif command in (SIReader.C_GET_SI5, SIReader.C_GET_SI6, SIReader.C_GET_SI9):
+            return self._read_card(command, parameters, station)
+        return [SIReader.NAK]
+
+    def _read_card(self, command, parameters, station):
+        if self.card is None:
+            return [SIReader.NAK]
+        card_type, cardnr, data = self.card
+        if command == SIReader.C_GET_SI5:
+            if card_type != 'SI5':
+                return [SIReader.NAK]
+            return [frame(command, data, station)]
+        if card_type == 'SI5' or (command == SIReader.C_GET_SI6) != (card_type == 'SI6'):
+            return [SIReader.NAK]
+        blocks = SIReader.CARD_BLOCKS[card_type]
+        if parameters == SIReader.P_SI6_CB:
+            requested = blocks
+        else:
+            requested = [parameters[0]]
+        size = SIReader.CARD_BLOCK_SIZE
+        replies = []
+        for b in requested:
+            if b in blocks:
+                k = blocks.index(b)
+                block = data[k*size:(k+1)*size]
+            else:
+                block = b'\xEE' * size
+            replies.append(frame(command, bytes([b]) + block, station))
+        return replies
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+#
+#    Copyright (C) 2008-2014  Gaudenz Steinlin <gaudenz@durcheinandertal.ch>
+#                       2014  Simon Harston <simon@harston.de>
+#                       2015  Jan Vorwerk <jan.vorwerk@angexis.com>
+#                       2019  Per Magnusson <per.magnusson@gmail.com>
+#                       2023  Per Magnusson <per.magnusson@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+sireader2.py - Classes to read out si card data and backup 
+memory from BSM-7/8 stations.
+Also contains functions to read and modify the configuration of stations.
+The code contains documentation of much of the communication protocol
+used by Sportident stations.
+
+Additions and modifications by Per Magnusson:
+- A few more parts of the SYS_VAL structure were worked out and described.
+- The format of the data when reading out the backup memory was reverse 
+  engineered and documented, both for stations in legacy and extended 
+  protocol modes.
+- Added function to read out backup memory of stations in legacy and 
+  extended protocol modes.
+- Added function to save the backup data to a CSV file of the same 
+  format as that used by Sportident Config+.
+- Added functions to set the station in direct and remote mode.
+- A wakeup byte is sent as default before packets to stations. 
+  This seems to make the communication more robust.
+- Made the serial port search smarter for Windows.
+- Fixed an issue with "raise StopIteration" in the _crc routine,
+  which no longer works in Python 3.7 (PEP 479).
+- Compatibility with Python 2 is probably no longer preserved.
+- Added sysval_ functions to access configuration data in SYS_VAL.
+- Split into a package. The modules are loaded when a name in them is first
+  used, so "from sireader2 import SIReader" does not load the code for 
+  card readout, radio punches, logs and metrics:
+    protocol   protocol constants (SIProtocol), exceptions, byte helpers
+    codec      decoding of card data, backup memory, times etc (SICodec)
+    transport  the serial link, commands and replies (SITransport)
+    backup     backup memory readout and CSV export (SIBackup)
+    reader     settings, time and status of stations (SIReader)
+    readout    SIReaderReadout, SICardCache
+    control    SIReaderControl, SIReaderRadio, SIReaderLegacy, SIPunch
+    frames     SIFrameParser, SILegacyFrameParser
+    scheduler  SICommandScheduler
+    log        SIProtocolLog, SIProtocolTrace, SIReplaySerial
+    metrics    SIMetrics, SIMetricsExporter
+    timeline   SIBackupMerger, SIBackupPunch
+
+"""
+
+# Name: module that defines it, imported on first use (PEP 562)
+_EXPORTS = {
+    'SIProtocol':          'protocol',
+    'SIReaderException':   'protocol',
+    'SIReaderTimeout':     'protocol',
+    'SIReaderCardChanged': 'protocol',
+    'byte2int':            'protocol',
+    'int2byte':            'protocol',
+    'SICodec':             'codec',
+    'SITransport':         'transport',
+    'SIBackup':            'backup',
+    'SIReader':            'reader',
+    'SIStationStatus':     'reader',
+    'SIReaderReadout':     'readout',
+    'SICardCache':         'readout',
+    'SIReaderControl':     'control',
+    'SIReaderRadio':       'control',
+    'SIReaderLegacy':      'control',
+    'SIPunch':             'control',
+    'SIFrameParser':       'frames',
+    'SILegacyFrameParser': 'frames',
+    'SICommandScheduler':  'scheduler',
+    'SIProtocolLog':       'log',
+    'SIProtocolTrace':     'log',
+    'SIReplaySerial':      'log',
+    'SIMetrics':           'metrics',
+    'SIMetricsExporter':   'metrics',
+    'SIBackupMerger':      'timeline',
+    'SIBackupPunch':       'timeline',
+}
+
+__all__ = list(_EXPORTS)
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    value = getattr(__import__(__name__ + '.' + module, fromlist=[name]), name)
+    # Found directly from now on
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+#
+#    Copyright (C) 2008-2014  Gaudenz Steinlin <gaudenz@durcheinandertal.ch>
+#                       2014  Simon Harston <simon@harston.de>
+#                       2015  Jan Vorwerk <jan.vorwerk@angexis.com>
+#                       2019  Per Magnusson <per.magnusson@gmail.com>
+#                       2023  Per Magnusson <per.magnusson@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+sireader2.backup - Reading out, exporting and erasing the backup memory of stations.
+"""
+
+from .protocol import SIReaderException, SIReaderTimeout, byte2int, int2byte
+from .transport import SITransport
+from serial.serialutil import SerialException
+from contextlib import contextmanager
+from datetime import datetime
+import sys
+
+class SIBackup(SITransport):
+    """Functions for the backup memory of stations."""
+
+    # Attempts to set a station back to 4800 baud after fast_baud_rate()
+    BAUD_RESTORE_RETRIES = 3
+
+    def set_baud_rate_4800(self):
+        """Set the baudrate to 4800 of the direct or remote station depending on 
+        which one is currently being communicated with. The serial port follows
+        when it is the direct station.
+        """
+        self._set_baud_rate(4800, b'\x00')
+
+    def set_baud_rate_38400(self):
+        """Set the baudrate to 38400 of the direct or remote station depending on 
+        which one is currently being communicated with. The serial port follows
+        when it is the direct station.
+        """
+        self._set_baud_rate(38400, b'\x01')
+
+    @contextmanager
+    def fast_baud_rate(self):
+        """Context manager for bulk transfers (e.g. read_backup()) with a direct 
+        station at 4800 baud, like those set up with si_set_legacy_4800.py. The
+        station and serial port are set to 38400 baud in the block, and back to
+        4800 baud afterwards, also if the block raises an exception.
+        Nothing is changed for a remote station, since the speed of the link to 
+        the computer is that of the direct station, or if it is already at 38400.
+
+        If the station can not be set back to 4800 baud (or the program dies in
+        the block), it is left at 38400 baud. It is still found at that speed
+        by SIReader, but a concentrator box can not read it. Place it at a 
+        master and run si_set_legacy_4800.py, or call set_baud_rate_4800() 
+        with it as the direct station, to set it back to 4800 baud.
+        If the block raised an exception, that exception is raised and a 
+        failure to set the station back is only written to sys.stderr.
+        """
+        if not self.direct or self._serial.baudrate != 4800:
+            yield
+            return
+        self.set_baud_rate_38400()
+        try:
+            yield
+        except BaseException:
+            try:
+                self._restore_baud_rate()
+            except (SIReaderException, SIReaderTimeout) as msg:
+                print(msg, file=sys.stderr)
+            raise
+        self._restore_baud_rate()
+
+    def _restore_baud_rate(self):
+        """Set the direct station back to 4800 baud after fast_baud_rate()."""
+        for i in range(self.BAUD_RESTORE_RETRIES):
+            try:
+                self.set_baud_rate_4800()
+                return
+            except (SIReaderException, SIReaderTimeout) as msg:
+                errmsg = msg
+        raise SIReaderException('Could not set the station back to 4800 baud, it is '
+                                'left at 38400 baud (see fast_baud_rate()): %s' % errmsg)
+
+    def _set_baud_rate(self, baudrate, parameter):
+        """Send C_SET_BAUD and, for the direct station, change the speed of the 
+        serial port. It is not known if the station replies at the old or the new
+        speed, so the new speed is confirmed with C_SET_MS.
+        """
+        if self._scheduler is not None and not self._scheduler.is_owner():
+            # The port is read by the thread of the scheduler
+            return self._scheduler.call(self._scheduler.PRIO_NORMAL, self._set_baud_rate,
+                                        baudrate, parameter)
+        if not self.direct:
+            self._send_command(SIBackup.C_SET_BAUD, parameter)
+            return
+        old_baudrate = self._serial.baudrate
+        try:
+            self._send_command(SIBackup.C_SET_BAUD, parameter)
+        except (SIReaderException, SIReaderTimeout):
+            # No reply, or a garbled one from a station that answered at the 
+            # new speed. Checked with C_SET_MS below.
+            pass
+        try:
+            self._serial.baudrate = baudrate
+            # Drop what is left of a reply at the other speed
+            self._serial.flushInput()
+            # Wake the station up at the new speed
+            self._last_reply = None
+            self._send_command(SIBackup.C_SET_MS, SIBackup.P_MS_DIRECT)
+        except (SerialException, OSError) as msg:
+            raise SIReaderException('Could not set port speed to %d: %s' % (baudrate, msg))
+        except (SIReaderException, SIReaderTimeout):
+            self._serial.baudrate = old_baudrate
+            raise
+        self.baudrate = baudrate
+
+    def read_backup(self, progress=0, fast_baud=False):
+        """Read out the entire backup memory of a station configured as 
+        control, check, clear, start or finish.
+        Before calling this function: set the station in direct or remote mode 
+        depending on whether the master or slave should be read.
+        The station connected to the computer has to be in extended protocol mode.
+        The remote station can be in either extended or legacy mode.
+        @param progress:  Set this to 1 to have the function print out 
+                          progress indications.
+        @param fast_baud: Read a direct station at 4800 baud at 38400 baud, 
+                          see fast_baud_rate().
+        @return:          A list of tuples:  (date, cardnr, error)
+                          'date' is a datetime object with the punch time
+                          'cardnr' is an int with the card number
+                          'error' is an empty string if there was 
+                          no error in the punch and a string like "ErrA" 
+                          etc if there was an error. 
+                          In case of error, the 'date' field is set to 
+                          midnight or noon of the actual date.
+        """
+        if fast_baud:
+            with self.fast_baud_rate():
+                return self._read_backup(progress)
+        return self._read_backup(progress)
+
+    def _read_backup(self, progress):
+        # Check which protocol is in use and which mode the station is in
+        self._update_proto_config()
+        if not self.proto_config['mode'] in SIBackup.SUPPORTED_READ_BACKUP_MODES:
+            raise SIReaderException('Station is in unsupported mode: %s' % 
+                                    SIBackup.MODE2NAME[self.proto_config['mode']])
+
+        # Read out backup memory pointers
+        ret = self._send_command(SIBackup.C_GET_SYS_VAL, b'\x00\x80')[1]
+
+        offs1 = byte2int(SIBackup.O_BACKUP_PTR_HI)+1
+        offs2 = byte2int(SIBackup.O_BACKUP_PTR_LO)+1
+        end_ptr = SIBackup._to_int(ret[offs1:offs1+2] + ret[offs2:offs2+2])
+
+        # Read out entire used backup memory.
+        # It seems like we can only read out 0x80 bytes at a time, so we might need
+        # to divide the read into several commands.
+        bakmem = b''
+        read_ptr = 0x100 # This is where reading always seems to start
+        while read_ptr < end_ptr:
+            read_ptr_bytes = (int2byte(read_ptr>>16) + 
+                              int2byte((read_ptr>>8)&0xff) + 
+                              int2byte(read_ptr&0xff))
+            byte_cnt = b'\x80'
+            if end_ptr-read_ptr < 0x80:
+                byte_cnt = int2byte(end_ptr-read_ptr)
+            ret = self._send_command(SIBackup.C_GET_BACKUP, read_ptr_bytes + byte_cnt)[1]
+            if progress > 0:
+                print('.', end='')
+                sys.stdout.flush()
+            if self.proto_config['ext_proto']:
+                # Extended protocol
+                bakmem += ret[SIBackup.BUX_FIRST+1:]
+            else:
+                # Legacy protocol
+                bakmem += ret[SIBackup.BUL_FIRST+1:]
+            read_ptr += byte2int(byte_cnt)
+
+        if progress > 0:
+            print('')
+        return SIBackup._decode_backup(bakmem, self.proto_config['ext_proto'])
+
+    def write_backup_csv(self, data, code=0, serno=0, mode='', filename=None, readtime=None):
+        """Write the backup data read from a station's backup memory to 
+        a CSV file of the same format as created by Sportident Config+.
+        @param data:     the list of tuples with backup data 
+                         returned by read_backup()
+        @param code:     the control code number. Default is the code of 
+                         the current station.
+        @param serno:    the station's serial number. Default the 
+                         serial number of the current station.
+        @param mode:     the station's operating mode as a string.
+                         Allowed values are 'Control', 'Check', 
+                         'Start', 'Clear', 'Finish'.
+                         Default is the mode of the current station.
+        @param filename: the filename to use. If none is given, one is constructed 
+                         with the format: <code>_<mode>_<serno>.csv
+        @param readtime: A datetime object with the time when the station was read.
+                         Default is to use the current time.
+        @return:         The name of the CSV file.
+        """
+        import csv
+        if code == 0:
+            code = self._station_code
+        codestr = str(code)
+        if serno == 0:
+            serno = self._serno
+        if mode == '':
+            if self.proto_config['mode'] == SIBackup.M_CONTROL:
+                mode = 'Control'
+            elif self.proto_config['mode'] == SIBackup.M_START:
+                mode = 'Start'
+            elif self.proto_config['mode'] == SIBackup.M_FINISH:
+                mode = 'Finsih'
+            elif self.proto_config['mode'] == SIBackup.M_CLEAR_OLD:
+                mode = 'Clear'
+            elif self.proto_config['mode'] == SIBackup.M_CLEAR:
+                mode = 'Clear'
+            elif self.proto_config['mode'] == SIBackup.M_CHECK:
+                mode = 'Check'
+            else:
+                mode = '???'
+
+        if filename is None:
+            filename = codestr + '_' + mode + '_' + str(serno) + '.csv'
+        with open(filename, 'w', newline='') as csvfile:
+            csvwriter = csv.writer(csvfile, delimiter=';',
+                                   quotechar='"', quoting=csv.QUOTE_MINIMAL)
+            header = ['No', 'Read on', 'SIID', 'Control time', 
+                      'Battery voltage', 'Serial number', 'Code number', 
+                      'DayOfWeek', 'Punch DateTime', 'Operating mode', 
+                      'SIAC number', 'SIAC Count', 'SIAC radio mode', 
+                      'SIAC is battery low', 'SIAC is card full', 
+                      'SIAC beacon mode', 'SIAC is gate mode', '']
+            days = ['Su', 'Mo', 'Tu', 'We', 'Th', 'Fr', 'Sa']
+            csvwriter.writerow(header)
+            if readtime is None:
+                readtime = datetime.now()
+            readtimestr = readtime.isoformat(timespec='seconds', sep=' ')
+                
+            ii = 1
+            for punchdata in data:
+                date = punchdata[0]
+                if date.microsecond == 0:
+                    # Make sure microseconds are always printed
+                    date.replace(microsecond = 1)
+                cardno = punchdata[1]
+                err = punchdata[2]
+                datestr = date.isoformat(sep='$')[0:23]
+                datestr = datestr.replace('$', '   ')
+                
+                if err == '':
+                    # No error, normal case
+                    dayno = int(date.strftime('%w')) # Day of week, Sun = 0
+                    dayname = days[dayno]
+                    timestr = datestr[13:]
+                else:
+                    # Error
+                    datestr = datestr[0:13] + err
+                    dayname = ''
+                    timestr = '00:00:00'
+                row = [ii, readtimestr, cardno, datestr, '', '', codestr, 
+                       dayname, timestr, mode, '0', '1', 
+                       '', '', '', '', '', '']
+                csvwriter.writerow(row)
+                ii += 1
+        return filename
+
+    def erase_backup(self):
+        """Erase the backup memory of the station."""
+        self._send_command(SIBackup.C_ERASE_BACKUP, b'')
@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+#
+#    Copyright (C) 2008-2014  Gaudenz Steinlin <gaudenz@durcheinandertal.ch>
+#                       2014  Simon Harston <simon@harston.de>
+#                       2015  Jan Vorwerk <jan.vorwerk@angexis.com>
+#                       2019  Per Magnusson <per.magnusson@gmail.com>
+#                       2023  Per Magnusson <per.magnusson@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+sireader2.codec - Encoding and decoding of the data in the frames: CRC, numbers, card
+numbers, times, card data and backup memory records.
+"""
+
+from .protocol import SIProtocol, SIReaderException, byte2int, int2byte
+from datetime import datetime, timedelta
+
+class SICodec(SIProtocol):
+    """Conversion of the data in frames from and to the stations. All functions
+    are static, so they can be used without a station."""
+
+    @staticmethod
+    def _decode_backup(bakmem, ext_proto, now_datetime=None):
+        """Decode the records read from the backup memory of a station.
+        @param bakmem:       The backup memory contents, without the address bytes
+                             of the replies to C_GET_BACKUP.
+        @param ext_proto:    True if the station is in extended protocol mode 
+                             (8 byte records), False for legacy mode (6 byte records).
+        @param now_datetime: Time used to guess the dates of legacy protocol 
+                             records. Default is the current time.
+        @return:             A list of tuples (date, cardnr, error), see read_backup()
+        """
+        if ext_proto:
+            step = SICodec.BUX_SIZE
+        else:
+            step = SICodec.BUL_SIZE
+
+        # Gather some time-information to help guessing what dates 
+        # punches from the basic protocol belongs to.
+        if now_datetime is None:
+            now_datetime = datetime.now()
+        now_weekday = now_datetime.weekday()
+        secs_since_midnight = (now_datetime - 
+                               now_datetime.replace(hour=0, minute=0, second=0, 
+                                                    microsecond=0)).total_seconds()
+        # Loop over punch data
+        res = []
+        ii = 0
+        while ii < len(bakmem):
+            punch = bakmem[ii:ii+step]
+            err = ""
+            secs = 0
+            us = 0
+            if ext_proto:
+                # Extended protocol
+                cardnr_bytes = b'\x00' + punch[SICodec.BUX_CN:SICodec.BUX_CN+3]
+                cardnr = SICodec._decode_cardnr(cardnr_bytes)
+                year = 2000 + (punch[SICodec.BUX_YM]>>2)
+                month = ((punch[SICodec.BUX_YM] & 0x3)<<2) + (punch[SICodec.BUX_MDAP]>>6);
+                day = (punch[SICodec.BUX_MDAP] & 0x3F)>>1
+                ampm = punch[SICodec.BUX_MDAP] & 0x01
+                if byte2int(punch[SICodec.BUX_SECS]) >= 0xF0:
+                    # Error code
+                    err = "Err%X" % byte2int(punch[SICodec.BUX_SECS] & 0xF)
+                else:
+                    secs = SICodec._to_int(punch[SICodec.BUX_SECS:SICodec.BUX_SECS+2])
+                    us = 1e6*SICodec._to_int(punch[SICodec.BUX_MS:SICodec.BUX_MS+1])/256
+                if month == 0:
+                    # This is weird, but happened during testing. Corrupted memory?
+                    month += 12
+                    year -= 1
+                    err += "ErrDate"
+                if month > 12:
+                    # This should not happen, unless the backup memory is corrupt.
+                    month -= 12
+                    year += 1
+                    err += "ErrDate"
+                secs += 12*3600*ampm
+                punch_datetime = (datetime(year, month, day) + 
+                                  timedelta(seconds=secs, microseconds=us))
+            else:
+                # Legacy protocol
+                cardnr_bytes = (b'\x00' + punch[SICodec.BUL_CNS:SICodec.BUL_CNS+1] +
+                                punch[SICodec.BUL_CN:SICodec.BUL_CN+2])
+                cardnr = SICodec._decode_cardnr(cardnr_bytes)
+                weekday = (((punch[SICodec.BUL_PTD] & 0x0E)>>1) - 1) % 7 # Monday = 0 etc
+                ampm = punch[SICodec.BUL_PTD] & 0x01
+                if byte2int(punch[SICodec.BUL_SECS]) >= 0xF0:
+                    # Error code
+                    err = "Err%X" % byte2int(punch[SICodec.BUL_SECS] & 0xF)
+                else:
+                    secs = SICodec._to_int(punch[SICodec.BUL_SECS:SICodec.BUL_SECS+2])
+                secs += 12*3600*ampm
+                # In legacy protocol, we really only know what weekday the punch took place, 
+                # but in order to be able to return a convenient datetime, we assume it took 
+                # place within the last seven days and provide a full datetime
+                # based on this assumption.
+                if (weekday*24*3600 + secs < 
+                   now_weekday*24*3600 + secs_since_midnight + 3600):
+                    # Punch probably took place earlier this week.
+                    # The added 3600 seconds above is to handle the case if the computer
+                    # and station are not in sync.
+                    day_offset = now_weekday - weekday
+                else:
+                    # Punch probably took place last week
+                    day_offset = now_weekday - weekday + 7
+                punch_datetime = (now_datetime.replace(hour=0, minute=0, 
+                                                       second=0, microsecond=0)
+                                  + timedelta(seconds=secs) - timedelta(days=day_offset))
+            res.append((punch_datetime, cardnr, err))
+            ii += step
+        return res
+        
+    @staticmethod
+    def _to_int(s):
+        """Computes the integer value of a raw byte string."""
+        value = 0
+        for offset, c in enumerate(s[::-1]):
+            value += c << offset*8
+        return value
+
+    @staticmethod
+    def _to_str(i, len):
+        """
+        @param i:   Integer to convert into str
+        @param len: Length of the return value. If i does not fit OverflowError is raised.
+        @return:    string representation of i (MSB first)
+        """
+        return i.to_bytes(len, 'big')
+
+    @staticmethod
+    def _crc(s):
+        """Compute the crc checksum of value. This implementation is
+        a reimplementation of the Java function in the SI Programmers
+        manual examples."""
+        def twochars(s):
+            """generator that splits a string into parts of two chars"""
+            if len(s) == 0:
+                # immediately stop on empty string
+                return
+            
+            # add 0 to the string and make it even length
+            if len(s)%2 == 0:
+                s += b'\x00\x00'
+            else:
+                s += b'\x00'
+            for i in range(0, len(s), 2):
+                yield s[i:i+2]
+
+        if len(s) < 1:
+            # return value for 1 or no data byte is 0
+            return b'\x00\x00'
+        
+        crc = SICodec._to_int(s[0:2])
+        
+        for c in twochars(s[2:]):
+            val = SICodec._to_int(c)
+            
+            for j in range(16):
+                if (crc & SICodec.CRC_BITF) != 0:
+                    crc <<= 1
+                    
+                    if (val & SICodec.CRC_BITF) != 0:
+                        crc += 1 # rotate carry
+                        
+                    crc ^= SICodec.CRC_POLYNOM
+                else:
+                    crc <<= 1
+
+                    if (val & SICodec.CRC_BITF) != 0:
+                        crc += 1 # rotate carry
+                    
+                val <<= 1
+
+        # truncate to 16 bit and convert to char
+        crc &= 0xFFFF
+        return int2byte(crc >> 8) + int2byte(crc & 0xFF)
+
+    @staticmethod
+    def _crc_check(s, crc):
+        return SICodec._crc(s) == crc
+
+    @staticmethod
+    def _decode_cardnr(number):
+        """Decodes a 4 byte cardnr to an int. SI-Card numbering is a bit odd:
+           SI-Card 5:
+              - byte 0:   always 0 (not stored on the card)
+              - byte 1:   card series (stored on the card as CNS)
+              - byte 2,3: card number
+              - printed:  100'000*CNS + card number
+              - nr range: 1-65'000 + 200'001-265'000 + 300'001-365'000 + 400'001-465'000
+           SI-Card 6/6*/8/9/10/11/pCard/tCard/fCard/SIAC1:
+              - byte 0:   card series (SI6:00, SI9:01, SI8:02, pCard:04, tCard:06, fCard:0E, SI10+SI11+SIAC1:0F)
+              - byte 1-3: card number
+              - printed:  only card number
+              - nr range:
+                  - SI6: 500'000-999'999 + 2'003'000-2'003'400 (WM2003) + 16'711'680-16'777'215 (SI6*)
+                  - SI9: 1'000'000-1'999'999, SI8: 2'000'000-2'999'999
+                  - pCard: 4'000'000-4'999'999, tCard: 6'000'000-6'999'999
+                  - SI10: 7'000'000-7'999'999, SIAC1: 8'000'000-8'999'999
+                  - SI11: 9'000'000-9'999'999, fCard: 14'000'000-14'999'999
+
+           The card nr ranges guarantee that no ambigous values are possible
+           (500'000 = 0x07A120 > 0x04FFFF = 465'535 = highest technically possible value on a SI5)
+        """
+        
+        if number[0:1] != b'\x00':
+            raise SIReaderException('Unknown card series')
+        
+        nr = SICodec._to_int(number[1:4])
+        if nr < 500000:
+            # SI5 card
+            ret = SICodec._to_int(number[2:4])
+            if byte2int(number[1]) < 2:
+	        # Card series 0 and 1 do not have the 0/1 printed on the card
+                return ret
+            else:
+                return byte2int(number[1])*100000 + ret
+        else:
+            # SI6/8/9
+            return nr
+
+    @staticmethod
+    def _decode_time(raw_time, raw_ptd = None, reftime = None):
+        """Decodes a raw time value read from an si card into a datetime object.
+        The returned time is the nearest time matching the data before reftime."""
+
+        if raw_time == SICodec.TIME_RESET:
+            return None
+
+        if reftime is None:
+            # add two hours as a safety marging for cases where the
+            # machine time runs a bit behind the station's time.
+            reftime = datetime.now() + timedelta(hours=2)
+
+        #punchtime is in the range 0h-12h!
+        punchtime = timedelta(seconds = SICodec._to_int(raw_time))
+
+        # Documentation of the PTD byte from SportIdent
+        # bit 0 - am/pm
+        # bit 3...1 - day of week, 000 = Sunday, 110 = Saturday
+        # bit 5...4 - week counter 0...3, relative
+        # bit 7...6 - control station code number high
+        # (...511)
+        # week counter is not used!
+
+        if raw_ptd is not None:
+            ptd = byte2int(raw_ptd)
+
+            # get info about AM(0) or PM(1)
+            # and adjust punchtime in case of PM
+            if (ptd & 0b00000001) == 0b1:
+                punchtime = punchtime + timedelta(hours=12)
+
+            # extract day of week and convert to Mon = 0, Tue = 1 ... as
+            # datetime.weekday has Mon = 0, Sun = 6 the modulo operation
+            # takes care of underflows (Sun = -1)
+            dow = (((ptd & 0b00001110) >> 1) - 1) % 7
+
+            # subtract a whole week if the dow week is the same but the punchtime
+            # is later on the same day
+            if (reftime.weekday() == dow
+                and punchtime > timedelta(hours=reftime.hour, minutes=reftime.minute, seconds=reftime.second)):
+                reftime -= timedelta(days=7)
+            else:
+                # adjust reftime according to weekday information
+                reftime -= timedelta(days=(reftime.weekday()-dow) % 7)
+
+            ref_day = reftime.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+            return ref_day + punchtime
+
+        # No PTD byte available, we have to rely on guessing the closest 12h time
+
+        ref_day = reftime.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+        ref_hour = reftime - ref_day
+        t_noon = timedelta(hours=12)
+
+        if ref_hour < t_noon:
+            # reference time is before noon
+            if punchtime < ref_hour:
+                # t is between 00:00 and t_ref
+                return ref_day + punchtime
+            else:
+                # t is afternoon the day before
+                return ref_day - t_noon + punchtime
+        else:
+            # reference is after noon
+            if punchtime < ref_hour - t_noon:
+                # t is between noon and t_ref
+                return ref_day + t_noon + punchtime
+            else:
+                # t is in the late morning
+                return ref_day + punchtime
+
+    @staticmethod
+    def _decode_station_code(raw_code, raw_ptd = None):
+        """Decodes the station code read from an si card.
+        For cards newer than SI5, there are possibly two extra bits in the ptd byte,
+        allowing codes up to 1023 (although in practice these are rarely used by 
+        organizers as it would preclude the use of SI5 cards)."""
+        if raw_ptd is not None:
+            return ((raw_ptd & 0xc0) << 2) + raw_code
+        else:
+            return raw_code
+
+
+    @staticmethod
+    def _card_blocks_needed(header, card_type):
+        """Computes how many of the blocks in CARD_BLOCKS[card_type] must be read
+        to get all punches on the card.
+        @param header:    The first block of the card
+        @param card_type: 'SI6', 'SI8', 'SI9', 'pCard' or 'SI10'
+        @return:          Number of blocks, at least 1 (the header block)
+        """
+        card = SICodec.CARD[card_type]
+        punch_count = byte2int(header[card['RC']:card['RC']+1])
+        if punch_count > card['PM']:
+            punch_count = card['PM']
+        if punch_count == 0:
+            return 1
+        last_byte = card['P1'] + punch_count*card['PL'] - 1
+        return min(last_byte // SICodec.CARD_BLOCK_SIZE + 1, 
+                   len(SICodec.CARD_BLOCKS[card_type]))
+
+    @staticmethod
+    def _append_punch(list, station, timedata, ptd, reftime):
+        time = SICodec._decode_time(timedata, ptd, reftime)
+        if time is not None:
+            list.append((station, time))
+
+    @staticmethod
+    def _decode_carddata(data, card_type, reftime = None):
+        """Decodes a data record read from an SI Card."""
+
+        ret = {}
+        card = SICodec.CARD[card_type]
+        
+        # the slicing of data is necessary for Python 3 to get a bytes object instead
+        # of an int
+        ret['card_number'] = SICodec._decode_cardnr(b'\x00'
+                                                     + data[card['CN2']:card['CN2']+1]
+                                                     + data[card['CN1']:card['CN1']+1]
+                                                     + data[card['CN0']:card['CN0']+1])
+
+        time_day = data[card['STD']] if card['STD'] else None
+        code = data[card['SN']] if card['SN'] is not None else None
+        ret['start'] = SICodec._decode_time(data[card['ST']:card['ST']+2], time_day, reftime)
+        ret['start_code'] = SICodec._decode_station_code(code, time_day)
+
+        time_day = data[card['FTD']] if card['FTD'] else None
+        code = data[card['FN']] if card['FN'] is not None else None
+        ret['finish'] = SICodec._decode_time(data[card['FT']:card['FT']+2], time_day, reftime)
+        ret['finish_code'] = SICodec._decode_station_code(code, time_day)
+
+        time_day = data[card['CTD']] if card['CTD'] else None
+        code = data[card['CHN']] if card['CHN'] is not None else None
+        ret['check'] = SICodec._decode_time(data[card['CT']:card['CT']+2], time_day, reftime)
+        ret['check_code'] = SICodec._decode_station_code(code, time_day)
+
+        if card['LT'] is not None:
+            time_day = data[card['LTD']] if card['LTD'] else None
+            code = data[card['LN']] if card['LN'] is not None else None
+            ret['clear'] = SICodec._decode_time(data[card['LT']:card['LT']+2], time_day, reftime)
+            ret['clear_code'] = SICodec._decode_station_code(code, time_day)
+        else:
+            ret['clear'] = None # SI 5 and 9 cards don't store the clear time
+            ret['clear_code'] = None
+
+        punch_count = byte2int(data[card['RC']:card['RC']+1])
+        if card_type == 'SI5':
+            # RC is the index of the next punch on SI5
+            punch_count -= 1
+            
+        if punch_count > card['PM']:
+            punch_count = card['PM']
+            
+        ret['punches'] = []
+        p = 0
+        i = card['P1']
+        while p < punch_count:
+            if card_type == 'SI5' and i % 16 == 0:
+                # first byte of each block is reserved for punches 31-36
+                i += 1
+
+            ptd = data[i + card['PTD']] if card['PTD'] is not None else None
+            cn  = SICodec._decode_station_code(byte2int(data[i + card['CN']]), time_day)
+            pt  = data[i + card['PTH']:i + card['PTL']+1]
+
+            SICodec._append_punch(ret['punches'], cn, pt, ptd, reftime)
+
+            i += card['PL']
+            p += 1
+            
+        return ret
+
+    def _extract_sysval(bytearr, offset, length):
+        """
+        Extract a piece of the return data from the command C_GET_SYS_VAL '\x00\x80'.
+        @param bytearr: The byte array with data from _read_command()
+        @param offset:  The offset into the data (one of the SIReader.O_... constants)
+        @param length:  The number of bytes to return
+        @return: byte array with the extracted data
+        """
+        # Has to add 1 to the offset since the first byte of the data is for some reason
+        # not included in the offset constants (this byte always seems to be 0)
+        start = byte2int(offset)+1 
+        return bytearr[start:start+length]
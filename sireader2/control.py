@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+#
+#    Copyright (C) 2008-2014  Gaudenz Steinlin <gaudenz@durcheinandertal.ch>
+#                       2014  Simon Harston <simon@harston.de>
+#                       2015  Jan Vorwerk <jan.vorwerk@angexis.com>
+#                       2019  Per Magnusson <per.magnusson@gmail.com>
+#                       2023  Per Magnusson <per.magnusson@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+sireader2.control - Receiving punches from stations in autosend mode, also over radio and
+in the legacy protocol.
+"""
+
+from .protocol import SIReaderException, SIReaderTimeout, byte2int, int2byte
+from .reader import SIReader
+from .frames import SIFrameParser, SILegacyFrameParser
+from .log import SIProtocolLog
+from serial.serialutil import SerialException
+from collections import deque, namedtuple
+from datetime import timedelta
+from time import monotonic
+
+# A punch received from a station in autosend mode, see SIReaderControl.iter_punches()
+#   card:    card number
+#   code:    code of the control
+#   time:    datetime of the punch, including fractions of seconds
+#   offset:  address of the punch in the backup memory of the station
+#   station: serial number of the station connected to the computer
+SIPunch = namedtuple('SIPunch', 'card code time offset station')
+
+class SIReaderControl(SIReader):
+    """Class for reading an SI Station configured as control in autosend mode."""
+
+    RECOVERY_CHUNK   = 0x80 # Bytes of backup memory read per command when recovering lost punches
+    RECOVERY_RETRIES = 3    # Attempts to read a chunk of lost punches before giving up
+
+    def __init__(self, *args, **kwargs):
+        super(SIReaderControl, self).__init__(*args, **kwargs)
+        self._next_offset = None
+        self._gaps = []         # [first offset, end offset, failed attempts] of lost punches
+        self._frames = deque()  # Frames received while waiting for a backup memory reply
+        
+    def _unsolicited(self, frame):
+        if frame[0] == SIReader.C_TRANS_REC and not self._scheduler.subscribed():
+            self._frames.append(frame)
+
+    def poll_punch(self, timeout=0):
+        """Polls for new punches.
+        Punches lost on the way from the station (seen as a gap in the backup memory
+        offsets of the received punches) are recovered from the backup memory of
+        the station. The recovery is done in chunks of up to RECOVERY_CHUNK bytes,
+        one chunk per call when no other frames are waiting, so that a long radio
+        outage does not hold up the punches received after it.
+        @return: list of (cardnr, punchtime) tuples in backup memory order, empty 
+                 list if no new punches are available
+        """
+        return [(punch.card, punch.time) for punch in self._poll_punches(timeout, timeout)]
+
+    def iter_punches(self, timeout=None, flush_latency=0.05, window=1024):
+        """Generator yielding the punches as they are received, as SIPunch records.
+        The station is polled like with poll_punch(), and the punches of a poll
+        (the frames waiting when the first one arrived, and the lost punches 
+        recovered after them) are yielded together, in the order of that poll.
+        There is no extra wait to collect more punches. Lost punches are 
+        recovered like in poll_punch() and yielded when they have been read.
+        A punch that has already been yielded (e.g. a frame that was delayed on 
+        the way and also recovered from the backup memory) is not yielded again.
+        Duplicates are detected by control code and backup memory offset, or
+        by the whole punch if the offset is not known.
+        @param timeout:       Stop when no punch has been received for timeout 
+                              seconds. None to never stop.
+        @param flush_latency: Time in seconds to wait for the first frame of each 
+                              poll, i.e. how often the station is polled (and 
+                              lost punches recovered) when no frames arrive.
+        @param window:        Number of backup memory offsets to remember when 
+                              dropping duplicates.
+        """
+        seen = set()
+        order = deque()
+        last = monotonic()
+        while True:
+            punches = self._poll_punches(flush_latency, 0)
+            if punches:
+                last = monotonic()
+            elif timeout is not None and monotonic() - last >= timeout:
+                return
+            for punch in punches:
+                key = (punch.code, punch.offset) if punch.offset is not None else punch
+                if key in seen:
+                    continue
+                seen.add(key)
+                order.append(key)
+                if len(order) > window:
+                    seen.discard(order.popleft())
+                yield punch
+
+    async def aiter_punches(self, flush_latency=0.05, window=1024):
+        """Asynchronous version of iter_punches(). The station is read in a 
+        thread of the default executor of the running event loop."""
+        import asyncio
+        loop = asyncio.get_running_loop()
+        punches = self.iter_punches(None, flush_latency, window)
+        while True:
+            yield await loop.run_in_executor(None, next, punches)
+
+    def _poll_punches(self, timeout, next_timeout):
+        """Reads the punches that are available and recovers lost punches.
+        @param timeout:      Time to wait for the first frame
+        @param next_timeout: Time to wait for each of the following frames
+        @return:             list of SIPunch sorted by backup memory offset
+        """
+        if self._scheduler is not None and not self._scheduler.is_owner():
+            return self._scheduler.call(self._scheduler.PRIO_NORMAL, self._poll_punches,
+                                        timeout, next_timeout)
+
+        if not self.proto_config['ext_proto']:
+            raise SIReaderException('This command only supports stations in "Extended Protocol" '
+                                    'mode. Switch mode first')
+
+        if not self.proto_config['auto_send']:
+            raise SIReaderException('This command only supports stations in "Autosend" '
+                                    'mode. Switch mode first')
+
+        punches = []
+        while True:
+            if self._frames:
+                c = self._frames.popleft()
+            else:
+                try:
+                    c = self._read_command(timeout = timeout)
+                except SIReaderTimeout:
+                    break 
+            timeout = next_timeout
+        
+            if c[0] != SIReader.C_TRANS_REC:
+                raise SIReaderException('Unexpected command %s received' % hex(byte2int(c[0])))
+
+            punch = self._decode_trans_rec(c[1])
+            if (self._next_offset is not None and punch.offset < self._next_offset and
+                not any(gap[0] <= punch.offset < gap[1] for gap in self._gaps)):
+                # Not a frame of a gap that was delayed on the way, so the backup
+                # memory has wrapped or been erased or the station restarted. 
+                # Start over from this punch, the gaps after it are stale.
+                self._gaps = [gap for gap in self._gaps if gap[1] <= punch.offset]
+                self._next_offset = None
+            if (self._next_offset is not None and self._next_offset < punch.offset and
+                (punch.offset - self._next_offset) % SIReader.REC_LEN == 0):
+                # Lost punches, recovered below. A gap that is not whole records
+                # (a corrupt offset) can not be read from the backup memory.
+                self._gaps.append([self._next_offset, punch.offset, 0])
+            if self._next_offset is None or self._next_offset < punch.offset + SIReader.REC_LEN:
+                # A delayed frame of a gap does not move the expected offset back.
+                self._next_offset = punch.offset + SIReader.REC_LEN
+            punches.append(punch)
+
+        if self._gaps and self._serial.inWaiting() == 0:
+            punches.extend(self._recover_punches())
+            punches.sort(key=lambda punch: punch.offset)
+        if self._metrics is not None:
+            self._metrics.gauge('punches_outstanding', self.outstanding_punches())
+            if punches:
+                self._metrics.count('punches', len(punches))
+        return punches
+
+    def _decode_trans_rec(self, data):
+        """Decodes the data of a C_TRANS_REC frame, just read with _read_command().
+        @return: SIPunch
+        """
+        punchtime = self._decode_time(data[SIReader.T_TIME:SIReader.T_TIME+2],
+                                      data[SIReader.T_PTD:SIReader.T_PTD+1])
+        if punchtime is not None:
+            punchtime += timedelta(microseconds=1e6*byte2int(data[SIReader.T_TSS])/256)
+        return SIPunch(self._decode_cardnr(data[SIReader.T_CN:SIReader.T_CN+4]),
+                       self._station_code, punchtime,
+                       SIReader._to_int(data[SIReader.T_OFFSET:SIReader.T_OFFSET+3]),
+                       self._serno)
+
+    def outstanding_punches(self):
+        """Return the number of lost punches that have not been recovered yet."""
+        return sum([(gap[1] - gap[0]) // SIReader.REC_LEN for gap in self._gaps])
+
+    def _recover_punches(self):
+        """Reads the next chunk of lost punches from the backup memory.
+        @return: list of SIPunch
+        """
+        gap = self._gaps[0]
+        length = min(gap[1] - gap[0], SIReaderControl.RECOVERY_CHUNK)
+        length -= length % SIReader.REC_LEN
+        try:
+            c = self._send_command(SIReader.C_GET_BACKUP,
+                                   SIReader._to_str(gap[0], 3) + int2byte(length))
+            while c[0] != SIReader.C_GET_BACKUP:
+                # A punch sent by the station before the reply, handled 
+                # on the next call
+                self._frames.append(c)
+                c = self._read_command()
+        except (SIReaderException, SIReaderTimeout):
+            gap[2] += 1
+            if gap[2] >= SIReaderControl.RECOVERY_RETRIES:
+                # Give up this chunk
+                gap[0] += length
+                if gap[0] >= gap[1]:
+                    self._gaps.pop(0)
+            return []
+
+        records = SIReader._decode_backup(c[1][SIReader.BUX_FIRST+1:][:length], True)
+        punches = [SIPunch(cardnr, self._station_code, punchtime if not error else None,
+                           gap[0] + i*SIReader.REC_LEN, self._serno)
+                   for i, (punchtime, cardnr, error) in enumerate(records)]
+        gap[0] += length
+        gap[2] = 0
+        if gap[0] >= gap[1]:
+            self._gaps.pop(0)
+        if self._metrics is not None:
+            self._metrics.count('punches_recovered', len(punches))
+        return punches
+
+    def _read_punch(self, offset):
+        """Reads a punch from the SI Stations backup memory.
+        @param offset: Position in the backup memory to read
+        @warning:      Only supports firmwares 5.55+ older firmwares have an incompatible record format!
+        """
+        c = self._send_command(SIReader.C_GET_BACKUP,
+                               SIReader._to_str(offset, 3)+int2byte(SIReader.REC_LEN))
+        return (self._decode_cardnr(b'\x00'+c[1][SIReader.BC_CN:SIReader.BC_CN+3]),
+                self._decode_time(c[1][SIReader.BC_TIME:SIReader.BC_TIME+2]))
+
+class SIReaderRadio(SIReaderControl):
+    """Class for receiving punches from an SRR dongle (SIMSRR1-AP) or a BS11 
+    station, i.e. punches sent over radio by many controls, possibly hundreds
+    per second at a mass start with SIAC cards.
+
+    All bytes available from the serial port are read at once and parsed in a
+    single pass with SIFrameParser, instead of reading each frame field by 
+    field. Besides C_TRANS_REC (punches), C_SRR_PING (heartbeats from linked
+    controls) and C_SRR_ADHOC (ad-hoc messages, e.g. from SIAC cards) frames 
+    are kept, and other frames are counted and ignored.
+
+    The backup memories of the controls can not be read through the dongle, so
+    lost punches can not be recovered. They are counted per control code in
+    lost_punches, from the gaps in the backup memory offsets.
+    """
+
+    ADHOC_KEEP = 100    # Number of ad-hoc messages kept in adhoc
+    EXTENDED   = True   # Station in extended protocol mode
+
+    def __init__(self, *args, **kwargs):
+        """See SIReader.__init__() for the common parameters."""
+        super(SIReaderRadio, self).__init__(*args, **kwargs)
+        self._parser = SIFrameParser()
+        self._next_offsets = {}     # Control code: next expected backup memory offset
+        self._lost_from = {}        # Control code: first backup memory offset of the latest gap
+        self.lost_punches = {}      # Control code: number of punches lost
+        self.pings = {}             # Control code: (time.monotonic(), data) of the latest ping
+        self.adhoc = deque(maxlen=SIReaderRadio.ADHOC_KEEP) # (time.monotonic(), code, data)
+        self.other_frames = 0       # Number of frames of other types
+
+    def outstanding_punches(self):
+        """Lost punches are not recovered over radio, see lost_punches."""
+        return 0
+
+    def _poll_punches(self, timeout, next_timeout):
+        """Reads the available frames from the serial port.
+        @param timeout:      Time to wait for the first byte
+        @param next_timeout: Time to wait for more bytes after each read
+        @return:             list of SIPunch in the order received
+        """
+        if self._scheduler is not None and not self._scheduler.is_owner():
+            return self._scheduler.call(self._scheduler.PRIO_NORMAL, self._poll_punches,
+                                        timeout, next_timeout)
+        if self.EXTENDED and not self.proto_config['ext_proto']:
+            raise SIReaderException('This command only supports stations in "Extended Protocol" '
+                                    'mode. Switch mode first')
+
+        punches = []
+        while True:
+            try:
+                old_timeout = self._serial.timeout
+                self._serial.timeout = timeout
+                try:
+                    data = self._serial.read()
+                finally:
+                    self._serial.timeout = old_timeout
+                if data == b'':
+                    break
+                data += self._serial.read(self._serial.inWaiting())
+            except (SerialException, OSError) as msg:
+                raise SIReaderException('Error reading command: %s' % msg)
+            timeout = next_timeout
+
+            self._parser.feed(data)
+            crc_errors = self._parser.crc_errors
+            for cmd, station, data, frame in self._parser.frames():
+                if self._logfile is not None:
+                    self._logfile.write(SIProtocolLog.RECEIVED, frame)
+                if self._trace is not None:
+                    self._trace.record(SIProtocolLog.RECEIVED, frame)
+                if self._metrics is not None:
+                    self._metrics.received(byte2int(cmd), len(frame))
+                punch = self._handle_frame(cmd, station, data)
+                if punch is not None:
+                    self._count_lost(punch)
+                    punches.append(punch)
+            if self._metrics is not None and self._parser.crc_errors > crc_errors:
+                for i in range(self._parser.crc_errors - crc_errors):
+                    self._metrics.event('crc_error')
+
+        if self._metrics is not None and punches:
+            self._metrics.count('punches', len(punches))
+        return punches
+
+    def _drain_input(self):
+        # Parsed by the next _poll_punches()
+        self._parser.feed(self._serial.read(self._serial.inWaiting()))
+
+    def _handle_frame(self, cmd, station, data):
+        """Handles a frame from the parser.
+        @return: SIPunch if the frame is a punch, otherwise None
+        """
+        if cmd == SIReader.C_TRANS_REC:
+            self._station_code = station
+            return self._decode_trans_rec(data)
+        elif cmd == SIReader.C_SRR_PING:
+            self.pings[station] = (monotonic(), data)
+        elif cmd == SIReader.C_SRR_ADHOC:
+            self.adhoc.append((monotonic(), station, data))
+        else:
+            self.other_frames += 1
+        return None
+
+    def _count_lost(self, punch):
+        """Counts the punches lost before punch, from the backup memory offsets."""
+        next_offset = self._next_offsets.get(punch.code)
+        if (next_offset is not None and punch.offset < next_offset and
+            punch.offset < self._lost_from.get(punch.code, next_offset)):
+            # Not a delayed frame of the latest gap, so the backup memory has
+            # wrapped or been erased or the control restarted. Start over.
+            self._lost_from.pop(punch.code, None)
+            next_offset = None
+        if next_offset is not None and next_offset < punch.offset:
+            lost = (punch.offset - next_offset) // SIReader.REC_LEN
+            self.lost_punches[punch.code] = self.lost_punches.get(punch.code, 0) + lost
+            self._lost_from[punch.code] = next_offset
+            if self._metrics is not None:
+                self._metrics.count('punches_lost', lost)
+        if next_offset is None or next_offset < punch.offset + SIReader.REC_LEN:
+            self._next_offsets[punch.code] = punch.offset + SIReader.REC_LEN
+
+class SIReaderLegacy(SIReaderRadio):
+    """Class for receiving punches sent in legacy protocol autosend mode, e.g. 
+    from a concentrator box or a station set up with si_set_legacy_4800.py.
+    Such stations do not answer extended protocol commands, so create the 
+    reader with noconnect=True (the port is opened at 4800 baud).
+
+    The frames (BC_TRANS_REC, BC_TRANS_REC2) have no length and no CRC, and
+    bytes below 0x20 in the data are escaped with DLE. They are parsed in a
+    single pass over the received bytes by SILegacyFrameParser and the punches
+    are returned by poll_punch() and iter_punches() like for SIReaderControl.
+
+    The layout of the frames is inferred from their length, see LT_LAYOUTS.
+    Frames of other lengths are counted in other_frames. The offset of a 
+    punch is None if the frame has no backup memory address, and lost 
+    punches are not counted since the size of the backup memory records of
+    the sending station is not known.
+    """
+
+    EXTENDED = False
+
+    def __init__(self, *args, **kwargs):
+        """See SIReader.__init__() for the common parameters."""
+        super(SIReaderLegacy, self).__init__(*args, **kwargs)
+        self._parser = SILegacyFrameParser()
+
+    def _handle_frame(self, cmd, station, data):
+        if cmd in (SIReader.BC_TRANS_REC, SIReader.BC_TRANS_REC2):
+            punch = self._decode_legacy_trans_rec(data)
+            if punch is not None:
+                return punch
+        self.other_frames += 1
+        return None
+
+    def _count_lost(self, punch):
+        pass
+
+    def _decode_legacy_trans_rec(self, data):
+        """Decodes the data of a legacy autosend frame, after DLE unescaping.
+        @return: SIPunch, or None if the length of the data is not known
+        """
+        layout = SIReader.LT_LAYOUTS.get(len(data))
+        if layout is None:
+            return None
+        cn, cn_len, td, th, tss, mem = layout
+        code = data[SIReader.LT_CN]
+        raw_ptd = None
+        if td is not None:
+            raw_ptd = data[td:td+1]
+            code |= (data[td] & 0xC0) << 2
+        punchtime = self._decode_time(data[th:th+2], raw_ptd)
+        if punchtime is not None and tss is not None:
+            punchtime += timedelta(microseconds=1e6*data[tss]/256)
+        cardnr = self._decode_cardnr(bytes(4 - cn_len) + data[cn:cn+cn_len])
+        offset = SIReader._to_int(data[mem:mem+3]) if mem is not None else None
+        self._station_code = code
+        return SIPunch(cardnr, code, punchtime, offset, self._serno)
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+#
+#    Copyright (C) 2008-2014  Gaudenz Steinlin <gaudenz@durcheinandertal.ch>
+#                       2014  Simon Harston <simon@harston.de>
+#                       2015  Jan Vorwerk <jan.vorwerk@angexis.com>
+#                       2019  Per Magnusson <per.magnusson@gmail.com>
+#                       2023  Per Magnusson <per.magnusson@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+sireader2.frames - Incremental parsers of the frames in a stream of bytes, for stations
+that send on their own.
+"""
+
+from .codec import SICodec
+import re
+
+class SIFrameParser(object):
+    """Incremental parser of extended protocol frames (STX, command, length,
+    station code, data, CRC, ETX). Bytes are added with feed() as they are 
+    read, and frames() returns the complete frames, parsed in a single pass
+    over the buffer. Bytes before a frame (e.g. WAKEUP) are skipped, and 
+    frames with a bad CRC or no ETX are dropped by searching for the next STX.
+    The buffer never holds more than max_buffer bytes.
+    """
+
+    def __init__(self, max_buffer=0x10000):
+        self.max_buffer = max_buffer
+        self._buf = bytearray()
+        self.crc_errors = 0     # Frames dropped because of bad CRC or missing ETX
+        self.skipped = 0        # Bytes skipped outside of frames
+
+    def feed(self, data):
+        self._buf += data
+        if len(self._buf) > self.max_buffer:
+            drop = len(self._buf) - self.max_buffer
+            del self._buf[:drop]
+            self.skipped += drop
+
+    def frames(self):
+        """Return and remove the complete frames in the buffer.
+        @return: list of (command, station code, data, frame) where command is
+                 a 1 byte bytes object like the C_ constants, station code an
+                 int, data the bytes after the station code (like the data 
+                 returned by SIReader._read_command()) and frame the raw frame.
+        """
+        buf = self._buf
+        n = len(buf)
+        ret = []
+        pos = 0
+        while pos < n:
+            if buf[pos] != SICodec.STX[0]:
+                nxt = buf.find(SICodec.STX, pos)
+                if nxt < 0:
+                    nxt = n
+                self.skipped += nxt - pos
+                pos = nxt
+                continue
+            end = self._frame_end(pos)
+            if end is None:
+                # Incomplete. A stray STX with a large length byte must not hold
+                # up the frames after it, so give up on it if a complete frame
+                # follows.
+                nxt = buf.find(SICodec.STX, pos + 1)
+                while nxt >= 0 and not self._frame_end(nxt):
+                    nxt = buf.find(SICodec.STX, nxt + 1)
+                if nxt < 0:
+                    break
+                self.crc_errors += 1
+                self.skipped += nxt - pos
+                pos = nxt
+                continue
+            if end == 0:
+                # Not a frame after all, look for the next STX
+                self.crc_errors += 1
+                self.skipped += 1
+                pos += 1
+                continue
+            frame = bytes(buf[pos:end])
+            ret.append((frame[1:2], (frame[3] << 8) | frame[4], frame[5:-3], frame))
+            pos = end
+        del buf[:pos]
+        return ret
+
+    def _frame_end(self, pos):
+        """Check the frame starting with the STX at pos.
+        @return: the position after the frame if it is complete and valid, None if
+                 it is incomplete and 0 if it is invalid
+        """
+        buf = self._buf
+        if pos + 3 > len(buf):
+            return None
+        length = buf[pos+2]
+        end = pos + length + 6
+        if end > len(buf):
+            return None
+        if (buf[end-1] != SICodec.ETX[0] or length < 2 or
+            not SICodec._crc_check(buf[pos+1:pos+3+length], buf[pos+3+length:pos+5+length])):
+            return 0
+        return end
+
+class SILegacyFrameParser(object):
+    """Incremental parser of legacy protocol frames (STX, command, data, ETX),
+    where bytes below 0x20 in the data are preceded by DLE. The bytes added
+    with feed() are scanned once, with the unescaping done on the way, and 
+    the state (e.g. a frame or a DLE split between two reads) is kept until 
+    the next call. Has the same interface as SIFrameParser.
+    """
+
+    SPECIAL = re.compile(b'[\x02\x03\x10]')  # STX, ETX and DLE
+
+    def __init__(self, max_frame=0x100):
+        self.max_frame = max_frame
+        self.crc_errors = 0     # Frames dropped because they were too long or cut off by an STX
+        self.skipped = 0        # Bytes skipped outside of frames
+        self._frames = []       # Complete frames not yet returned by frames()
+        self._frame = None      # Unescaped bytes of the current frame, None outside of frames
+        self._raw = None        # Raw bytes of the current frame from earlier calls to feed()
+        self._escape = False    # The last byte was a DLE
+
+    def feed(self, data):
+        n = len(data)
+        pos = 0
+        start = 0               # Start of the raw bytes of the current frame in data
+        while pos < n:
+            if self._frame is None:
+                start = data.find(SICodec.STX, pos)
+                if start < 0:
+                    self.skipped += n - pos
+                    return
+                self.skipped += start - pos
+                self._frame = bytearray()
+                self._raw = bytearray()
+                pos = start + 1
+                continue
+            if self._escape:
+                self._frame.append(data[pos])
+                self._escape = False
+                pos += 1
+                continue
+            m = SILegacyFrameParser.SPECIAL.search(data, pos)
+            end = m.start() if m is not None else n
+            self._frame += data[pos:end]
+            pos = end
+            if m is not None:
+                c = data[end]
+                pos += 1
+                if c == SICodec.DLE[0]:
+                    self._escape = True
+                elif c == SICodec.ETX[0]:
+                    # A frame that is too long is dropped below
+                    frame = self._frame
+                    if len(frame) <= self.max_frame:
+                        self._frames.append((bytes(frame[0:1]), None, bytes(frame[1:]),
+                                             bytes(self._raw + data[start:pos])))
+                        self._frame = None
+                else:
+                    # An STX in the middle of a frame, the frame was cut off
+                    self.crc_errors += 1
+                    self.skipped += len(self._raw) + end - start
+                    self._frame = bytearray()
+                    self._raw = bytearray()
+                    start = end
+            if self._frame is not None and len(self._frame) > self.max_frame:
+                self.crc_errors += 1
+                self.skipped += len(self._raw) + pos - start
+                self._frame = None
+                self._escape = False
+        if self._frame is not None:
+            self._raw += data[start:n]
+
+    def frames(self):
+        """Return and remove the complete frames.
+        @return: list of (command, None, data, frame) where command is a 1 byte
+                 bytes object like the BC_ constants, data the unescaped bytes
+                 after the command and frame the raw frame. The second item
+                 is None since legacy frames have no station code.
+        """
+        ret = self._frames
+        self._frames = []
+        return ret
@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+#
+#    Copyright (C) 2008-2014  Gaudenz Steinlin <gaudenz@durcheinandertal.ch>
+#                       2014  Simon Harston <simon@harston.de>
+#                       2015  Jan Vorwerk <jan.vorwerk@angexis.com>
+#                       2019  Per Magnusson <per.magnusson@gmail.com>
+#                       2023  Per Magnusson <per.magnusson@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+sireader2.log - Binary protocol logs, in-memory protocol traces and replay of logs.
+"""
+
+from .protocol import SIReaderException
+from .codec import SICodec
+from datetime import datetime
+from time import monotonic
+import os, sys
+import atexit
+import queue
+import struct
+import threading
+import time as systime
+
+class SIProtocolLog(object):
+    """Append-only binary log of the raw frames exchanged with a station.
+
+    The file consists of records with the layout:
+        2 bytes  length of the frame (little endian)
+        8 bytes  time.monotonic() when the frame was sent or received (double)
+        1 byte   direction: b's' sent, b'r' received, b'o' log opened
+        n bytes  the raw frame
+    Every time the log is opened, a b'o' record is written whose frame is 
+    the wall clock time (time.time(), a little endian double), so that the 
+    monotonic timestamps of the following records can be converted to 
+    real time. Several sessions can thus be appended to the same file.
+
+    Records are written to the file by a background thread, so writing a
+    record only costs a queue insertion for the caller. When the data is
+    synced to disk is controlled by the sync parameter:
+        SYNC_FRAME: flush and fsync after every record
+        SYNC_GROUP: flush and fsync at most group_ms after a record was written
+        SYNC_CLOSE: only flush and fsync when the log is closed
+    """
+
+    RECORD     = struct.Struct('<Hdc')
+    SENT       = b's'
+    RECEIVED   = b'r'
+    OPENED     = b'o'
+    SYNC_FRAME = 'frame'
+    SYNC_GROUP = 'group'
+    SYNC_CLOSE = 'close'
+
+    def __init__(self, filename, sync=SYNC_GROUP, group_ms=50):
+        if sync not in (SIProtocolLog.SYNC_FRAME, SIProtocolLog.SYNC_GROUP, 
+                        SIProtocolLog.SYNC_CLOSE):
+            raise SIReaderException("Unknown log sync mode '%s'" % sync)
+        self._file = open(filename, 'ab')
+        self._sync = sync
+        self._group = group_ms / 1000.0
+        self._queue = queue.SimpleQueue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='SIProtocolLog',
+                                        daemon=True)
+        self._thread.start()
+        self.write(SIProtocolLog.OPENED, struct.pack('<d', systime.time()))
+        atexit.register(self.close)
+
+    def write(self, direction, frame):
+        """Queue a frame to be written to the log.
+        @param direction: SENT or RECEIVED
+        @param frame:     the raw bytes
+        """
+        self._queue.put((monotonic(), direction, bytes(frame)))
+
+    def close(self):
+        """Write all queued records, sync the file to disk and close it."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+        atexit.unregister(self.close)
+
+    def _run(self):
+        """Writer thread."""
+        record = SIProtocolLog.RECORD
+        dirty = False
+        deadline = None
+        while True:
+            timeout = None
+            if dirty and self._sync == SIProtocolLog.SYNC_GROUP:
+                timeout = max(0.0, deadline - monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                # Group commit interval has passed
+                self._fsync()
+                dirty = False
+                continue
+            if item is None:
+                self._fsync()
+                return
+            stamp, direction, frame = item
+            self._file.write(record.pack(len(frame), stamp, direction) + frame)
+            if self._sync == SIProtocolLog.SYNC_FRAME:
+                self._fsync()
+            elif not dirty:
+                dirty = True
+                deadline = stamp + self._group
+
+    def _fsync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    @staticmethod
+    def iter_records(buf):
+        """Parse the records of a protocol log.
+        @param buf: the contents of a log file, e.g. bytes or an mmap object
+        @return:    generator of (timestamp, direction, frame) tuples. For b'o'
+                    records, the frame is the wall clock time as a float.
+                    A truncated record at the end of the log is ignored.
+        """
+        record = SIProtocolLog.RECORD
+        size = record.size
+        pos = 0
+        end = len(buf)
+        while pos + size <= end:
+            length, stamp, direction = record.unpack_from(buf, pos)
+            pos += size
+            if pos + length > end:
+                return
+            frame = buf[pos:pos+length]
+            pos += length
+            if direction == SIProtocolLog.OPENED:
+                frame = struct.unpack('<d', frame)[0]
+            yield (stamp, direction, frame)
+
+class SIProtocolTrace(object):
+    """Fixed size in-memory ring buffer of the latest raw frames exchanged with
+    a station, kept by SIReader when it is created with trace=<size>.
+
+    Recording a frame only stores a (timestamp, direction, frame) tuple in a
+    preallocated list, so tracing does not change the timing of the 
+    communication the way debug=True does. The frames are only formatted
+    when the trace is dumped, e.g. when a command fails (dump_on_error), on
+    a signal (dump_on_signal()) or by calling dump().
+    """
+
+    _names = None   # Command code: name, built on the first decoded dump
+
+    SENT       = SIProtocolLog.SENT
+    RECEIVED   = SIProtocolLog.RECEIVED
+
+    def __init__(self, size=1024, dump_on_error=None):
+        """
+        @param size:          Number of frames to keep
+        @param dump_on_error: File object (e.g. sys.stderr) to dump the trace to
+                              when a command sent with _send_command() fails,
+                              or None.
+        """
+        self.size = size
+        self.dump_on_error = dump_on_error
+        self._buf = [None] * size
+        self._n = 0
+        # Offset from time.monotonic() to time.time() for the dumps
+        self._wallclock = systime.time() - monotonic()
+
+    def record(self, direction, frame):
+        """Store a frame.
+        @param direction: SIProtocolLog.SENT or SIProtocolLog.RECEIVED
+        """
+        self._buf[self._n % self.size] = (monotonic(), direction, frame)
+        self._n += 1
+
+    def clear(self):
+        self._buf = [None] * self.size
+        self._n = 0
+
+    def __len__(self):
+        return min(self._n, self.size)
+
+    def records(self):
+        """Return the stored (timestamp, direction, frame) records, oldest first.
+        The timestamps are time.monotonic() values."""
+        n = self._n
+        buf = list(self._buf)
+        if n <= self.size:
+            return buf[:n]
+        i = n % self.size
+        return buf[i:] + buf[:i]
+
+    def dump(self, file=None, decoded=True, last=None):
+        """Write the trace in readable form, one frame per line.
+        @param file:    File object to write to, sys.stderr by default
+        @param decoded: Split the frames into command, station, data and crc, 
+                        and name the commands. Otherwise the raw frames are 
+                        written in hex.
+        @param last:    Only write the last frames
+        """
+        if file is None:
+            file = sys.stderr
+        records = self.records()
+        if last is not None:
+            records = records[-last:]
+        file.write('--- Protocol trace, %d of %d frames ---\n' % (len(records), self._n))
+        for stamp, direction, frame in records:
+            wallclock = datetime.fromtimestamp(stamp + self._wallclock)
+            arrow = '==>>' if direction == SIProtocolLog.SENT else '<<=='
+            if decoded:
+                text = SIProtocolTrace.format_frame(frame, direction == SIProtocolLog.RECEIVED)
+            else:
+                text = SIProtocolTrace._hex(frame)
+            file.write('%s %s %s\n' % (wallclock.strftime('%H:%M:%S.%f'), arrow, text))
+        file.flush()
+
+    def dump_on_signal(self, signum=None, file=None, decoded=True):
+        """Dump the trace when the process receives a signal. Must be called 
+        from the main thread.
+        @param signum: SIGUSR1 by default (SIGBREAK, i.e. Ctrl-Break, on Windows)
+        """
+        import signal
+        if signum is None:
+            signum = signal.SIGUSR1 if hasattr(signal, 'SIGUSR1') else signal.SIGBREAK
+        signal.signal(signum, lambda signum, stack: self.dump(file, decoded))
+
+    def save(self, filename):
+        """Append the trace to a protocol log file in the format of SIProtocolLog,
+        so that it can be played back with si_replay.py."""
+        with open(filename, 'ab') as f:
+            stamp = struct.pack('<d', systime.time())
+            f.write(SIProtocolLog.RECORD.pack(len(stamp), monotonic(), SIProtocolLog.OPENED))
+            f.write(stamp)
+            for record_stamp, direction, frame in self.records():
+                f.write(SIProtocolLog.RECORD.pack(len(frame), record_stamp, direction))
+                f.write(frame)
+
+    @staticmethod
+    def format_frame(frame, received=False):
+        """Return a frame as text with the command named and the fields split.
+        @param received: True if the frame was sent by a station
+        """
+        if frame[0:1] == SICodec.WAKEUP:
+            prefix = 'WAKEUP '
+            frame = frame[1:]
+        else:
+            prefix = ''
+        if len(frame) == 1:
+            for name in ('ACK', 'NAK', 'STX', 'ETX'):
+                if frame == getattr(SICodec, name):
+                    return prefix + name
+        if (len(frame) < 6 or frame[0:1] != SICodec.STX or 
+            len(frame) != frame[2] + 6):
+            return prefix + 'invalid frame: ' + SIProtocolTrace._hex(frame)
+
+        if SIProtocolTrace._names is None:
+            names = {}
+            for name in dir(SICodec):
+                value = getattr(SICodec, name)
+                if name.startswith('C_') and isinstance(value, bytes) and len(value) == 1:
+                    names.setdefault(value[0], name)
+            SIProtocolTrace._names = names
+        cmd = frame[1]
+        length = frame[2]
+        if SICodec._crc_check(frame[1:3+length], frame[3+length:5+length]):
+            crc = 'crc ok'
+        else:
+            crc = 'crc %s FAILED' % SIProtocolTrace._hex(frame[3+length:5+length])
+        if frame[-1:] != SICodec.ETX:
+            crc += ', no ETX'
+        if received and length >= 2:
+            # Frames from a station start with the station code
+            fields = 'station %s, data %s' % (SIProtocolTrace._hex(frame[3:5]),
+                                              SIProtocolTrace._hex(frame[5:3+length]))
+        else:
+            fields = 'parameters %s' % SIProtocolTrace._hex(frame[3:3+length])
+        return '%s%s (0x%02x) len %d, %s, %s' % (
+            prefix, SIProtocolTrace._names.get(cmd, 'unknown'), cmd, length, fields, crc)
+
+    @staticmethod
+    def _hex(data):
+        return ' '.join(['%02x' % c for c in data])
+
+class SIReplaySerial(object):
+    """Serial port like object that plays back a session recorded by SIProtocolLog.
+    Pass it to SIReader (or a subclass) with the serial parameter to run the 
+    decoding code on the recorded data.
+
+    The received frames are returned by read() in the recorded order. A frame 
+    that was received after a command was sent is not made available until 
+    the host has written the corresponding command, so request/response 
+    exchanges are replayed like they happened. Writes are compared to the 
+    recorded commands, without a leading WAKEUP, and differences are counted in 
+    'mismatches'.
+    """
+
+    def __init__(self, records, speed=0, port='replay'):
+        """
+        @param records: Iterator over (timestamp, direction, frame) tuples as 
+                        returned by SIProtocolLog.iter_records(). A leading b'o' 
+                        record is taken as the start of the session, the next 
+                        b'o' record ends it and is saved in next_session.
+        @param speed:   1 replays at the recorded speed, 10 ten times faster etc,
+                        0 as fast as possible.
+        @param port:    Name reported as port.
+        """
+        self.port = port
+        self.name = port
+        self.portstr = port
+        self.baudrate = 38400
+        self.timeout = 2
+        self.speed = speed
+        self.started = None      # Wall clock time when the session was recorded
+        self.next_session = None # b'o' record that started the next session
+        self.frames = 0          # Number of received frames played back
+        self.bytes = 0           # Number of received bytes played back
+        self.mismatches = 0      # Number of writes that differ from the recording
+        self._records = records
+        self._ahead = []         # Records read from the log but not yet played
+        self._writes = []        # Writes not yet matched with a sent record
+        self._rx = bytearray()
+        self._eof = False
+        self._t0 = None          # (recorded time, replay time) to schedule frames from
+        first = next(self._records, None)
+        if first is None:
+            self._eof = True
+        elif first[1] == SIProtocolLog.OPENED:
+            self.started = first[2]
+        else:
+            self._ahead.append(first)
+
+    @property
+    def done(self):
+        """True when all data of the session has been played back and read."""
+        # Look for the end of the session, which is only found by reading past it
+        return not self._rx and not self._peek(1)
+
+    def pending_writes(self, count=1):
+        """Return the next recorded commands the host has not sent yet.
+        @param count: Max number of commands to return
+        @return:      List of raw frames, empty if the next recorded frames
+                      are all received ones.
+        """
+        writes = []
+        count += len(self._writes)
+        ii = 0
+        while len(writes) < count:
+            if ii >= len(self._ahead) and not self._peek(ii + 1):
+                break
+            if self._ahead[ii][1] == SIProtocolLog.SENT:
+                writes.append(self._ahead[ii][2])
+            ii += 1
+        return writes[len(self._writes):]
+
+    def write(self, data):
+        self._writes.append(bytes(data))
+        return len(data)
+
+    def read(self, size=1):
+        if self.timeout is None:
+            wait = float('inf')
+        else:
+            wait = self.timeout
+        deadline = monotonic() + wait
+        while len(self._rx) < size:
+            if not self._load(deadline):
+                break
+        ret = bytes(self._rx[:size])
+        del self._rx[:size]
+        return ret
+
+    def inWaiting(self):
+        now = monotonic()
+        while self._load(now):
+            pass
+        return len(self._rx)
+
+    @property
+    def in_waiting(self):
+        return self.inWaiting()
+
+    def flushInput(self):
+        self._rx.clear()
+
+    def flushOutput(self):
+        pass
+
+    reset_input_buffer = flushInput
+    reset_output_buffer = flushOutput
+
+    def close(self):
+        pass
+
+    def _peek(self, count):
+        """Read records from the log until there are count records ahead.
+        @return: True if there are count records ahead."""
+        while len(self._ahead) < count and not self._eof:
+            try:
+                rec = next(self._records)
+            except StopIteration:
+                self._eof = True
+                break
+            if rec[1] == SIProtocolLog.OPENED:
+                self.next_session = rec
+                self._eof = True
+                break
+            self._ahead.append(rec)
+        return len(self._ahead) >= count
+
+    def _load(self, deadline):
+        """Move the next received frame into the input buffer if it is due
+        before deadline, waiting for it if needed.
+        @return: True if a frame was added to the input buffer."""
+        while self._peek(1):
+            stamp, direction, frame = self._ahead[0]
+            if direction == SIProtocolLog.SENT:
+                if not self._writes:
+                    # The host has not sent this command yet
+                    return False
+                # Whether WAKEUP is sent depends on the time since the last reply,
+                # which differs when replaying at another speed
+                if (self._writes.pop(0).lstrip(SICodec.WAKEUP) != 
+                    frame.lstrip(SICodec.WAKEUP)):
+                    self.mismatches += 1
+                self._ahead.pop(0)
+                # Schedule the replies relative to when the command was sent
+                self._t0 = (stamp, monotonic())
+                continue
+            if self.speed > 0:
+                if self._t0 is None:
+                    self._t0 = (stamp, monotonic())
+                due = self._t0[1] + (stamp - self._t0[0]) / self.speed
+                if due > deadline:
+                    systime.sleep(max(0.0, deadline - monotonic()))
+                    return False
+                if due > monotonic():
+                    systime.sleep(due - monotonic())
+            self._ahead.pop(0)
+            self._rx += frame
+            self.frames += 1
+            self.bytes += len(frame)
+            return True
+        return False
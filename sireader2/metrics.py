@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+#
+#    Copyright (C) 2008-2014  Gaudenz Steinlin <gaudenz@durcheinandertal.ch>
+#                       2014  Simon Harston <simon@harston.de>
+#                       2015  Jan Vorwerk <jan.vorwerk@angexis.com>
+#                       2019  Per Magnusson <per.magnusson@gmail.com>
+#                       2023  Per Magnusson <per.magnusson@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+sireader2.metrics - Communication metrics and their Prometheus exporter.
+"""
+
+from .protocol import SIReaderException
+import threading
+import time as systime
+
+class SIMetrics(object):
+    """Counters of the communication with a station, kept by SIReader when
+    it is created with metrics=True or a metrics_hook.
+
+    Per command code, the number of commands sent, replies received, errors
+    and timeouts are counted, together with a histogram of the round trip
+    times (from writing the command until the reply has been read). In total,
+    the bytes and frames in each direction are counted together with NAKs,
+    CRC failures, framing errors (missing ETX) and resyncs (input flushed 
+    after an invalid start byte), and the cards read and punches received 
+    (and recovered from the backup memory) by SIReaderReadout and 
+    SIReaderControl.
+
+    The counters are protected by a lock so that snapshot() can be called
+    from another thread than the one talking to the station.
+    """
+
+    # Upper bounds in seconds of the buckets of the round trip time histogram
+    RTT_BUCKETS = (0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, float('inf'))
+
+    # Counters that are not per command
+    COUNTERS = ('bytes_out', 'bytes_in', 'frames_out', 'frames_in', 'timeouts',
+                'naks', 'crc_errors', 'framing_errors', 'resyncs',
+                'cards_read', 'punches', 'punches_recovered', 'punches_lost')
+
+    # Current values
+    GAUGES = ('punches_outstanding',)
+
+    def __init__(self, hook=None):
+        """
+        @param hook: Optional function called as hook(event, command, value) 
+                     for every event: 'rtt' (value is the round trip time in s),
+                     'timeout', 'error', 'nak', 'crc_error', 'framing_error' and
+                     'resync'. command is the command code (an int) or None. 
+                     The hook is called from the thread talking to the station
+                     and should return quickly.
+        """
+        self.hook = hook
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Clear all counters."""
+        with self._lock:
+            self._counters = dict.fromkeys(SIMetrics.COUNTERS, 0)
+            self._gauges = dict.fromkeys(SIMetrics.GAUGES, 0)
+            self._commands = {}
+            self._started = systime.time()
+
+    def _command(self, code):
+        # Must be called with the lock held
+        entry = self._commands.get(code)
+        if entry is None:
+            entry = self._commands[code] = {
+                'sent': 0, 'received': 0, 'errors': 0, 'timeouts': 0,
+                'rtt_sum': 0.0, 'rtt_max': 0.0,
+                'rtt_hist': [0] * len(SIMetrics.RTT_BUCKETS)}
+        return entry
+
+    def sent(self, command, nbytes):
+        """A command (or an ACK if command is None) of nbytes was written."""
+        with self._lock:
+            self._counters['bytes_out'] += nbytes
+            self._counters['frames_out'] += 1
+            if command is not None:
+                self._command(command)['sent'] += 1
+
+    def received(self, command, nbytes):
+        """A complete frame of nbytes was read."""
+        with self._lock:
+            self._counters['bytes_in'] += nbytes
+            self._counters['frames_in'] += 1
+            self._command(command)['received'] += 1
+
+    def rtt(self, command, seconds):
+        """The reply to command was received after seconds."""
+        with self._lock:
+            entry = self._command(command)
+            entry['rtt_sum'] += seconds
+            if seconds > entry['rtt_max']:
+                entry['rtt_max'] = seconds
+            i = 0
+            while seconds > SIMetrics.RTT_BUCKETS[i]:
+                i += 1
+            entry['rtt_hist'][i] += 1
+        if self.hook is not None:
+            self.hook('rtt', command, seconds)
+
+    def failed(self, command, timeout):
+        """No valid reply to command was received."""
+        with self._lock:
+            entry = self._command(command)
+            if timeout:
+                entry['timeouts'] += 1
+                self._counters['timeouts'] += 1
+            else:
+                entry['errors'] += 1
+        if self.hook is not None:
+            self.hook('timeout' if timeout else 'error', command, None)
+
+    def event(self, event, nbytes=0):
+        """Count a protocol error: 'nak', 'crc_error', 'framing_error' or 'resync'.
+        @param nbytes: number of bytes read that belong to the error
+        """
+        with self._lock:
+            self._counters[event + 's'] += 1
+            self._counters['bytes_in'] += nbytes
+        if self.hook is not None:
+            self.hook(event, None, None)
+
+    def count(self, counter, n=1):
+        """Add n to one of the COUNTERS, e.g. 'cards_read'."""
+        with self._lock:
+            self._counters[counter] += n
+
+    def gauge(self, gauge, value):
+        """Set one of the GAUGES."""
+        with self._lock:
+            self._gauges[gauge] = value
+
+    def snapshot(self):
+        """Return a copy of the counters as a dict:
+            'since':    time.time() when the counting started
+            'commands': {command code (int): {'sent', 'received', 'errors', 
+                        'timeouts', 'rtt_sum', 'rtt_max', 'rtt_hist'}}
+                        where rtt_hist is a list of (upper bound in s, count)
+        and the counters in COUNTERS and GAUGES.
+        """
+        with self._lock:
+            ret = dict(self._counters)
+            ret.update(self._gauges)
+            ret['since'] = self._started
+            ret['commands'] = {}
+            for code, entry in self._commands.items():
+                entry = dict(entry)
+                entry['rtt_hist'] = list(zip(SIMetrics.RTT_BUCKETS, entry['rtt_hist']))
+                ret['commands'][code] = entry
+        return ret
+
+class SIMetricsExporter(object):
+    """Serves the metrics of one or more SIReaders as OpenMetrics text over
+    HTTP, for dashboards during events. Example:
+
+        si = SIReaderReadout(port='/dev/ttyUSB0', metrics=True)
+        exporter = SIMetricsExporter(port=9464)
+        exporter.add_reader(si, 'finish')
+        exporter.start()
+        while True:
+            ... read cards ...
+            if time to check the battery:
+                exporter.update_sysval(si)
+
+    The server runs in a background thread and only reads the counters of
+    SIMetrics (under its lock) and values stored by update_sysval(), so a 
+    scrape never talks to a station or waits for serial I/O. The station is 
+    only read by update_sysval(), which must be called from the thread that 
+    owns the reader.
+    """
+
+    CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+    # (metric name, type, help, key in SIMetrics.snapshot()['commands'])
+    COMMAND_FAMILIES = (
+        ('sireader_commands', 'counter', 'Commands sent to the station.', 'sent'),
+        ('sireader_replies', 'counter', 'Frames received from the station.', 'received'),
+        ('sireader_command_errors', 'counter', 'Commands that got an invalid reply.', 'errors'),
+        ('sireader_command_timeouts', 'counter', 'Commands that got no reply.', 'timeouts'),
+        )
+
+    # (metric name, help) of the counters in SIMetrics.COUNTERS
+    COUNTER_HELP = {
+        'bytes_out': 'Bytes written to the station.',
+        'bytes_in': 'Bytes read from the station.',
+        'frames_out': 'Frames written to the station.',
+        'frames_in': 'Valid frames read from the station.',
+        'timeouts': 'Commands that got no reply.',
+        'naks': 'NAKs received.',
+        'crc_errors': 'Frames with CRC errors.',
+        'framing_errors': 'Frames without ETX.',
+        'resyncs': 'Input flushed after an invalid start byte.',
+        'cards_read': 'SI cards read out.',
+        'punches': 'Punches received.',
+        'punches_recovered': 'Lost punches recovered from the backup memory.',
+        'punches_lost': 'Punches lost over radio, that can not be recovered.',
+        }
+
+    # (metric name, help) of the gauges in SIMetrics.GAUGES
+    GAUGE_HELP = {
+        'punches_outstanding': 'Lost punches not recovered from the backup memory yet.',
+        }
+
+    def __init__(self, port=9464, host='127.0.0.1'):
+        """
+        @param port: TCP port to serve the metrics on, at /metrics
+        @param host: Address to bind to. Only localhost by default.
+        """
+        self.host = host
+        self.port = port
+        self._lock = threading.Lock()
+        self._readers = []  # (labels, SIMetrics)
+        self._reader_labels = {} # SIMetrics: labels
+        self._labels = {}   # (labels, command code): label string
+        self._sysval = {}   # labels: precomputed sample lines
+        self._server = None
+        self._thread = None
+        # Label values of the histogram buckets
+        self._le = ['+Inf' if b == float('inf') else repr(b) for b in SIMetrics.RTT_BUCKETS]
+
+    def add_reader(self, si, name=None):
+        """Export the metrics of a reader.
+        @param si:   SIReader created with metrics=True
+        @param name: Value of the reader label, the serial port by default
+        """
+        if si._metrics is None:
+            raise SIReaderException('The reader must be created with metrics=True.')
+        if name is None:
+            name = si._serial.port
+        labels = 'reader="%s"' % SIMetricsExporter._escape(name)
+        with self._lock:
+            self._readers.append((labels, si._metrics))
+            self._reader_labels[si._metrics] = labels
+
+    def update_sysval(self, si, refresh=True):
+        """Store battery and station information from SYS_VAL of a reader.
+        Must be called from the thread that owns the reader.
+        @param refresh: Read SYS_VAL from the station first. Otherwise the 
+                        most recently read SYS_VAL is used.
+        """
+        if refresh:
+            si.refresh_sysval()
+        labels = self._reader_labels[si._metrics]
+        info = '%s,serno="%d",code="%d",model="%s",firmware="%s"' % (
+            labels, si.sysval_serno(), si.sysval_code(),
+            SIMetricsExporter._escape(si.sysval_model_str()),
+            SIMetricsExporter._escape(str(si.sysval_fwver())))
+        lines = {
+            'sireader_station': 'sireader_station_info{%s} 1\n' % info,
+            'sireader_battery_volts': 'sireader_battery_volts{%s} %.3f\n' % (
+                labels, si.sysval_volt()),
+            'sireader_battery_used_ratio': 'sireader_battery_used_ratio{%s} %.4f\n' % (
+                labels, si.sysval_used_battery() / 100.0),
+            'sireader_sysval_timestamp_seconds':
+                'sireader_sysval_timestamp_seconds{%s} %.3f\n' % (labels, systime.time()),
+            }
+        with self._lock:
+            self._sysval[labels] = lines
+
+    def start(self):
+        """Start serving in a background thread."""
+        from http.server import HTTPServer, BaseHTTPRequestHandler
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', SIMetricsExporter.CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = HTTPServer((self.host, self.port), Handler)
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name='SIMetricsExporter', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Stop serving."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def render(self):
+        """Return the metrics of all readers as OpenMetrics text."""
+        with self._lock:
+            readers = list(self._readers)
+            sysval = list(self._sysval.values())
+        snapshots = [(labels, metrics.snapshot()) for labels, metrics in readers]
+
+        out = []
+        for name, kind, help, key in SIMetricsExporter.COMMAND_FAMILIES:
+            out.append('# TYPE %s %s\n# HELP %s %s\n' % (name, kind, name, help))
+            for labels, snap in snapshots:
+                for code, entry in snap['commands'].items():
+                    out.append('%s_total{%s} %d\n' % (name, self._command_labels(labels, code),
+                                                      entry[key]))
+
+        name = 'sireader_rtt_seconds'
+        out.append('# TYPE %s histogram\n# HELP %s Round trip time of commands.\n' %
+                   (name, name))
+        for labels, snap in snapshots:
+            for code, entry in snap['commands'].items():
+                command_labels = self._command_labels(labels, code)
+                total = 0
+                for le, (bound, count) in zip(self._le, entry['rtt_hist']):
+                    total += count
+                    out.append('%s_bucket{%s,le="%s"} %d\n' % (name, command_labels, le, total))
+                out.append('%s_count{%s} %d\n' % (name, command_labels, total))
+                out.append('%s_sum{%s} %.6f\n' % (name, command_labels, entry['rtt_sum']))
+
+        for counter in SIMetrics.COUNTERS:
+            name = 'sireader_' + counter
+            out.append('# TYPE %s counter\n# HELP %s %s\n' %
+                       (name, name, SIMetricsExporter.COUNTER_HELP[counter]))
+            for labels, snap in snapshots:
+                out.append('%s_total{%s} %d\n' % (name, labels, snap[counter]))
+
+        for gauge in SIMetrics.GAUGES:
+            name = 'sireader_' + gauge
+            out.append('# TYPE %s gauge\n# HELP %s %s\n' %
+                       (name, name, SIMetricsExporter.GAUGE_HELP[gauge]))
+            for labels, snap in snapshots:
+                out.append('%s{%s} %d\n' % (name, labels, snap[gauge]))
+
+        for name, kind, help in (
+                ('sireader_station', 'info', 'Station found in SYS_VAL.'),
+                ('sireader_battery_volts', 'gauge', 'Battery voltage.'),
+                ('sireader_battery_used_ratio', 'gauge', 'Used part of the battery capacity.'),
+                ('sireader_sysval_timestamp_seconds', 'gauge', 'When SYS_VAL was read.')):
+            out.append('# TYPE %s %s\n# HELP %s %s\n' % (name, kind, name, help))
+            for lines in sysval:
+                out.append(lines[name])
+
+        out.append('# EOF\n')
+        return ''.join(out)
+
+    def _command_labels(self, labels, code):
+        key = (labels, code)
+        ret = self._labels.get(key)
+        if ret is None:
+            ret = self._labels[key] = '%s,command="0x%02x"' % (labels, code)
+        return ret
+
+    @staticmethod
+    def _escape(value):
+        return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,570 @@
+#!/usr/bin/env python3
+#
+#    Copyright (C) 2008-2014  Gaudenz Steinlin <gaudenz@durcheinandertal.ch>
+#                       2014  Simon Harston <simon@harston.de>
+#                       2015  Jan Vorwerk <jan.vorwerk@angexis.com>
+#                       2019  Per Magnusson <per.magnusson@gmail.com>
+#                       2023  Per Magnusson <per.magnusson@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+sireader2.reader - SIReader: settings, time and status of stations.
+"""
+
+from .protocol import SIReaderException, SIReaderTimeout, byte2int, int2byte
+from .backup import SIBackup
+from collections import namedtuple
+from datetime import datetime, timedelta
+from time import monotonic
+import time as systime
+
+class SIReader(SIBackup):
+    """Base protocol functions and constants to interact with SI Stations.
+       The functions are defined in layers: protocol constants (SIProtocol),
+       decoding (SICodec), the serial link (SITransport), the backup memory
+       (SIBackup) and the settings and time of stations (this class)."""
+
+    # Polling for a station in wait_for_station(), in seconds. The time to wait
+    # for a reply adapts to the round trip time, within the limits.
+    PROBE_TIMEOUT_MIN  = 0.1
+    PROBE_TIMEOUT_MAX  = 0.5
+    PROBE_INTERVAL     = 0.2 # Time between polls while the same station answers
+    _probe_timeout     = PROBE_TIMEOUT_MAX # Adapted per reader by wait_for_station()
+        
+
+    def set_extended_protocol(self, extended = True):
+        """Configure extended protocol mode of si station.
+        @param extended: Set extended protocol if True, legacy protocol if
+                         False.
+        """
+        config = self.proto_config.copy()
+        config['ext_proto'] = extended
+        self._set_proto_config(config)
+
+    def set_autosend(self, autosend = True):
+        """Set si station into autosend mode.
+        @param autosend: Set autosend mode if True, unset otherwise.
+        """
+        config = self.proto_config.copy()
+        config['auto_send'] = autosend
+        config['handshake'] = not autosend
+        self._set_proto_config(config)
+
+    def set_operating_mode(self, mode):
+        """Set si station operating mode.
+        @param mode: operating mode, supported modes: M_CONTROL, M_START, M_FINISH, M_READOUT, M_CLEAR, M_CHECK
+        """
+        if not mode in SIReader.SUPPORTED_MODES:
+            raise SIReaderException("Unsupported mode '%i'!" % mode)
+        try:
+            self._send_command(SIReader.C_SET_SYS_VAL, SIReader.O_MODE + int2byte(mode))
+        finally:
+            self._update_proto_config()
+
+    def set_station_code(self, code):
+        """Set si station control code.
+        @param code: control code (1-1023)
+        """
+        if code < 1 or code > 1023:
+            raise SIReaderException("Invalid control code: '%i'! Supported code range: 1-1023." % code)
+        # lower byte of control code
+        code_low = int2byte(code & 0xFF)
+        # high byte of control code, only the first 2 bits are used, the rest are set to 1
+        code_high = int2byte((code >> 2) | 0b00111111)
+        try:
+            self._send_command(SIReader.C_SET_SYS_VAL, SIReader.O_STATION_CODE + code_low + code_high)
+        finally:
+            self._update_proto_config()
+
+    def status_snapshot(self):
+        """Read the status of the station: its time and SYS_VAL, which holds the
+        settings, battery information and backup memory pointers. Two commands 
+        are used, and the sysval_ functions afterwards use the SYS_VAL read here.
+        The clock offset is compensated for the round trip time of C_GET_TIME,
+        assuming that the station read its clock halfway through it, and for 
+        the truncation to whole ticks as in measure_time_offset().
+        @return: SIStationStatus
+        """
+        now = datetime.now()
+        start = monotonic()
+        station_time = self.get_time()
+        rtt = monotonic() - start
+        now += timedelta(seconds=rtt/2)
+        self.refresh_sysval()
+        offset = None
+        if station_time is not None:
+            offset = station_time + SIReader.TIME_TICK/2 - now
+        return SIStationStatus(now, station_time, offset,
+                               rtt, self.sysval_serno(), self.sysval_model_str(), 
+                               self.sysval_fwver(), self.sysval_build_date(),
+                               self.sysval_battery_date(), self.sysval_battery_capacity(),
+                               self.sysval_used_battery(), self.sysval_volt(),
+                               self.sysval_mem_size(), self.sysval_code(), 
+                               self.sysval_mode_str(), self.sysval_active_time(),
+                               self.sysval_protocol(), self.sysval_192_punches(),
+                               self.sysval_feedback(), self.sysval_backup_end())
+
+    def refresh_sysval(self, timeout=None):
+        """Read the entire station configuration information (SYS_VAL) and store in the object
+        so that the sysval_ functions can return good information.
+        @param timeout: time to wait for the reply, None for the default
+        @return : -
+        """
+        self.sysval = self._send_command(SIReader.C_GET_SYS_VAL, b'\x00\x80', timeout=timeout)[1]
+
+    def save_sys_val(self, filename=None):
+        """Save the station configuration data (SYS_VAL) to a CSV file.
+        Two values per row, offset and byte, in decimal format.
+        If no filename is given, a name is created consisting of the code of the station
+        and the current date and time.
+        @param filename: optional name of CSV file
+        @return:         The name of the CSV file
+        """
+        import csv
+        if len(self.sysval) < 0x80:
+            self.refresh_sysval()
+        code = self.sysval_code()
+        datestr = datetime.now().strftime("%Y-%m-%d_%H.%M.%S")
+        if filename is None:
+            filename = str(code) + '_' + datestr + '_sysval.csv'
+        with open(filename, 'w', newline='') as csvfile:
+            csvwriter = csv.writer(csvfile, delimiter=';',
+                                   quotechar='"', quoting=csv.QUOTE_MINIMAL)
+            header = ['Offset', 'Value']
+            csvwriter.writerow(header)
+            offs = 0
+            for byte in self.sysval[1:]:
+                csvwriter.writerow([offs, byte])
+                offs += 1
+            return filename
+        return ""
+
+    def sysval_serno(self):
+        """Return the station serial number from the most recent reading of SYS_VAL.
+        @return : station serial number as an integer
+        """
+        if len(self.sysval) < 0x80:
+            self.refresh_sysval()
+        return SIReader._to_int(SIReader._extract_sysval(self.sysval, SIReader.O_SERIAL_NO, 4))
+
+    def sysval_fwver(self):
+        """Return the station firmware version from the most recent reading of SYS_VAL.
+        @return : firmware station serial number as a 3-character string
+        """
+        if len(self.sysval) < 0x80:
+            self.refresh_sysval()
+        return SIReader._extract_sysval(self.sysval, SIReader.O_FIRMWARE, 3).decode('ascii')
+
+    def sysval_model_id(self):
+        """Return the station model id from the most recent reading of SYS_VAL.
+        @return : model id, an integer
+        """
+        if len(self.sysval) < 0x80:
+            self.refresh_sysval()
+        return SIReader._to_int(SIReader._extract_sysval(self.sysval, SIReader.O_MODEL_ID, 2))
+
+    def sysval_model_str(self):
+        """Return the station model (as a string) from the most recent reading of SYS_VAL.
+        @return : model, a string
+        """
+        model_id = self.sysval_model_id()
+        model_id_recognized = model_id in SIReader.MODEL2NAME 
+        return SIReader.MODEL2NAME[model_id] if model_id_recognized else "0x%04x" % model_id
+
+    def sysval_build_date(self):
+        """Return the station build date from the most recent reading of SYS_VAL.
+        @return : build-date as a string YYYY-MM-DD
+        """
+        if len(self.sysval) < 0x80:
+            self.refresh_sysval()
+        date_str = SIReader._extract_sysval(self.sysval, SIReader.O_BUILD_DATE, 3)
+        date_str = "20%02d-%02d-%02d" % (date_str[0], date_str[1], date_str[2])
+        return date_str
+
+    def sysval_battery_date(self):
+        """Return the station battery date from the most recent reading of SYS_VAL.
+        @return : build-date as a string YYYY-MM-DD
+        """
+        if len(self.sysval) < 0x80:
+            self.refresh_sysval()
+        date_str = SIReader._extract_sysval(self.sysval, SIReader.O_BAT_DATE, 3)
+        date_str = "20%02d-%02d-%02d" % (date_str[0], date_str[1], date_str[2])
+        return date_str
+
+    def sysval_mem_size(self):
+        """Return the station's memory size from the most recent reading of SYS_VAL.
+        @return : station's memory size in kB
+        """
+        if len(self.sysval) < 0x80:
+            self.refresh_sysval()
+        return SIReader._to_int(SIReader._extract_sysval(self.sysval, SIReader.O_MEM_SIZE, 1))
+
+    def sysval_volt(self):
+        """Return the station voltage from the most recent reading of SYS_VAL.
+        @return : voltage, a float, V
+        """
+        if len(self.sysval) < 0x80:
+            self.refresh_sysval()
+        return (SIReader._to_int(SIReader._extract_sysval(self.sysval, SIReader.O_BAT_VOLT, 2))*5.0)/65536.0
+
+    def sysval_battery_capacity(self):
+        """Return the station's battery capacity from the most recent reading of SYS_VAL.
+        @return : capacity, a float, mAh
+        """
+        if len(self.sysval) < 0x80:
+            self.refresh_sysval()
+        return (SIReader._to_int(SIReader._extract_sysval(self.sysval, SIReader.O_BAT_CAP, 2))*16.0)/225.0
+
+    def sysval_used_battery(self):
+        """Return the station's used battery capacity from the most recent reading of SYS_VAL.
+        @return : used capacity, a float, %
+        """
+        if len(self.sysval) < 0x80:
+            self.refresh_sysval()
+        return SIReader._to_int(SIReader._extract_sysval(self.sysval, SIReader.O_USED_BAT_CAP, 3))*2.778e-5
+
+    def sysval_mode_str(self):
+        """Return the station operating mode from the most recent reading of SYS_VAL.
+        @return : mode, a string
+        """
+        if len(self.sysval) < 0x80:
+            self.refresh_sysval()
+        mode = SIReader._to_int(SIReader._extract_sysval(self.sysval, SIReader.O_MODE, 1))
+        if mode in SIReader.MODE2NAME:
+            mode_str = SIReader.MODE2NAME[mode]
+        else:
+            mode_str = "0x%02x" % mode
+        return mode_str
+
+    def sysval_code(self):
+        """Return the station code from the most recent reading of SYS_VAL.
+        @return : code, 1-1023
+        """
+        if len(self.sysval) < 0x80:
+            self.refresh_sysval()
+        code_low = SIReader._to_int(SIReader._extract_sysval(self.sysval, SIReader.O_STATION_CODE, 1))
+        # Also contains high bits of code
+        feedback = SIReader._to_int(SIReader._extract_sysval(self.sysval, SIReader.O_FEEDBACK, 1)) 
+        self._station_code = code_low + ((feedback & 0b11000000)<<2)
+        return self._station_code
+
+    def sysval_feedback(self):
+        """Return the station feedback byte from the most recent reading of SYS_VAL.
+        @return : feedback, an integer, 0-255
+        """
+        if len(self.sysval) < 0x80:
+            self.refresh_sysval()
+        return SIReader._to_int(SIReader._extract_sysval(self.sysval, SIReader.O_FEEDBACK, 1))
+
+    def sysval_192_punches(self):
+        """Return the station's setting regarding 192 punches for SI card 6 
+        from the most recent reading of SYS_VAL. 
+        @return : True if it is set, False if not, a byte is the value is unexpected
+        """
+        if len(self.sysval) < 0x80:
+            self.refresh_sysval()
+        si6_192 = SIReader._to_int(SIReader._extract_sysval(self.sysval, SIReader.O_SI6_CB, 1))
+        if si6_192 == 0 or si6_192 == 0xC1:
+            return False
+        if si6_192 == 0x08 or si6_192 == 0xFF:
+            return True
+        return si6_192
+
+    def sysval_protocol(self):
+        """Return the station protocol byte from the most recent reading of SYS_VAL.
+        @return : protocol, an integer, 0-255
+        """
+        if len(self.sysval) < 0x80:
+            self.refresh_sysval()
+        return SIReader._to_int(SIReader._extract_sysval(self.sysval, SIReader.O_PROTO, 1))
+
+    def sysval_backup_end(self):
+        """Return the end of the used backup memory from the most recent reading of SYS_VAL.
+        The pointer grows with every punch, until the backup memory is cleared.
+        @return : address after the last backup memory record, an integer
+        """
+        if len(self.sysval) < 0x80:
+            self.refresh_sysval()
+        return SIReader._to_int(SIReader._extract_sysval(self.sysval, SIReader.O_BACKUP_PTR_HI, 2) +
+                                SIReader._extract_sysval(self.sysval, SIReader.O_BACKUP_PTR_LO, 2))
+
+    def sysval_active_time(self):
+        """Return the station active time from the most recent reading of SYS_VAL.
+        @return : active time, an integer 0-5759 minutes
+        """
+        if len(self.sysval) < 0x80:
+            self.refresh_sysval()
+        return SIReader._to_int(SIReader._extract_sysval(self.sysval, SIReader.O_ACTIVE_TIME, 2))
+
+
+    def set_feedback(self, audible = True, optical = True):
+        """Set the optical and audible feedback of the station. 
+        Default is to turn them both on. 
+        @param audible : Boolean (optional, default True)
+        @param optical : Boolean (optional, default True)
+        """
+        if len(self.sysval) < 0x80:
+            self.refresh_sysval()
+        feedback = SIReader._to_int(SIReader._extract_sysval(self.sysval, SIReader.O_FEEDBACK, 1)) 
+        if optical:
+            feedback |= 0b00000001
+        else:
+            feedback &= ~0b00000001
+        if audible:
+            feedback |= 0b00000100
+        else:
+            feedback &= ~0b00000100
+        self._send_command(SIReader.C_SET_SYS_VAL, SIReader.O_FEEDBACK + int2byte(feedback))
+
+    def set_active_time(self, time):
+        """Set the active time.
+        @param time : minutes, 0-5759
+        """
+        if len(self.sysval) < 0x80:
+            self.refresh_sysval()
+        time_barr = SIReader._to_str(time, 2) 
+        self._send_command(SIReader.C_SET_SYS_VAL, SIReader.O_ACTIVE_TIME + time_barr)
+        
+    def set_si6_192(self, enable=False):
+        """Set whether the station shall support SI card 6 with 192 punches.
+        @param enable : Boolean, default is False
+        """
+        if enable:
+            self._send_command(SIReader.C_SET_SYS_VAL, SIReader.O_SI6_CB + b'\xFF')
+        else:
+            self._send_command(SIReader.C_SET_SYS_VAL, SIReader.O_SI6_CB + b'\xC1')            
+
+
+    def get_station_code(self):
+        """Get si station control code.
+        @return : control code (1-1023)
+        """
+        return self._station_code
+
+    def get_time(self):
+        """Read out station's internal time.
+        @return: datetime
+        """
+        bintime = self._send_command(SIReader.C_GET_TIME, b'')[1]
+        year = byte2int(bintime[0]) + 2000
+        month = byte2int(bintime[1])
+        day = byte2int(bintime[2])
+        am_pm = byte2int(bintime[3]) & 0b1
+        second = SIReader._to_int(bintime[4:6])
+        hour = am_pm * 12 + second // 3600
+        second %= 3600
+        minute = second // 60
+        second %= 60
+        ms = int(round(byte2int(bintime[6]) / 256.0 * 1000000))
+        try:
+            return datetime(year, month, day, hour, minute, second, ms)
+        except ValueError:
+            # return None if the time reported by the station is impossible
+            return None
+
+    def set_time(self, time):
+        """Set si station internal time.
+        @param time: time as a python datetime object.
+        """
+        tss = int(round(time.microsecond / 1000000.0 * 256))
+        if tss == 256:
+            # Rounded up to the next second
+            time = time.replace(microsecond=0) + timedelta(seconds=1)
+            tss = 0
+        bintime = (SIReader._to_str(int(time.strftime('%y')), 1)
+                   + SIReader._to_str(time.month, 1)
+                   + SIReader._to_str(time.day, 1)
+                   + SIReader._to_str(((time.isoweekday() % 7) << 1) + time.hour//12, 1)
+                   + SIReader._to_str((time.hour % 12)*3600 + time.minute*60 + time.second, 2)
+                   + SIReader._to_str(tss, 1)
+                   )
+
+        self._send_command(SIReader.C_SET_TIME, bintime)
+
+    def sync_time(self, probes=5, rounds=2):
+        """Set the station's time to that of the computer, compensated for the
+        transfer time to the station. The clock offset is measured with several
+        C_GET_TIME, and the one with the smallest round trip time is used, since
+        it was delayed the least on the way (see measure_time_offset()). The
+        time is set to the computer's time plus half of that round trip time,
+        and the offset is measured again. If it is more than one tick of the 
+        station's clock (1/256 s) off, the remaining offset is included in the
+        compensation and the time is set again, at most rounds times in all.
+        @param probes: Number of C_GET_TIME per measurement.
+        @param rounds: Maximum number of times to set the time.
+        @return:       (residual clock offset as a timedelta, round trip time 
+                       in seconds), as measured after setting the time
+        """
+        offset, rtt = self.measure_time_offset(probes)
+        delay = timedelta(seconds=rtt/2)
+        for i in range(rounds):
+            self.set_time(datetime.now() + delay)
+            offset, rtt = self.measure_time_offset(probes)
+            if offset is None or abs(offset) <= SIReader.TIME_TICK:
+                break
+            delay -= offset
+        return (offset, rtt)
+
+    def measure_time_offset(self, probes=5):
+        """Measure the offset of the station's clock from the computer's with 
+        several C_GET_TIME. The sample with the smallest round trip time is 
+        used, and the station is assumed to have read its clock halfway through
+        the round trip. The station truncates its time to whole ticks, so it is
+        taken to be half a tick later than reported.
+        @param probes: Number of C_GET_TIME.
+        @return:       (station time - computer time as a timedelta, or None if
+                       the station reports an impossible time, round trip time 
+                       in seconds) of the best sample
+        """
+        best = None
+        for i in range(probes):
+            now = datetime.now()
+            start = monotonic()
+            station_time = self.get_time()
+            rtt = monotonic() - start
+            if best is None or rtt < best[1]:
+                offset = None
+                if station_time is not None:
+                    offset = (station_time + SIReader.TIME_TICK/2
+                              - (now + timedelta(seconds=rtt/2)))
+                best = (offset, rtt)
+        return best
+
+    @staticmethod
+    def sync_time_all(readers, probes=5, rounds=2):
+        """Run sync_time() on several stations at the same time, one thread per
+        station. The readers must use different serial ports.
+        @param readers: list of SIReader objects
+        @return:        list with the result of sync_time() for each reader, or
+                        the exception (SIReaderException or SIReaderTimeout) if
+                        it failed
+        """
+        import threading
+        results = [None] * len(readers)
+        def _run(ii):
+            try:
+                results[ii] = readers[ii].sync_time(probes, rounds)
+            except (SIReaderException, SIReaderTimeout) as msg:
+                results[ii] = msg
+        threads = [threading.Thread(target=_run, args=(ii,)) for ii in range(len(readers))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results
+
+    def beep(self, count = 1):
+        """Beep and blink control station. This even works if now sicard is
+        inserted into the station.
+        @param count: Count of beeps
+        """
+        self._send_command(SIReader.C_BEEP, int2byte(count))
+
+    def wait_for_station(self, last=None, timeout=None):
+        """Wait for a station to answer, e.g. a remote station placed at the master,
+        for handling many stations one after another without user interaction.
+        The station is polled with C_GET_SYS_VAL and a short timeout.
+        @param last:    Serial number of the station handled last. It is not 
+                        returned again until it has been away.
+        @param timeout: Give up after this many seconds, None to wait forever.
+        @return:        The serial number of the station, None on timeout.
+                        proto_config and sysval are read from the station.
+        """
+        end = None if timeout is None else monotonic() + timeout
+        while end is None or monotonic() < end:
+            start = monotonic()
+            try:
+                self._update_proto_config(timeout=self._probe_timeout)
+            except (SIReaderException, SIReaderTimeout):
+                # No station, or it did not answer in time. A late reply would
+                # get in the way of the next command.
+                last = None
+                self.flush()
+                continue
+            # The timeout only applies to the first byte of the reply, so a few
+            # round trip times are enough.
+            self._probe_timeout = min(SIReader.PROBE_TIMEOUT_MAX, 
+                                      max(SIReader.PROBE_TIMEOUT_MIN, 4*(monotonic() - start)))
+            if self._serno != last:
+                return self._serno
+            systime.sleep(SIReader.PROBE_INTERVAL)
+        return None
+
+    def poweroff(self):
+        """Switch off the control station."""
+        self._send_command(SIReader.C_OFF, b'')
+        
+    def _set_proto_config(self, config):
+        try:
+            config_byte = int2byte((config['ext_proto'] << 0) |
+                                   (config['auto_send'] << 1) |
+                                   (config['handshake'] << 2) |
+                                   (config['pw_access'] << 4) |
+                                   (config['punch_read'] << 7))
+            self._send_command(SIReader.C_SET_SYS_VAL, SIReader.O_PROTO + config_byte)
+        finally:
+            self._update_proto_config()
+
+class SIStationStatus(namedtuple('SIStationStatus', 
+                                 'time station_time clock_offset rtt serno model fwver '
+                                 'build_date battery_date battery_capacity used_battery volt '
+                                 'mem_size code mode active_time protocol si6_192 feedback '
+                                 'backup_end')):
+    """Status of a station, read with SIReader.status_snapshot().
+    time:         time of the computer when the station read its clock
+    station_time: time of the station, None if it is not a valid time
+    clock_offset: station_time + half a tick - time as a timedelta, None if 
+                  station_time is None
+    rtt:          round trip time of C_GET_TIME in seconds
+    The other fields are the values of the corresponding sysval_ functions.
+    """
+    __slots__ = ()
+
+    # This structure is similar to the log from SI Config+, but lacks some fields,
+    # has some fields in a different order (to put more interesting information 
+    # more to the left on the long rows) and has an extra TimeDiff field.
+    CSV_HEADER = ['Date', 'Time', 'SerialNo', 'Hardware', 'Software', 'BatteryDate',
+                  'BattUsage', 'Voltage', 'CodeNo', 'Mode', 'TimeDiff', 'OpTime', 'Autosend',
+                  'LegacyProtocol', 'Card6with192punches', 'AcousticSignal', 
+                  'OpticalSignal1', 'ProductionDate', 'MemorySize', 'BatteryCapacity']
+
+    def csv_row(self):
+        """Format the status as a row of a CSV file with the columns in CSV_HEADER."""
+        if self.clock_offset is None:
+            time_delta_str = '-'
+        else:
+            # Truncate to ms. str() of a timedelta leaves out a zero fraction.
+            delta = abs(self.clock_offset)
+            time_delta_str = '%s%s.%03d' % ('-' if self.clock_offset < timedelta(0) else '',
+                                            delta - timedelta(microseconds=delta.microseconds),
+                                            delta.microseconds // 1000)
+
+        active_str = "%02d:%02d:00" % (self.active_time//60, self.active_time%60)
+        autosend_str = 'Autosend' if self.protocol & 0b10 else '-'
+        legacy_str = '-' if self.protocol & 0b1 else 'LegacyProtocol!'
+        if self.si6_192 is True:
+            si6_192_str = 'Card6With192Records!'
+        elif self.si6_192 is False:
+            si6_192_str = '-'
+        else:
+            si6_192_str = '0x%02x' % self.si6_192
+        optical_str = 'OpticalSignal1' if self.feedback & 0b1 else ''
+        audible_str = 'AcousticSignal' if self.feedback & 0b100 else ''
+
+        return [self.time.strftime("%Y-%m-%d"), self.time.strftime("%H:%M:%S"),
+                self.serno, self.model, self.fwver, self.battery_date,
+                "%4.1f %%" % self.used_battery, "%4.2f" % self.volt, self.code, self.mode,
+                time_delta_str, active_str, autosend_str, legacy_str, si6_192_str,
+                audible_str, optical_str, self.build_date, "%d K" % self.mem_size,
+                "%d" % int(round(self.battery_capacity, 0))]
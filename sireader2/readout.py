@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+#
+#    Copyright (C) 2008-2014  Gaudenz Steinlin <gaudenz@durcheinandertal.ch>
+#                       2014  Simon Harston <simon@harston.de>
+#                       2015  Jan Vorwerk <jan.vorwerk@angexis.com>
+#                       2019  Per Magnusson <per.magnusson@gmail.com>
+#                       2023  Per Magnusson <per.magnusson@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+sireader2.readout - Reading out SI cards inserted in a readout station.
+"""
+
+from .protocol import SIReaderException, SIReaderCardChanged, byte2int, int2byte
+from .reader import SIReader
+from .log import SIProtocolLog
+from serial.serialutil import SerialException
+from collections import OrderedDict
+from time import monotonic
+from zlib import crc32
+
+class SIReaderReadout(SIReader):
+    """Class for 'classic' SI card readout. Reads out the whole card. If you don't know
+    about other readout modes (control mode) you probably want this class."""
+
+    # Cards that are read block by block also in a full readout. With the card
+    # cache, their header block is read first like with partial=True.
+    BLOCK_READ_CARDS = ('SI8', 'SI9', 'pCard')
+
+    def __init__(self, *args, **kwargs):
+        """See SIReader.__init__() for the common parameters.
+        Additional keyword parameters:
+            card_cache = 0      Number of cards to keep in a cache so that reinserted
+                                cards are decoded after reading only the header 
+                                block. Only used for cards that are read block by 
+                                block, i.e. SI8, SI9 and pCard, and SI6 and SI10 
+                                with partial=True. 0 disables the cache.
+            card_cache_age = 3600
+                                Maximum age in seconds of a cached card.
+        """
+        super(type(self), self).__init__(*args, **kwargs)
+
+        self.sicard = None
+        self.cardtype = None
+        self._polled_card = None    # sicard at the last poll_sicard() with the scheduler
+        cache_size = kwargs['card_cache'] if 'card_cache' in kwargs else 0
+        cache_age = kwargs['card_cache_age'] if 'card_cache_age' in kwargs else 3600
+        if cache_size > 0:
+            self._card_cache = SICardCache(cache_size, cache_age)
+        else:
+            self._card_cache = None
+
+    def poll_sicard(self):
+        """Polls for an SI-Card inserted or removed into the SI Station.
+        Returns true on state changes and false otherwise. If other commands
+        are received an Exception is raised."""
+
+        if not self.proto_config['ext_proto']:
+            raise SIReaderException('This command only supports stations in "Extended Protocol" '
+                                    'mode. Switch mode first')
+
+        if not self.proto_config['mode'] == SIReader.M_READOUT:
+            raise SIReaderException("Station must be in 'Read SI cards' operating mode! Change operating mode first.")
+
+        if self._scheduler is not None:
+            if not self._scheduler.is_owner():
+                return self._scheduler.call(self._scheduler.PRIO_NORMAL, self.poll_sicard)
+            # Card changes may have been read while running the commands of
+            # other threads, so compare with the card of the last poll
+            self._drain_input()
+            changed = self.sicard != self._polled_card
+            self._polled_card = self.sicard
+            return changed
+
+        if self._serial.inWaiting() == 0:
+            return False
+
+        oldcard = self.sicard
+        while self._serial.inWaiting() > 0:
+            # _read_command does the actual parsing of the command
+            # if it's an insert or remove event
+            try:
+                self._read_command(timeout = 0)
+            except SIReaderCardChanged:
+                pass
+                    
+        return not oldcard == self.sicard
+
+    def read_sicard(self, reftime=None, partial=False):
+        """Reads out the SI Card currently inserted into the station. The card must be
+        detected with poll_sicard before.
+        @param reftime: Reference time used when guessing the date of the punches.
+        @param partial: Set this to True to first read the header block of the card 
+                        and then only the blocks that actually contain punches, as 
+                        given by the punch counter. This saves frames for cards with 
+                        few punches. SI5 cards are always read with a single command.
+        """
+        ret = self._read_sicard(reftime, partial)
+        if self._metrics is not None:
+            self._metrics.count('cards_read')
+        return ret
+
+    def _read_sicard(self, reftime, partial):
+        if not self.proto_config['ext_proto']:
+            raise SIReaderException('This command only supports stations in "Extended Protocol" '
+                                    'mode. Switch mode first')
+
+        if not self.proto_config['mode'] == SIReader.M_READOUT:
+            raise SIReaderException("Station must be in 'Read SI cards' operating mode! Change operating mode first.")
+
+        if self.cardtype == 'SI5':
+            raw_data = self._send_command(SIReader.C_GET_SI5,
+                                          b'')[1]
+        elif (self.cardtype in SIReader.CARD_BLOCKS and 
+              (partial or (self._card_cache is not None and 
+                           self.cardtype in SIReaderReadout.BLOCK_READ_CARDS))):
+            header = self._read_sicard_header()
+            raw_data = None
+            if self._card_cache is not None:
+                key = self._card_cache_key(header)
+                raw_data = self._card_cache.get(key)
+            if raw_data is None:
+                raw_data = header + self._read_sicard_blocks(header, partial)
+                if self._card_cache is not None:
+                    self._card_cache.put(key, raw_data)
+        elif self.cardtype == 'SI6':
+            raw_data  = self._send_command(SIReader.C_GET_SI6,
+                                           SIReader.P_SI6_CB, replies=3)[1][1:]
+            raw_data += self._read_command()[1][1:]
+            raw_data += self._read_command()[1][1:]
+        elif self.cardtype in ('SI8', 'SI9', 'pCard'):
+            raw_data = b''
+            for b in range(SIReader.CARD[self.cardtype]['BC']):
+                raw_data += self._send_command(SIReader.C_GET_SI9,
+                                               int2byte(b))[1][1:]
+
+        elif self.cardtype == 'SI10':
+            # Reading out SI10 cards block by block proved to be unreliable and slow
+            # Thus reading with C_GET_SI9 and block number 8 = P_SI6_CB like SI6
+            # cards
+            raw_data =  self._send_command(SIReader.C_GET_SI9,
+                                           SIReader.P_SI6_CB, replies=5)[1][1:]
+            raw_data += self._read_command()[1][1:]
+            raw_data += self._read_command()[1][1:]
+            raw_data += self._read_command()[1][1:]
+            raw_data += self._read_command()[1][1:]
+        else:
+            raise SIReaderException('No card in the device.')
+
+        return SIReader._decode_carddata(raw_data, self.cardtype, reftime)
+
+    def _read_sicard_header(self):
+        """Reads the header block (the first block in CARD_BLOCKS) of the inserted card.
+        @return: the data of the header block
+        """
+        return self._send_command(self._card_block_command(),
+                                  int2byte(SIReader.CARD_BLOCKS[self.cardtype][0]))[1][1:]
+
+    def _read_sicard_blocks(self, header, partial=True):
+        """Reads the blocks following the header block of the inserted card.
+        @param header:  the header block returned by _read_sicard_header()
+        @param partial: if True, only the blocks that hold punches are read,
+                        otherwise all blocks
+        @return: card data to append to the header block, giving the same layout 
+                 as a full readout, but possibly truncated after the last block 
+                 containing punches
+        """
+        blocks = SIReader.CARD_BLOCKS[self.cardtype]
+        if partial:
+            blocks = blocks[:SIReader._card_blocks_needed(header, self.cardtype)]
+        command = self._card_block_command()
+        raw_data = b''
+        for b in blocks[1:]:
+            raw_data += self._send_command(command, int2byte(b))[1][1:]
+        return raw_data
+
+    def _card_block_command(self):
+        """Return the command used to read single blocks of the inserted card."""
+        if self.cardtype == 'SI6':
+            return SIReader.C_GET_SI6
+        return SIReader.C_GET_SI9
+
+    def _card_cache_key(self, header):
+        """Return the key identifying a card in the card cache.
+        The header block holds the punch counter as well as the start, finish, 
+        check and clear records, so it changes whenever the card is used again.
+        """
+        card = SIReader.CARD[self.cardtype]
+        punch_count = byte2int(header[card['RC']:card['RC']+1])
+        return (self.sicard, self.cardtype, punch_count, crc32(header))
+    
+    def ack_sicard(self):
+        """Sends an ACK signal to the SI Station. After receiving an ACK signal
+        the station blinks and beeps to signal correct card readout."""
+        if self._scheduler is not None and not self._scheduler.is_owner():
+            return self._scheduler.call(self._scheduler.PRIO_NORMAL, self.ack_sicard)
+        try:
+            self._serial.write(SIReader.ACK)
+        except (SerialException, OSError) as msg:
+            raise SIReaderException('Could not send ACK: %s' % msg)
+        if self._logfile is not None:
+            self._logfile.write(SIProtocolLog.SENT, SIReader.ACK)
+        if self._trace is not None:
+            self._trace.record(SIProtocolLog.SENT, SIReader.ACK)
+        if self._metrics is not None:
+            self._metrics.sent(None, 1)
+
+    def _read_command(self, timeout=None):
+        """Reads commands from the station. As a station in readout mode can send a
+        card inserted or card removed event at any time we have to intercept these events
+        here."""
+        cmd, data = super(type(self), self)._read_command(timeout)
+
+        # check if a card was inserted or removed
+        if cmd == SIReader.C_SI_REM:
+            self.sicard = None
+            self.cardtype = None
+            raise SIReaderCardChanged("SI-Card removed during command.")
+        elif cmd == SIReader.C_SI5_DET:
+            self.sicard = self._decode_cardnr(data)
+            self.cardtype = 'SI5'
+            raise SIReaderCardChanged("SI-Card inserted during command.")
+        elif cmd == SIReader.C_SI6_DET:
+            self.sicard = self._to_int(data)
+            self.cardtype = 'SI6'
+            raise SIReaderCardChanged("SI-Card inserted during command.")
+        elif cmd == SIReader.C_SI9_DET:
+            # SI 9 sends corrupt first byte (insignificant)
+            self.sicard = self._to_int(data[1:])
+            if self.sicard >= 2000000 and self.sicard <= 2999999:
+                self.cardtype = 'SI8'
+            elif self.sicard >= 1000000 and self.sicard <= 1999999:
+                self.cardtype = 'SI9'
+            elif self.sicard >= 4000000 and self.sicard <= 4999999:
+                self.cardtype = 'pCard'
+#            elif self.sicard >= 6000000 and self.sicard <= 6999999:  # tCard, don't have one for testing
+#                self.cardtype = 'SI9'
+            elif self.sicard >= 7000000 and self.sicard <= 9999999:
+                self.cardtype = 'SI10'
+            else:
+                raise SIReaderException('Unknown cardtype!')
+            raise SIReaderCardChanged("SI-Card inserted during command.")
+
+        return (cmd, data)
+
+class SICardCache(object):
+    """Least recently used cache of raw card data, used by SIReaderReadout to 
+    avoid reading out the full card again when the same card is inserted 
+    several times. The data is decoded for each readout, with the reftime 
+    of that readout."""
+
+    def __init__(self, size=64, max_age=3600):
+        """
+        @param size:    Maximum number of cards in the cache
+        @param max_age: Maximum age of an entry in seconds
+        """
+        self.size = size
+        self.max_age = max_age
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """Return the cached card data for key, or None if there is no (fresh 
+        enough) entry."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if monotonic() - entry[0] > self.max_age:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key, data):
+        """Store raw card data (bytes), evicting the least recently used entries
+        if the cache is full."""
+        self._entries[key] = (monotonic(), data)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
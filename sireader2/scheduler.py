@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+#
+#    Copyright (C) 2008-2014  Gaudenz Steinlin <gaudenz@durcheinandertal.ch>
+#                       2014  Simon Harston <simon@harston.de>
+#                       2015  Jan Vorwerk <jan.vorwerk@angexis.com>
+#                       2019  Per Magnusson <per.magnusson@gmail.com>
+#                       2023  Per Magnusson <per.magnusson@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+sireader2.scheduler - Running the commands of several threads on one reader.
+"""
+
+from .protocol import SIReaderException, SIReaderTimeout
+from .transport import SITransport
+from serial.serialutil import SerialException
+from collections import deque
+import heapq
+import queue
+import threading
+
+class SICommandScheduler(object):
+    """Lets several threads use the same SIReader (created with scheduler=True),
+    e.g. a user interface asking for the time while another thread reads the
+    backup memory. The serial port is owned by a thread of the scheduler, and 
+    commands (and the polling functions) called from other threads are queued 
+    and run by it, one at a time. Each command is run to its last reply frame
+    before the next one is started.
+
+    Queued commands are run in priority order, and in the order they were 
+    queued within a priority. C_GET_BACKUP is run at PRIO_BULK, so the commands 
+    of other threads get in between the chunks of a backup memory readout.
+    A command can be given a priority with the priority keyword parameter of
+    _send_command().
+
+    Frames sent by the station on its own (UNSOLICITED) are published to the 
+    queues of the subscribers. Frames arriving before the reply to a command no
+    longer make the command fail, and a card inserted or removed only 
+    interrupts commands reading a card. While there are subscribers, the 
+    station is also read when there are no commands to run.
+    """
+
+    PRIO_HIGH   = 0
+    PRIO_NORMAL = 1
+    PRIO_BULK   = 2
+    PRIO_STOP   = 3
+    BULK_COMMANDS = (SITransport.C_GET_BACKUP,)
+    CARD_COMMANDS = (SITransport.C_GET_SI5, SITransport.C_GET_SI6, SITransport.C_GET_SI9)
+    UNSOLICITED   = (SITransport.C_TRANS_REC, SITransport.C_SI5_DET, SITransport.C_SI6_DET,
+                     SITransport.C_SI9_DET, SITransport.C_SI_REM,
+                     SITransport.C_SRR_PING, SITransport.C_SRR_ADHOC)
+    IDLE_POLL   = 0.02 # Time between reads of the station when idle with subscribers
+    ALIVE_CHECK = 1.0  # Time between checks that the scheduler runs while waiting
+
+    def __init__(self, si):
+        self._si = si
+        self._requests = queue.SimpleQueue() # (priority, fn, args, kwargs, reply queue)
+        self._heap = []
+        self._seq = 0
+        self._subscribers = []  # Replaced, never modified, when subscribing
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._thread = threading.Thread(target=self._run, name='SICommandScheduler %s' % si.port,
+                                        daemon=True)
+        self._thread.start()
+
+    def is_owner(self):
+        """Return True in the thread of the scheduler."""
+        return threading.current_thread() is self._thread
+
+    def call(self, priority, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) in the thread of the scheduler and wait for it.
+        @return: the return value of fn, exceptions are raised again
+        """
+        reply = queue.SimpleQueue()
+        self._requests.put((priority, fn, args, kwargs, reply))
+        while True:
+            try:
+                ok, result = reply.get(timeout=SICommandScheduler.ALIVE_CHECK)
+                break
+            except queue.Empty:
+                if not self._thread.is_alive():
+                    raise SIReaderException('The command scheduler has been stopped')
+        if not ok:
+            raise result
+        return result
+
+    def send_command(self, command, parameters, kw):
+        """SITransport._send_command() from another thread. The frames following
+        the first one of a reply of several frames are kept for the following
+        read_command() calls of the same thread.
+        """
+        priority = kw.get('priority')
+        if priority is None:
+            if command in SICommandScheduler.BULK_COMMANDS:
+                priority = SICommandScheduler.PRIO_BULK
+            else:
+                priority = SICommandScheduler.PRIO_NORMAL
+        frames = self.call(priority, self._send_command, command, parameters, kw)
+        self._pending().extend(frames[1:])
+        return frames[0]
+
+    def read_command(self, timeout):
+        """SITransport._read_command() from another thread."""
+        pending = self._pending()
+        if pending:
+            return pending.popleft()
+        return self.call(SICommandScheduler.PRIO_NORMAL, SITransport._read_command, 
+                         self._si, timeout)
+
+    def _send_command(self, command, parameters, kw):
+        frames = [self._si._send_command(command, parameters, **kw)]
+        for i in range(kw.get('replies', 1) - 1):
+            frames.append(self._si._read_command())
+        return frames
+
+    def _pending(self):
+        pending = getattr(self._local, 'pending', None)
+        if pending is None:
+            pending = self._local.pending = deque()
+        return pending
+
+    def subscribe(self):
+        events = queue.SimpleQueue()
+        with self._lock:
+            self._subscribers = self._subscribers + [events]
+        return events
+
+    def unsubscribe(self, events):
+        with self._lock:
+            self._subscribers = [e for e in self._subscribers if e is not events]
+
+    def subscribed(self):
+        return len(self._subscribers) > 0
+
+    def publish(self, frame):
+        for events in self._subscribers:
+            events.put(frame)
+
+    def stop(self):
+        """Stop the scheduler after the commands already queued."""
+        if self._thread.is_alive():
+            self._requests.put((SICommandScheduler.PRIO_STOP, None, (), {}, None))
+            if not self.is_owner():
+                self._thread.join()
+
+    def _push(self, request):
+        # The sequence number keeps the order within a priority
+        self._seq += 1
+        heapq.heappush(self._heap, (request[0], self._seq) + request[1:])
+
+    def _run(self):
+        heap = self._heap
+        while True:
+            if not heap:
+                try:
+                    self._push(self._requests.get(
+                        timeout=SICommandScheduler.IDLE_POLL if self._subscribers else None))
+                except queue.Empty:
+                    self._poll()
+                    continue
+            # Everything queued meanwhile competes by priority
+            while True:
+                try:
+                    self._push(self._requests.get_nowait())
+                except queue.Empty:
+                    break
+            priority, seq, fn, args, kwargs, reply = heapq.heappop(heap)
+            if fn is None:
+                break
+            try:
+                result = (True, fn(*args, **kwargs))
+            except Exception as msg:
+                result = (False, msg)
+            reply.put(result)
+            if self._subscribers and not heap:
+                self._poll()
+        # Requests queued after stop()
+        while True:
+            try:
+                self._push(self._requests.get_nowait())
+            except queue.Empty:
+                break
+        while heap:
+            reply = heapq.heappop(heap)[-1]
+            if reply is not None:
+                reply.put((False, SIReaderException('The command scheduler has been stopped')))
+
+    def _poll(self):
+        """Read what the station has sent, for the subscribers."""
+        try:
+            self._si._drain_input()
+        except (SIReaderException, SIReaderTimeout, SerialException, OSError):
+            pass
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+#
+#    Copyright (C) 2008-2014  Gaudenz Steinlin <gaudenz@durcheinandertal.ch>
+#                       2014  Simon Harston <simon@harston.de>
+#                       2015  Jan Vorwerk <jan.vorwerk@angexis.com>
+#                       2019  Per Magnusson <per.magnusson@gmail.com>
+#                       2023  Per Magnusson <per.magnusson@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+sireader2.timeline - Event-wide timeline of the punches in many backup memories.
+"""
+
+from .protocol import SIReaderException
+from collections import namedtuple
+from datetime import datetime
+import heapq
+
+# A punch from the backup memory of a station, tagged with the station's control
+# code and serial number. error is '' for a normal punch, otherwise the error
+# of the record as returned by read_backup(), e.g. 'Err3' or 'ErrDate'.
+SIBackupPunch = namedtuple('SIBackupPunch', 'card code time station error')
+
+class SIBackupMerger(object):
+    """Merges the backup memories of many stations, as returned by read_backup()
+    or saved by write_backup_csv(), into one stream of SIBackupPunch records
+    ordered by punch time.
+
+    The backups are merged with a heap, one entry per station, and are read
+    as the merged stream is consumed, so the memory used depends on the number 
+    of stations and not on the number of punches:
+
+      merger = SIBackupMerger()
+      merger.add_backup(si.read_backup(), code=31, serno=123456)
+      merger.add_csv('32_Control_234567.csv')
+      for punch in merger:
+          ...
+
+    The records of one backup memory are in the order they were punched, 
+    which is almost but not always time order (e.g. the clock of the station 
+    was set during the event). Up to reorder records of each station are held
+    back to put locally misplaced records in time order. Records that are 
+    further out of order, and error records (whose time is only a date, 
+    i.e. midnight), are not placed by their own time but directly after the 
+    record before them in the same backup memory, with their time unchanged.
+    Such records are counted per (code, serial number) in out_of_order and
+    errors.
+    """
+
+    REORDER = 64  # Default number of records per station held back for reordering
+
+    def __init__(self, reorder=REORDER):
+        """
+        @param reorder: Number of records of each station held back to put 
+                        locally misplaced records in time order. 0 to use the
+                        order of the backup memories as it is.
+        """
+        self.reorder = reorder
+        self.errors = {}
+        self.out_of_order = {}
+        self._sources = []
+
+    def add_backup(self, data, code, serno=0):
+        """Add the backup memory of a station.
+        @param data:  the tuples (date, cardnr, error) returned by read_backup(),
+                      or any iterable of them in backup memory order
+        @param code:  the control code of the station
+        @param serno: the serial number of the station
+        """
+        self._sources.append(SIBackupPunch(cardnr, code, date, serno, error)
+                             for date, cardnr, error in data)
+
+    def add_csv(self, filename, serno=0):
+        """Add a backup memory saved by write_backup_csv() (or by Config+ in 
+        the same format). The file is read while the merged stream is consumed.
+        @param filename: name of the CSV file
+        @param serno:    the serial number of the station, used if it is not
+                         given in the file
+        """
+        self._sources.append(SIBackupMerger._read_csv(filename, serno))
+
+    def __iter__(self):
+        """Merge the added backups. The backups are consumed, so this can 
+        only be done once."""
+        sources, self._sources = self._sources, []
+        for t, ii, punch in heapq.merge(*[self._ordered(punches) for punches in sources]):
+            yield punch
+
+    def _ordered(self, punches):
+        """Generator yielding (order time, record number, SIBackupPunch) for the
+        punches of one backup memory, with non-decreasing order times."""
+        held = []       # Heap of (order time, record number, punch) held back
+        prev = None     # Time of the previous valid record in backup memory order
+        last = None     # Last order time yielded
+        ii = 0
+        for punch in punches:
+            key = (punch.code, punch.station)
+            if punch.error != '':
+                self.errors[key] = self.errors.get(key, 0) + 1
+                # After the previous record, or first if there is none
+                t = prev if prev is not None else datetime.min
+            else:
+                t = punch.time
+                if last is not None and t < last:
+                    # Too far out of order to be put right, keep the backup memory order
+                    self.out_of_order[key] = self.out_of_order.get(key, 0) + 1
+                    t = prev if prev is not None else last
+                prev = t
+            if last is not None and t < last:
+                t = last
+            heapq.heappush(held, (t, ii, punch))
+            ii += 1
+            if len(held) > self.reorder:
+                item = heapq.heappop(held)
+                last = item[0]
+                yield item
+        while held:
+            yield heapq.heappop(held)
+
+    @staticmethod
+    def _read_csv(filename, serno):
+        """Generator yielding the records of a backup CSV file as SIBackupPunch."""
+        import csv
+        with open(filename, newline='') as csvfile:
+            reader = csv.reader(csvfile, delimiter=';')
+            next(reader, None)
+            for row in reader:
+                if not row:
+                    continue
+                try:
+                    # Control time is '<date>   <time>' or '<date>   <error>'
+                    date, rest = row[3].split()
+                    if rest.startswith('Err'):
+                        punchtime = datetime.fromisoformat(date)
+                        error = rest
+                    else:
+                        punchtime = datetime.fromisoformat(date + 'T' + rest)
+                        error = ''
+                    yield SIBackupPunch(int(row[2]), int(row[6]), punchtime,
+                                        int(row[5]) if row[5] else serno, error)
+                except (ValueError, IndexError):
+                    raise SIReaderException('Invalid backup record in %s line %d: %s' % 
+                                            (filename, reader.line_num, ';'.join(row)))
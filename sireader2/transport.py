@@ -0,0 +1,678 @@
+#!/usr/bin/env python3
+#
+#    Copyright (C) 2008-2014  Gaudenz Steinlin <gaudenz@durcheinandertal.ch>
+#                       2014  Simon Harston <simon@harston.de>
+#                       2015  Jan Vorwerk <jan.vorwerk@angexis.com>
+#                       2019  Per Magnusson <per.magnusson@gmail.com>
+#                       2023  Per Magnusson <per.magnusson@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+sireader2.transport - The serial link to a station: finding and opening the port, sending
+commands and reading the replies.
+"""
+
+from .protocol import SIReaderException, SIReaderTimeout, SIReaderCardChanged, byte2int, int2byte
+from .codec import SICodec
+from serial import Serial
+from serial.serialutil import SerialException
+from binascii import hexlify
+from time import monotonic
+import os, sys
+
+class SITransport(SICodec):
+    """The connection to a station and the exchange of frames with it."""
+
+    # WAKEUP is only sent before a command when there has been no reply from the
+    # station for this many seconds, or the last command failed, since it may
+    # have gone to sleep. 0 sends it before every command.
+    WAKEUP_IDLE        = 0.5
+
+    # Adaptive timeouts (adaptive_timeout=True), in seconds, see _command_timeout()
+    TIMEOUT_FLOOR_DIRECT = 0.1 # Never wait shorter than this for the direct station
+    TIMEOUT_FLOOR_REMOTE = 0.5 # ... or for a remote station behind the optical link
+    TIMEOUT_BACKOFF_MAX  = 16  # Max factor the timeout is multiplied by after timeouts
+    TIMEOUT_SLOW_COMMANDS = {SICodec.C_ERASE_BACKUP: 2.0} # Min timeout of commands that take time
+
+
+
+    def __init__(self, *args, **kwargs):
+        """Initializes communication with si station at port.
+        @param port: Serial device for the connection if port is None it
+                     scans all available ports and connects to the first
+                     reader found
+            port = None, debug = False, logfile = None                     
+        @param logfile:      Name of a binary protocol log (see SIProtocolLog) 
+                             that all frames are appended to.
+        @param log_sync:     When the protocol log is synced to disk: 'frame', 
+                             'group' (default) or 'close'.
+        @param log_group_ms: Max time in ms between syncs when log_sync is 'group'.
+        @param serial:       An already opened serial port like object to use 
+                             instead of opening a port, e.g. a SIReplaySerial.
+        @param metrics:      Count commands, round trip times, bytes and errors
+                             (see SIMetrics and metrics_snapshot()).
+        @param metrics_hook: Function called for each metrics event, see 
+                             SIMetrics. Implies metrics=True.
+        @param trace:        Number of frames to keep in an in-memory protocol
+                             trace (see SIProtocolTrace and dump_trace()). 
+                             0 (default) disables the trace.
+        @param trace_dump:   File object (e.g. sys.stderr) that the trace is 
+                             dumped to when a command fails.
+        @param adaptive_timeout: Wait for replies as long as the measured round
+                             trip times of the link suggest, instead of the
+                             2 s timeout of the serial port (see 
+                             _command_timeout()).
+        @param scheduler:    Let several threads use the reader at the same 
+                             time, see SICommandScheduler and subscribe().
+        """
+        
+        self._serial = None # Serial port object
+        self._debug = kwargs['debug'] if 'debug' in kwargs else False
+        self.proto_config = None
+        self._station_code = None
+        self._serno = 0     # Serial number of station
+        self.direct = True  # Direct or remote mode
+        self._direct_known = False # If direct is known to match the station
+        self._last_reply = None    # monotonic() time of the last reply, None after a failure
+        self._use_scheduler = kwargs['scheduler'] if 'scheduler' in kwargs else False
+        self._scheduler = None     # SICommandScheduler owning the serial port
+        self._noconnect = kwargs['noconnect'] if 'noconnect' in kwargs else False
+        self._lowspeed = kwargs['lowspeed'] if 'lowspeed' in kwargs else False
+        if 'logfile' in kwargs and kwargs['logfile'] is not None:
+            from .log import SIProtocolLog
+            self._logfile = SIProtocolLog(
+                kwargs['logfile'],
+                sync = kwargs['log_sync'] if 'log_sync' in kwargs else SIProtocolLog.SYNC_GROUP,
+                group_ms = kwargs['log_group_ms'] if 'log_group_ms' in kwargs else 50)
+        else:
+            self._logfile = None
+        metrics_hook = kwargs['metrics_hook'] if 'metrics_hook' in kwargs else None
+        if metrics_hook is not None or ('metrics' in kwargs and kwargs['metrics']):
+            from .metrics import SIMetrics
+            self._metrics = SIMetrics(metrics_hook)
+        else:
+            self._metrics = None
+        if 'trace' in kwargs and kwargs['trace']:
+            from .log import SIProtocolTrace
+            self._trace = SIProtocolTrace(
+                kwargs['trace'],
+                dump_on_error = kwargs['trace_dump'] if 'trace_dump' in kwargs else None)
+        else:
+            self._trace = None
+        self.sysval = ''    # The most recently read station configuration information
+        # Round trip time estimates, (direct, command): [srtt, rttvar, backoff]
+        if 'adaptive_timeout' in kwargs and kwargs['adaptive_timeout']:
+            self._rtt_estimates = {}
+        else:
+            self._rtt_estimates = None
+        self._late_replies = 0 # Replies that may still arrive after adaptive timeouts
+            
+        errors = ''
+        if 'serial' in kwargs:
+            self._connect_reader(kwargs['serial'])
+            return
+        elif 'port' in kwargs:
+            self._connect_reader(kwargs['port'])
+            return
+        else:
+            scan_ports = self.guessSerialPorts()
+            
+            if len(scan_ports) == 0:
+                errors = 'no serial ports found'
+                
+            for port in scan_ports:
+                try:
+                    print('Trying ' + port)
+                    self._connect_reader(port)
+                    return
+                except (SIReaderException, SIReaderTimeout) as msg:
+                    errors = '%sport: %s: %s\n' % (errors, port, msg)
+                    pass
+
+        raise SIReaderException('No SI Reader found. Possible reasons: %s' % errors)
+
+    @classmethod
+    def guessSerialPorts(self, ttyS=False):
+        """Look for a COM port that might be connected to a Sportident station."""
+
+        def port_sort_fn(portinfo):
+            """Function used when sorting ranked COM ports."""
+            return -portinfo[0]
+
+        found = []
+        if sys.platform.startswith('linux'):
+            import re
+            found = [os.path.join('/dev', f) for f in os.listdir('/dev')
+                     if re.match('ttyS.*|ttyUSB.*' if ttyS else 'ttyUSB.*', f)]
+        elif sys.platform.startswith('darwin'):
+            with os.scandir('/dev') as it:
+                for entry in it:
+                    # assume that silabs.com CP210x USB to UART bridge is used
+                    if entry.name.startswith('tty.SLAB'):
+                        found.append(os.path.join('/dev', entry.name))
+        elif sys.platform.startswith('win'):
+            # Rank ports based on some kind of criteria of how
+            # likely they are to be the correct port.
+            portname = False
+            import serial.tools.list_ports
+            ports = list(serial.tools.list_ports.comports())
+            ranked_ports = []
+            for p in ports:
+                """
+                print(p[0])
+                print(p[1])
+                print(p[2])
+                """
+                portname = p[0]
+                portname1 = p[1]
+                portname2 = p[2]
+                points = 0
+                if portname == 'COM1':
+                    # COM1 is often not accessible on modern computers
+                    points -= 1
+                if 'sportident' in portname1.lower():
+                    points += 10
+                if 'acpi' in portname2.lower():
+                    points -= 5
+                ranked_ports.append([points, portname, portname1, portname2])
+
+            # Sort on ranking
+            ranked_ports.sort(key=port_sort_fn)
+            # Try out the ports in the order they are ranked
+            for portinfo in ranked_ports:
+                try:
+                    s = Serial(portinfo[1])
+                    found.append(s.portstr)
+                    s.close()
+                except SerialException:
+                    pass
+        else:
+            raise SIReaderException('Unsupported OS: %s' % sys.platform)
+        
+        return found
+    
+    @classmethod
+    def scanStations(self, lowspeed=False):
+        '''Scans all the possible serial ports and tries to find a SportIdent station
+        @return: array of (serial port name, station code)
+        '''
+        import threading
+        found = []
+        def _run(port):
+            si = self(port=port, debug=True, lowspeed=lowspeed)
+            stationCode = si.get_station_code()
+            found.append( (port, stationCode) )
+            si.disconnect()
+        threads = []
+        # Search in parallel
+        for port in self.guessSerialPorts():
+            t = threading.Thread(target=_run, args=(port,))
+            threads.append(t)
+            t.start()
+        for t in threads:
+            t.join()
+        return found
+
+
+    def flush(self):
+        if self._scheduler is not None and not self._scheduler.is_owner():
+            return self._scheduler.call(self._scheduler.PRIO_NORMAL, self.flush)
+        self._serial.flushInput()
+        self._serial.flushOutput()
+
+    def subscribe(self):
+        """Receive the frames the station sends on its own (cards inserted and
+        removed, punches in autosend mode), with scheduler=True. While there are
+        subscribers, the frames are read as they arrive and are not returned by
+        poll_punch(), but card changes are still seen by poll_sicard().
+        @return: queue.SimpleQueue getting (command, data) tuples, see 
+                 _read_command()
+        """
+        if self._scheduler is None:
+            raise SIReaderException('Only readers created with scheduler=True have subscribers')
+        return self._scheduler.subscribe()
+
+    def unsubscribe(self, events):
+        """Stop receiving frames in a queue returned by subscribe()."""
+        if self._scheduler is not None:
+            self._scheduler.unsubscribe(events)
+
+    def metrics_snapshot(self):
+        """Return the communication metrics, see SIMetrics.snapshot(), or None
+        if the reader was not created with metrics=True or a metrics_hook."""
+        if self._metrics is None:
+            return None
+        return self._metrics.snapshot()
+
+    def dump_trace(self, file=None, decoded=True, last=None):
+        """Write the protocol trace, see SIProtocolTrace.dump(). The reader 
+        must have been created with trace=<number of frames>."""
+        if self._trace is None:
+            raise SIReaderException('The reader was not created with a trace.')
+        self._trace.dump(file, decoded, last)
+
+    def set_direct(self, force = False):
+        """Set the station to direct (master) mode. Nothing is sent if the 
+        station is known to be in direct mode already.
+        @param force: Send C_SET_MS anyway, e.g. if another program may have 
+                      changed the mode.
+        """
+        self._set_ms(True, force)
+
+    def set_remote(self, force = False):
+        """Set the station to remote (slave, indirect) mode. Nothing is sent if
+        the station is known to be in remote mode already.
+        @param force: Send C_SET_MS anyway.
+        """
+        self._set_ms(False, force)
+
+    def _set_ms(self, direct, force):
+        if direct == self.direct and self._direct_known and not force:
+            return
+        try:
+            self._send_command(SITransport.C_SET_MS, 
+                               SITransport.P_MS_DIRECT if direct else SITransport.P_MS_INDIRECT)
+        except (SIReaderException, SIReaderTimeout):
+            # The station may or may not have changed mode
+            self._direct_known = False
+            raise
+        if direct != self.direct or not self._direct_known:
+            # The reply came from the direct station, the other one may be asleep
+            self._last_reply = None
+        self.direct = direct
+        self._direct_known = True
+
+    def disconnect(self):
+        """Close the serial port an disconnect from the station."""
+        if self._scheduler is not None:
+            self._scheduler.stop()
+            self._scheduler = None
+        self._serial.close()
+
+    def reconnect(self):
+        """Close the serial port and reopen again."""
+        self.disconnect()
+        self._connect_reader(self._serial.port)
+
+    def _connect_reader(self, port):
+        """Connect to SI Reader.
+        @param port: serial port name, or an already opened serial port like object
+        """
+        baudrate = 4800 if self._noconnect or self._lowspeed else 38400
+        if not isinstance(port, str):
+            self._serial = port
+            port = self._serial.port
+        else:
+            try:
+                self._serial = Serial(port, baudrate = baudrate, timeout = 2)
+            except (SerialException, OSError):
+                raise SIReaderException("Could not open port '%s'" % port)
+        
+        # flush possibly available input
+        try:
+            self.flush()
+        except (SerialException, OSError):
+            # This happens if the serial port is not ready for
+            # whatever reason (eg. there is no real device behind this device node). 
+            raise SIReaderException("Could not flush port '%s'" % port)
+        
+        if not self._noconnect:
+            try:
+                # try at max baud rate, extended protocol
+                self._send_command(SITransport.C_SET_MS, SITransport.P_MS_DIRECT)
+            except (SIReaderException, SIReaderTimeout):
+                if self._serial.baudrate == 4800:
+                    raise
+                else:
+                    # try at 4800 baud rate this time
+                    try:
+                        self._serial.baudrate = 4800
+                    except (SerialException, OSError) as msg:
+                        raise SIReaderException('Could not set port speed to 4800: %s' % msg)
+                    try:
+                        self._send_command(SITransport.C_SET_MS, SITransport.P_MS_DIRECT)
+                    except SIReaderException as msg:
+                        raise SIReaderException('This module only works with BSM7/8 stations: %s' % msg)
+            self.direct = True
+            self._direct_known = True
+
+        self.port = port
+        self.baudrate = self._serial.baudrate
+        self._update_proto_config()
+        self.name = self._serial.name
+        if self._use_scheduler:
+            from .scheduler import SICommandScheduler
+            self._scheduler = SICommandScheduler(self)
+
+
+
+    def update_proto_config(self):
+        """Read the protocol configuration, operating mode, serial number and code
+        of the station, e.g. when another remote station has been placed at the master.
+        @return: proto_config
+        """
+        return self._update_proto_config()
+
+    def _update_proto_config(self, timeout=None):
+        self.proto_config = {}
+        if self._noconnect:
+            self.proto_config['ext_proto']  = True
+            self.proto_config['auto_send']  = True
+            self.proto_config['handshake']  = False
+            self.proto_config['pw_access']  = False
+            self.proto_config['punch_read'] = False
+            self.proto_config['mode'] = 2
+            self._serno = 0
+            self._station_code = 0
+        else:
+            # Read protocol configuration
+            sysval = self._send_command(SITransport.C_GET_SYS_VAL, b'\x00\x80', timeout=timeout)[1]
+            self.sysval = sysval
+            config_byte = byte2int(SITransport._extract_sysval(sysval, SITransport.O_PROTO, 1))
+            self.proto_config['ext_proto']  = config_byte & (1 << 0) != 0
+            self.proto_config['auto_send']  = config_byte & (1 << 1) != 0
+            self.proto_config['handshake']  = config_byte & (1 << 2) != 0
+            self.proto_config['pw_access']  = config_byte & (1 << 4) != 0
+            self.proto_config['punch_read'] = config_byte & (1 << 7) != 0
+            mode_byte = byte2int(SITransport._extract_sysval(sysval, SITransport.O_MODE, 1))
+            self.proto_config['mode'] = mode_byte
+            serno = SITransport._to_int(SITransport._extract_sysval(sysval, 
+                                                          SITransport.O_SERIAL_NO, 4))
+            self._serno = serno
+            # self._station_code is updated in the call above to _send_command()
+
+        return self.proto_config
+
+    def __del__(self):
+        if self._serial is not None:
+            self._serial.close()
+        if self._logfile is not None:
+            self._logfile.close()
+
+    def _send_command(self, command, parameters, **kw):
+        if self._scheduler is not None and not self._scheduler.is_owner():
+            return self._scheduler.send_command(command, parameters, kw)
+        try:
+            if self._serial.inWaiting() != 0 and self._scheduler is None:
+                self._drop_late_replies()
+            if self._serial.inWaiting() != 0:
+                if self._scheduler is None:
+                    raise SIReaderException('Input buffer must be empty before sending command.' + 
+                                            ' Currently %s bytes in the input buffer.' % 
+                                            self._serial.inWaiting())
+                self._drain_input()
+            command_string = command + int2byte(len(parameters)) + parameters
+            crc = SITransport._crc(command_string)
+            cmd = SITransport.STX + command_string + crc + SITransport.ETX
+            if not kw.get('skipwakeup') and (
+                    self._last_reply is None or 
+                    monotonic() - self._last_reply >= self.WAKEUP_IDLE):
+                cmd = SITransport.WAKEUP + cmd
+            if self._debug:
+                print("==>> command '%s', parameters %s, crc %s" % 
+                      (hexlify(command).decode('ascii'),
+                       ' '.join([hexlify(int2byte(c)).decode('ascii') for c in parameters]),
+                       hexlify(crc).decode('ascii'),
+                   ))
+            self._serial.write(cmd)
+        except (SerialException, OSError) as  msg:
+            raise SIReaderException('Could not send command: %s' % msg)
+
+        if self._logfile is not None:
+            self._logfile.write(self._logfile.SENT, cmd)
+        if self._trace is not None:
+            self._trace.record(self._trace.SENT, cmd)
+        # timeout: time to wait for the reply, e.g. short when probing for a
+        # station, None for the timeout of the serial port
+        # replies: number of frames in the reply, read with _read_command() 
+        # after the first one. Only used by the command scheduler, which reads 
+        # them all before running the commands of other threads.
+        timeout = kw.get('timeout')
+        if self._rtt_estimates is not None:
+            key = (self.direct, command)
+            if timeout is None:
+                timeout = self._command_timeout(key)
+        elif self._metrics is None and self._trace is None:
+            try:
+                reply = self._read_reply(command, timeout)
+            except (SIReaderException, SIReaderTimeout):
+                self._last_reply = None
+                raise
+            self._last_reply = monotonic()
+            return reply
+
+        start = monotonic()
+        code = byte2int(command)
+        if self._metrics is not None:
+            self._metrics.sent(code, len(cmd))
+        try:
+            reply = self._read_reply(command, timeout)
+        except (SIReaderException, SIReaderTimeout) as msg:
+            self._last_reply = None
+            if self._rtt_estimates is not None and isinstance(msg, SIReaderTimeout):
+                self._backoff_timeout(key)
+                # The reply may only be late, dropped when it arrives
+                self._late_replies += 1
+            if self._metrics is not None:
+                self._metrics.failed(code, isinstance(msg, SIReaderTimeout))
+            if self._trace is not None and self._trace.dump_on_error is not None:
+                self._trace.dump_on_error.write('Command 0x%02x failed: %s\n' % (code, msg))
+                self._trace.dump(self._trace.dump_on_error)
+            raise
+        self._last_reply = monotonic()
+        rtt = self._last_reply - start
+        if self._rtt_estimates is not None:
+            self._update_rtt(key, rtt)
+        if self._metrics is not None:
+            self._metrics.rtt(code, rtt)
+        return reply
+
+    def _read_reply(self, command, timeout):
+        """Reads the reply to a command. With the command scheduler, frames the
+        station sends on its own before the reply (see SICommandScheduler.UNSOLICITED)
+        are passed on by _unsolicited() instead of being taken as the reply, and
+        a card inserted or removed only interrupts commands reading the card.
+        """
+        while True:
+            if self._scheduler is None:
+                reply = self._read_command(timeout)
+            else:
+                try:
+                    reply = self._read_command(timeout)
+                except SIReaderCardChanged:
+                    if command in self._scheduler.CARD_COMMANDS:
+                        raise
+                    continue
+            if reply[0] != command and self._late_replies > 0:
+                # The late reply to an earlier command
+                self._late_replies -= 1
+                continue
+            if (self._scheduler is None or reply[0] == command or
+                reply[0] not in self._scheduler.UNSOLICITED):
+                return reply
+            self._unsolicited(reply)
+
+    def _drop_late_replies(self):
+        """Reads and drops the replies that arrived after their commands timed 
+        out with adaptive timeouts, before a command is sent without the command
+        scheduler (with it, they are dropped by _drain_input())."""
+        while self._late_replies > 0 and self._serial.inWaiting() > 0:
+            self._late_replies -= 1
+            try:
+                self._read_command(timeout = 0)
+            except SIReaderCardChanged:
+                # Not a reply
+                self._late_replies += 1
+            except SIReaderTimeout:
+                break
+            except SIReaderException:
+                # Garbage, flushed by _read_command()
+                continue
+
+    def _drain_input(self):
+        """Reads the frames waiting in the input buffer when the command 
+        scheduler owns the serial port, before a command is sent and while idle.
+        Replies to commands that timed out are dropped.
+        """
+        while self._serial.inWaiting() > 0:
+            try:
+                frame = self._read_command(timeout = 0)
+            except SIReaderCardChanged:
+                continue
+            except SIReaderTimeout:
+                break
+            except SIReaderException:
+                # Garbage, flushed by _read_command()
+                continue
+            if frame[0] in self._scheduler.UNSOLICITED:
+                self._unsolicited(frame)
+            elif self._late_replies > 0:
+                self._late_replies -= 1
+
+    def _unsolicited(self, frame):
+        """Called for frames from the station that were not asked for, outside
+        of poll_sicard() and poll_punch(), when the command scheduler is used.
+        They have already been published to the subscribers (if any) by 
+        _read_command(). Subclasses keep them for their polling functions.
+        """
+        pass
+
+    def _command_timeout(self, key):
+        """Time to wait for the reply to a command when adaptive_timeout is on.
+        Computed like the retransmission timeout of TCP (RFC 6298) from the
+        smoothed round trip time and its variation, measured separately for
+        each command in direct and remote mode, since e.g. a block of a card
+        takes longer than a beep and the optical link adds its own delay.
+        @param key: (direct, command)
+        @return:    timeout in seconds, None (the timeout of the serial port)
+                    until the command has been measured
+        """
+        est = self._rtt_estimates.get(key)
+        if est is None:
+            return None
+        srtt, rttvar, backoff = est
+        floor = self.TIMEOUT_FLOOR_DIRECT if key[0] else self.TIMEOUT_FLOOR_REMOTE
+        floor = max(floor, self.TIMEOUT_SLOW_COMMANDS.get(key[1], 0))
+        timeout = max(floor, (srtt + 4*rttvar) * backoff)
+        # Never wait longer than without adaptive timeouts
+        return min(timeout, max(floor, self._serial.timeout))
+
+    def _update_rtt(self, key, rtt):
+        """Update the round trip time estimate of a command after a reply."""
+        est = self._rtt_estimates.get(key)
+        if est is None:
+            self._rtt_estimates[key] = [rtt, rtt/2, 1]
+        else:
+            est[1] = 0.75*est[1] + 0.25*abs(est[0] - rtt)
+            est[0] = 0.875*est[0] + 0.125*rtt
+            est[2] = 1
+
+    def _backoff_timeout(self, key):
+        """Double the timeout of a command after a timeout, in case the link 
+        has become slower."""
+        est = self._rtt_estimates.get(key)
+        if est is not None:
+            est[2] = min(est[2]*2, self.TIMEOUT_BACKOFF_MAX)
+
+    def _read_command(self, timeout = None):
+        """ Receive reply from station. 
+        Return value is a tuple: (command_code, data).
+        'command_code' is a byte
+        'data' is a byte array
+        'data' does not include: STX, command, length field, station code, crc and ETX
+        The first byte of 'data' always seems to be 0 and does not seem to be included 
+        in the offsets, so 1 has to be added to the offset values when indexing the data
+        returned by commands like C_GET_SYS_VAL 0x00 0x80. 
+        """
+
+        if self._scheduler is not None and not self._scheduler.is_owner():
+            return self._scheduler.read_command(timeout)
+        try:
+            if timeout != None:
+                old_timeout = self._serial.timeout
+                self._serial.timeout = timeout
+            char = self._serial.read()
+            if timeout != None:
+                self._serial.timeout = old_timeout
+
+            if char == SITransport.WAKEUP:
+                # Do stations ever send WAKEUP?
+                # It does not hurt to check for it...
+                char = self._serial.read()                
+
+            if char == b'':
+                raise SIReaderTimeout('No data available')
+            elif char == SITransport.NAK:
+                if self._logfile is not None:
+                    self._logfile.write(self._logfile.RECEIVED, char)
+                if self._trace is not None:
+                    self._trace.record(self._trace.RECEIVED, char)
+                if self._metrics is not None:
+                    self._metrics.event('nak', 1)
+                raise SIReaderException('Invalid command or parameter.')
+            elif char != SITransport.STX:
+                self._serial.flushInput()
+                if self._trace is not None:
+                    self._trace.record(self._trace.RECEIVED, char)
+                if self._metrics is not None:
+                    self._metrics.event('resync', 1)
+                raise SIReaderException('Invalid start byte %s' % hex(byte2int(char)))
+
+            # Read command, length, data, crc, ETX
+            cmd = self._serial.read()
+            length = self._serial.read()
+            station = self._serial.read(2)
+            self._station_code = SITransport._to_int(station)
+            data = self._serial.read(byte2int(length)-2)
+            crc = self._serial.read(2)
+            etx = self._serial.read()
+
+            if self._logfile is not None or self._trace is not None:
+                # Log before checking the frame so that corrupt frames are kept too
+                frame = char + cmd + length + station + data + crc + etx
+                if self._logfile is not None:
+                    self._logfile.write(self._logfile.RECEIVED, frame)
+                if self._trace is not None:
+                    self._trace.record(self._trace.RECEIVED, frame)
+
+            if self._debug:
+                print("<<== command '%s', len %i, station %s, data %s, crc %s, etx %s" % 
+                      (hexlify(cmd).decode('ascii'),
+                       byte2int(length),
+                       hexlify(station).decode('ascii'),
+                       ' '.join([hexlify(int2byte(c)).decode('ascii') for c in data]),
+                       hexlify(crc).decode('ascii'),
+                       hexlify(etx).decode('ascii'),
+                   ))
+
+            if etx != SITransport.ETX:
+                if self._metrics is not None:
+                    self._metrics.event('framing_error', 
+                                        len(char + cmd + length + station + data + crc + etx))
+                raise SIReaderException('No ETX byte received.')
+            if not SITransport._crc_check(cmd + length + station + data, crc):
+                if self._metrics is not None:
+                    self._metrics.event('crc_error', 
+                                        len(char + cmd + length + station + data + crc + etx))
+                raise SIReaderException('CRC check failed')
+            if self._metrics is not None:
+                self._metrics.received(byte2int(cmd), byte2int(length) + 6)
+
+        except (SerialException, OSError) as msg:
+            raise SIReaderException('Error reading command: %s' % msg)
+
+        if self._scheduler is not None and cmd in self._scheduler.UNSOLICITED:
+            self._scheduler.publish((cmd, data))
+
+        return (cmd, data)
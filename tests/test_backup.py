@@ -0,0 +1,149 @@
+#
+#    Copyright (C)    2026  Per Magnusson <per.magnusson@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Tests of fast_baud_rate() and the baud rate switch of SIBackup.
+"""
+
+from sireader2 import SIReader, SIReaderException
+from siemulator import SIStationEmulator
+from datetime import datetime
+import contextlib
+import io
+import threading
+import unittest
+
+
+class SpeedLink(object):
+    """Serial port with a speed of its own in front of an emulated station.
+    Nothing gets through when the speeds differ: commands are lost and 
+    replies are garbled."""
+
+    def __init__(self, emu, baudrate):
+        self._emu = emu
+        self._baudrate = baudrate
+        self.threads = set()    # Threads that changed the speed
+        self.dead = False       # Lose everything, e.g. the station was removed
+
+    @property
+    def baudrate(self):
+        return self._baudrate
+
+    @baudrate.setter
+    def baudrate(self, baudrate):
+        self.threads.add(threading.current_thread())
+        self._baudrate = baudrate
+
+    @property
+    def timeout(self):
+        return self._emu.timeout
+
+    @timeout.setter
+    def timeout(self, timeout):
+        self._emu.timeout = timeout
+
+    def _through(self):
+        return not self.dead and self._baudrate == self._emu.baudrate
+
+    def write(self, data):
+        if self._through():
+            self._emu.write(data)
+        return len(data)
+
+    def read(self, size=1):
+        data = self._emu.read(size)
+        if not self._through():
+            data = b'\xfe' * len(data)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._emu, name)
+
+
+class TestFastBaudRate(unittest.TestCase):
+
+    def connect(self, **kwargs):
+        self.emu = SIStationEmulator(mode=SIReader.M_CONTROL, autosend=False, baudrate=4800,
+                                     realtime=False)
+        for i in range(20):
+            self.emu.punch(500000 + i, datetime(2026, 5, 17, 10, i))
+        self.link = SpeedLink(self.emu, 4800)
+        self.si = SIReader(serial=self.link, **kwargs)
+        self.emu.timeout = 0.1
+
+    def tearDown(self):
+        self.si.disconnect()
+
+    def test_switch_and_restore(self):
+        self.connect()
+        with self.si.fast_baud_rate():
+            self.assertEqual((self.link.baudrate, self.emu.baudrate), (38400, 38400))
+            self.assertEqual(len(self.si.read_backup()), 20)
+        self.assertEqual((self.link.baudrate, self.emu.baudrate), (4800, 4800))
+        self.si.beep()
+
+    def test_read_backup(self):
+        self.connect()
+        self.assertEqual(len(self.si.read_backup(fast_baud=True)), 20)
+        self.assertEqual((self.link.baudrate, self.emu.baudrate), (4800, 4800))
+
+    def test_block_raises(self):
+        self.connect()
+        with self.assertRaises(ValueError):
+            with self.si.fast_baud_rate():
+                raise ValueError('block')
+        self.assertEqual((self.link.baudrate, self.emu.baudrate), (4800, 4800))
+
+    def test_restore_fails(self):
+        self.connect()
+        with self.assertRaises(SIReaderException):
+            with self.si.fast_baud_rate():
+                self.link.dead = True
+        self.assertEqual(self.emu.baudrate, 38400)
+
+    def test_restore_fails_and_block_raises(self):
+        # The exception of the block is kept, the failure is only reported
+        self.connect()
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            with self.assertRaises(ValueError):
+                with self.si.fast_baud_rate():
+                    self.link.dead = True
+                    raise ValueError('block')
+        self.assertIn('38400', stderr.getvalue())
+
+    def test_unchanged(self):
+        self.connect()
+        self.si.set_remote()
+        with self.si.fast_baud_rate():
+            self.assertEqual(self.emu.baudrate, 4800)
+        self.si.set_direct()
+        self.si.set_baud_rate_38400()
+        with self.si.fast_baud_rate():
+            pass
+        self.assertEqual((self.link.baudrate, self.emu.baudrate), (38400, 38400))
+
+    def test_scheduler(self):
+        # The speed of the port is changed by the thread reading it
+        self.connect(scheduler=True)
+        thread = self.si._scheduler._thread
+        with self.si.fast_baud_rate():
+            self.assertEqual(len(self.si.read_backup()), 20)
+        self.assertEqual((self.link.baudrate, self.emu.baudrate), (4800, 4800))
+        self.assertEqual(self.link.threads, {thread})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,231 @@
+#
+#    Copyright (C)    2026  Per Magnusson <per.magnusson@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Tests of the detection and recovery of lost punches in SIReaderControl, of 
+iter_punches() and aiter_punches(), and of the counting of lost punches in 
+SIReaderRadio.
+"""
+
+from sireader2 import SIReader, SIReaderControl, SIReaderRadio, SIPunch
+from siemulator import SIStationEmulator, trans_rec
+from datetime import datetime, timedelta
+import asyncio
+import unittest
+
+T = datetime(2026, 5, 17, 10, 11, 12)
+START = SIStationEmulator.BACKUP_START
+
+
+class TestControlGaps(unittest.TestCase):
+
+    def setUp(self):
+        self.emu = SIStationEmulator(mode=SIReader.M_CONTROL, realtime=False)
+        self.si = SIReaderControl(serial=self.emu)
+        self.commands = self.emu.commands
+
+    def poll(self):
+        """Poll until no more punches are received and all gaps are recovered."""
+        cards = []
+        for i in range(20):
+            punches = self.si.poll_punch(timeout=0.05)
+            cards += [p[0] for p in punches]
+            if not punches and not self.si._gaps:
+                break
+        return cards
+
+    def queue(self, cardnr, offset):
+        """A frame received before the reply to a command, read by the next poll."""
+        self.si._frames.append((SIReader.C_TRANS_REC, trans_rec(cardnr, T, offset)))
+
+    def test_no_gap(self):
+        for i in range(5):
+            self.emu.punch(500000 + i, T + timedelta(seconds=i))
+        self.assertEqual(self.poll(), [500000 + i for i in range(5)])
+        self.assertEqual(self.si._next_offset, START + 5*SIReader.REC_LEN)
+        self.assertEqual(self.si._gaps, [])
+
+    def test_gap_recovered(self):
+        for i in range(6):
+            self.emu.punch(500000 + i, T + timedelta(seconds=i), send=i not in (2, 3))
+        self.assertEqual(self.poll(), [500000 + i for i in range(6)])
+        self.assertEqual(self.si._gaps, [])
+        self.assertEqual(self.si.outstanding_punches(), 0)
+
+    def test_delayed_frame(self):
+        # The frame of a lost punch arriving late is not taken as a wrap of the
+        # backup memory
+        for i in range(3):
+            self.emu.punch(500000 + i, T + timedelta(seconds=i), send=False)
+        for i in (0, 2, 1):
+            self.queue(500000 + i, START + i*SIReader.REC_LEN)
+        cards = self.poll()
+        self.assertEqual(sorted(set(cards)), [500000, 500001, 500002])
+        self.assertEqual(self.si._next_offset, START + 3*SIReader.REC_LEN)
+        self.assertEqual(self.si._gaps, [])
+
+    def test_wrap(self):
+        top = 0x20000
+        self.queue(500000, top - 2*SIReader.REC_LEN)
+        self.queue(500001, top - SIReader.REC_LEN)
+        self.queue(500002, START)
+        self.assertEqual(self.poll(), [500000, 500001, 500002])
+        self.assertEqual(self.si._next_offset, START + SIReader.REC_LEN)
+        self.assertEqual(self.si._gaps, [])
+
+    def test_wrap_drops_stale_gap(self):
+        top = 0x20000
+        self.queue(500000, top - 4*SIReader.REC_LEN)
+        self.queue(500003, top - SIReader.REC_LEN)
+        self.queue(500004, START)
+        self.poll()
+        self.assertEqual(self.si._gaps, [])
+        self.assertEqual(self.si.outstanding_punches(), 0)
+        self.assertEqual(self.si._next_offset, START + SIReader.REC_LEN)
+
+    def test_misaligned_offset(self):
+        # A gap that is not whole records is not read from the backup memory
+        self.queue(500000, START)
+        self.queue(500001, START + SIReader.REC_LEN + 4)
+        self.queue(500002, START + 2*SIReader.REC_LEN + 4)
+        self.assertEqual(self.poll(), [500000, 500001, 500002])
+        self.assertEqual(self.si._gaps, [])
+        self.assertEqual(self.emu.commands, self.commands)
+
+    def test_erase(self):
+        for i in range(12):
+            self.emu.punch(600000 + i, T + timedelta(seconds=i))
+        self.assertEqual(len(self.poll()), 12)
+        self.si._send_command(SIReader.C_ERASE_BACKUP, b'')
+        # Gaps after the erase are found and recovered from the new offsets
+        for i in range(4):
+            self.emu.punch(700000 + i, T + timedelta(seconds=i), send=i != 2)
+        self.assertEqual(self.poll(), [700000 + i for i in range(4)])
+        self.assertEqual(self.si._next_offset, START + 4*SIReader.REC_LEN)
+        self.assertEqual(self.si._gaps, [])
+
+
+class TestIterPunches(unittest.TestCase):
+
+    def setUp(self):
+        self.emu = SIStationEmulator(mode=SIReader.M_CONTROL, realtime=False)
+        self.si = SIReaderControl(serial=self.emu)
+
+    def queue(self, cardnr, offset):
+        self.si._frames.append((SIReader.C_TRANS_REC, trans_rec(cardnr, T, offset)))
+
+    def punch(self, count):
+        """Punches stored in the backup memory, but not sent."""
+        for i in range(count):
+            self.emu.punch(500000 + i, T, send=False)
+
+    def test_stops_after_timeout(self):
+        for i in range(3):
+            self.emu.punch(500000 + i, T)
+        punches = list(self.si.iter_punches(timeout=0.1, flush_latency=0.01))
+        self.assertEqual([p.card for p in punches], [500000, 500001, 500002])
+        self.assertEqual([p.offset for p in punches],
+                         [START + i*SIReader.REC_LEN for i in range(3)])
+
+    def test_duplicate_dropped(self):
+        self.punch(3)
+        punches = self.si.iter_punches(timeout=0.1, flush_latency=0.01)
+        self.queue(500000, START)
+        self.queue(500001, START + SIReader.REC_LEN)
+        self.assertEqual([next(punches).card for i in range(2)], [500000, 500001])
+        # The same frame again, e.g. repeated by a radio link
+        self.queue(500000, START)
+        self.queue(500002, START + 2*SIReader.REC_LEN)
+        self.assertEqual([p.card for p in punches], [500002])
+
+    def test_window(self):
+        # Only the last window offsets are remembered
+        self.punch(3)
+        punches = self.si.iter_punches(timeout=0.1, flush_latency=0.01, window=2)
+        for i in range(3):
+            self.queue(500000 + i, START + i*SIReader.REC_LEN)
+        self.assertEqual([next(punches).card for i in range(3)], [500000, 500001, 500002])
+        self.queue(500002, START + 2*SIReader.REC_LEN)
+        self.queue(500000, START)
+        self.assertEqual([p.card for p in punches], [500000])
+
+    def test_recovered_and_delayed(self):
+        # A lost punch is recovered from the backup memory, and its frame then
+        # arrives late
+        for i in range(3):
+            self.emu.punch(500000 + i, T, send=i != 1)
+        punches = self.si.iter_punches(timeout=0.1, flush_latency=0.01)
+        self.assertEqual(sorted(next(punches).card for i in range(3)),
+                         [500000, 500001, 500002])
+        self.queue(500001, START + SIReader.REC_LEN)
+        self.emu.punch(500003, T)
+        self.assertEqual([p.card for p in punches], [500003])
+
+    def test_aiter_punches(self):
+        for i in range(3):
+            self.emu.punch(500000 + i, T, send=i != 1)
+        async def collect():
+            cards = []
+            async for punch in self.si.aiter_punches(flush_latency=0.01):
+                cards.append(punch.card)
+                if len(cards) == 3:
+                    break
+            return cards
+        self.assertEqual(sorted(asyncio.run(collect())), [500000, 500001, 500002])
+
+
+class TestRadioLost(unittest.TestCase):
+
+    def setUp(self):
+        self.emu = SIStationEmulator(mode=SIReader.M_CONTROL, realtime=False)
+        self.si = SIReaderRadio(serial=self.emu)
+
+    def count(self, code, offsets):
+        for offset in offsets:
+            self.si._count_lost(SIPunch(500000, code, T, START + offset*SIReader.REC_LEN, 0))
+
+    def test_lost_per_control(self):
+        for i in range(6):
+            self.emu.radio_punch(31, 500000 + i, T, send=i != 1)
+            self.emu.radio_punch(32, 600000 + i, T, send=i not in (3, 4))
+        punches = []
+        for i in range(5):
+            punches += self.si._poll_punches(0.05, 0)
+        self.assertEqual(len(punches), 9)
+        self.assertEqual(self.si.lost_punches, {31: 1, 32: 2})
+
+    def test_delayed_frame(self):
+        # The late frame of a lost punch does not restart the count
+        self.count(31, [0, 1, 4, 2, 5])
+        self.assertEqual(self.si.lost_punches, {31: 2})
+        self.assertEqual(self.si._next_offsets[31], START + 6*SIReader.REC_LEN)
+
+    def test_wrap_and_erase(self):
+        # The offsets start over after a wrap or an erase, and the gaps after
+        # that are still counted
+        self.count(31, [0x3FFE, 0x3FFF, 0, 2])
+        self.assertEqual(self.si.lost_punches, {31: 1})
+        self.count(31, [0, 1, 3])
+        self.assertEqual(self.si.lost_punches, {31: 2})
+        self.assertEqual(self.si._next_offsets[31], START + 4*SIReader.REC_LEN)
+
+    def test_restart_after_gap(self):
+        # An erase soon after a gap is not taken as the late frames of that gap
+        self.count(31, [0, 1, 4, 5, 6, 0, 2])
+        self.assertEqual(self.si.lost_punches, {31: 3})
+
+
+if __name__ == '__main__':
+    unittest.main()
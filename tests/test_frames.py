@@ -0,0 +1,148 @@
+#
+#    Copyright (C)    2026  Per Magnusson <per.magnusson@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Tests of SIFrameParser and SILegacyFrameParser.
+"""
+
+from sireader2 import SIReader, SIFrameParser, SILegacyFrameParser
+from siemulator import frame, trans_rec, legacy_frame, legacy_trans_rec
+from datetime import datetime
+import unittest
+
+T = datetime(2026, 5, 17, 10, 11, 12)
+
+
+class TestFrameParser(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = SIFrameParser()
+        self.data = [trans_rec(500000 + i, T, 0x100 + 8*i) for i in range(3)]
+        self.frames = [frame(SIReader.C_TRANS_REC, d) for d in self.data]
+
+    def test_whole(self):
+        self.parser.feed(b''.join(self.frames))
+        ret = self.parser.frames()
+        self.assertEqual([r[2] for r in ret], self.data)
+        self.assertEqual([r[3] for r in ret], self.frames)
+        self.assertEqual(ret[0][0], SIReader.C_TRANS_REC)
+        self.assertEqual(ret[0][1], 0x1F)
+        self.assertEqual(self.parser.frames(), [])
+
+    def test_split(self):
+        stream = b''.join(self.frames)
+        ret = []
+        for i in range(len(stream)):
+            self.parser.feed(stream[i:i+1])
+            ret += self.parser.frames()
+        self.assertEqual([r[2] for r in ret], self.data)
+        self.assertEqual(self.parser.crc_errors, 0)
+        self.assertEqual(self.parser.skipped, 0)
+
+    def test_wakeup_and_junk(self):
+        self.parser.feed(SIReader.WAKEUP + b'\x00\x55' + self.frames[0] + b'\x01' + self.frames[1])
+        self.assertEqual([r[2] for r in self.parser.frames()], self.data[:2])
+        self.assertEqual(self.parser.skipped, 4)
+        self.assertEqual(self.parser.crc_errors, 0)
+
+    def test_bad_crc(self):
+        bad = bytearray(self.frames[1])
+        bad[-2] ^= 0xFF
+        self.parser.feed(self.frames[0] + bytes(bad) + self.frames[2])
+        self.assertEqual([r[2] for r in self.parser.frames()], [self.data[0], self.data[2]])
+        self.assertEqual(self.parser.crc_errors, 1)
+
+    def test_missing_etx(self):
+        self.parser.feed(self.frames[0] + self.frames[1][:-1] + self.frames[2])
+        self.assertEqual([r[2] for r in self.parser.frames()], [self.data[0], self.data[2]])
+        self.assertGreaterEqual(self.parser.crc_errors, 1)
+
+    def test_stray_stx(self):
+        # An STX with a length byte pointing beyond the end of the buffer must not
+        # hold up the frame after it
+        self.parser.feed(SIReader.STX + SIReader.C_TRANS_REC + b'\xF0' + self.frames[0])
+        self.assertEqual([r[2] for r in self.parser.frames()], self.data[:1])
+        self.assertEqual(self.parser.crc_errors, 1)
+
+    def test_incomplete_kept(self):
+        self.parser.feed(self.frames[0] + self.frames[1][:7])
+        self.assertEqual([r[2] for r in self.parser.frames()], self.data[:1])
+        self.parser.feed(self.frames[1][7:])
+        self.assertEqual([r[2] for r in self.parser.frames()], self.data[1:2])
+
+    def test_max_buffer(self):
+        parser = SIFrameParser(max_buffer=64)
+        parser.feed(b'\xFF' * 100)
+        parser.feed(self.frames[0])
+        self.assertEqual([r[2] for r in parser.frames()], self.data[:1])
+        self.assertEqual(parser.skipped, 100)
+
+
+class TestLegacyFrameParser(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = SILegacyFrameParser()
+        # Offsets and times with bytes below 0x20, which are sent with DLE
+        self.data = [legacy_trans_rec(31, 3, T, 0x0210 + i) for i in range(3)]
+        self.frames = [legacy_frame(SIReader.BC_TRANS_REC2, d) for d in self.data]
+
+    def test_escaped(self):
+        for f in self.frames:
+            self.assertIn(SIReader.DLE, f)
+        self.parser.feed(b''.join(self.frames))
+        ret = self.parser.frames()
+        self.assertEqual([r[2] for r in ret], self.data)
+        self.assertEqual([r[3] for r in ret], self.frames)
+        self.assertEqual(ret[0][0], SIReader.BC_TRANS_REC2)
+        self.assertIsNone(ret[0][1])
+
+    def test_split(self):
+        # Byte by byte, so that DLE and the escaped byte arrive in separate reads
+        stream = b''.join(self.frames)
+        for i in range(len(stream)):
+            self.parser.feed(stream[i:i+1])
+        ret = self.parser.frames()
+        self.assertEqual([r[2] for r in ret], self.data)
+        self.assertEqual([r[3] for r in ret], self.frames)
+        self.assertEqual(self.parser.crc_errors, 0)
+
+    def test_split_after_dle(self):
+        stream = self.frames[0]
+        pos = stream.index(SIReader.DLE) + 1
+        self.parser.feed(stream[:pos])
+        self.assertEqual(self.parser.frames(), [])
+        self.parser.feed(stream[pos:])
+        self.assertEqual([r[2] for r in self.parser.frames()], self.data[:1])
+
+    def test_escaped_stx_etx(self):
+        data = b'\x02\x03\x10\x41'
+        self.parser.feed(legacy_frame(SIReader.BC_TRANS_REC2, data))
+        self.assertEqual([r[2] for r in self.parser.frames()], [data])
+
+    def test_cut_off(self):
+        # A frame cut off by the STX of the next one is dropped
+        self.parser.feed(SIReader.WAKEUP + self.frames[0][:4] + self.frames[1])
+        self.assertEqual([r[2] for r in self.parser.frames()], self.data[1:2])
+        self.assertEqual(self.parser.crc_errors, 1)
+
+    def test_too_long(self):
+        parser = SILegacyFrameParser(max_frame=16)
+        parser.feed(SIReader.STX + b'\x41' * 40 + SIReader.ETX + self.frames[0])
+        self.assertEqual([r[2] for r in parser.frames()], self.data[:1])
+        self.assertEqual(parser.crc_errors, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
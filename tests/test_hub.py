@@ -0,0 +1,109 @@
+#
+#    Copyright (C)    2026  Per Magnusson <per.magnusson@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Tests of the socket directory and key file checks of si_hub.py.
+"""
+
+from sireader2 import SIReader
+from siemulator import SIStationEmulator
+from unittest import mock
+import os
+import stat
+import tempfile
+import threading
+import time as systime
+import unittest
+import si_hub
+
+
+@unittest.skipIf(not hasattr(os, 'getuid'), 'Unix sockets only')
+class TestHub(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        # The shared temporary directory of the default address
+        patcher = mock.patch('tempfile.tempdir', self.tmp.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.dir = os.path.join(self.tmp.name, 'si_hub-%d' % os.getuid())
+        self.address = os.path.join(self.dir, 'si_hub.sock')
+        self.hub = None
+
+    def tearDown(self):
+        if self.hub is not None:
+            self.hub.close()
+        self.tmp.cleanup()
+
+    def serve(self):
+        self.hub = si_hub.SIHub(self.address)
+        emu = SIStationEmulator(mode=SIReader.M_CONTROL, autosend=False, realtime=False)
+        self.hub.add_reader(SIReader(serial=emu))
+        errors = []
+        def run():
+            try:
+                self.hub.serve_forever()
+            except OSError as msg:
+                errors.append(msg)
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        deadline = systime.monotonic() + 5
+        while not os.path.exists(self.address) and thread.is_alive():
+            self.assertLess(systime.monotonic(), deadline)
+            systime.sleep(0.01)
+        return errors
+
+    def test_private_dir(self):
+        self.assertEqual(self.serve(), [])
+        self.assertEqual(stat.S_IMODE(os.stat(self.dir).st_mode), 0o700)
+        self.assertEqual(stat.S_IMODE(os.stat(si_hub.key_file(self.address)).st_mode), 0o600)
+        si = si_hub.hub_station(None, address=self.address)
+        self.assertIsNotNone(si)
+        self.assertEqual(si.beep(), None)
+
+    def test_dir_of_other_users(self):
+        os.mkdir(self.dir, 0o755)
+        os.chmod(self.dir, 0o777)
+        errors = self.serve()
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0], PermissionError)
+        self.assertFalse(os.path.exists(self.address))
+
+    def test_key_readable_by_others(self):
+        os.mkdir(self.dir, 0o700)
+        name = si_hub.key_file(self.address)
+        with open(name, 'wb') as f:
+            f.write(b'key')
+        os.chmod(name, 0o644)
+        with self.assertRaises(PermissionError):
+            si_hub.read_key(self.address)
+        self.assertIsNone(si_hub.hub_station(None, address=self.address))
+        os.chmod(name, 0o600)
+        self.assertEqual(si_hub.read_key(self.address), b'key')
+
+    @unittest.skipIf(hasattr(os, 'getuid') and os.getuid() != 0, 'needs root to chown')
+    def test_key_of_other_user(self):
+        os.mkdir(self.dir, 0o755)
+        name = si_hub.key_file(self.address)
+        with open(name, 'wb') as f:
+            f.write(b'key')
+        os.chmod(name, 0o600)
+        os.chown(name, 65534, 65534)
+        with self.assertRaises(PermissionError):
+            si_hub.read_key(self.address)
+
+
+if __name__ == '__main__':
+    unittest.main()
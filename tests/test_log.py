@@ -0,0 +1,162 @@
+#
+#    Copyright (C)    2026  Per Magnusson <per.magnusson@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Tests of SIProtocolLog and SIReplaySerial.
+"""
+
+from sireader2 import SIReader, SIReaderReadout, SIReaderException, SIProtocolLog, SIReplaySerial
+from siemulator import SIStationEmulator, course
+from itertools import chain
+import tempfile
+import time as systime
+import os
+import unittest
+
+
+class TestProtocolLog(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp(suffix='.silog')
+        os.close(fd)
+
+    def tearDown(self):
+        os.unlink(self.filename)
+
+    def records(self):
+        with open(self.filename, 'rb') as f:
+            return list(SIProtocolLog.iter_records(f.read()))
+
+    def test_records(self):
+        for sync in (SIProtocolLog.SYNC_FRAME, SIProtocolLog.SYNC_GROUP, SIProtocolLog.SYNC_CLOSE):
+            log = SIProtocolLog(self.filename, sync=sync)
+            log.write(SIProtocolLog.SENT, b'\x02\xf7\x00\xf7\x00\x03')
+            log.write(SIProtocolLog.RECEIVED, bytearray(b'\x02\xf7\x01\x00'))
+            log.close()
+        records = self.records()
+        self.assertEqual([r[1] for r in records], [SIProtocolLog.OPENED, SIProtocolLog.SENT,
+                                                   SIProtocolLog.RECEIVED] * 3)
+        self.assertEqual(records[1][2], b'\x02\xf7\x00\xf7\x00\x03')
+        self.assertEqual(records[2][2], b'\x02\xf7\x01\x00')
+        self.assertAlmostEqual(records[0][2], systime.time(), delta=60)
+        stamps = [r[0] for r in records[:3]]
+        self.assertEqual(stamps, sorted(stamps))
+
+    def test_group_sync(self):
+        # Written to the file within group_ms, without closing the log
+        log = SIProtocolLog(self.filename, sync=SIProtocolLog.SYNC_GROUP, group_ms=10)
+        log.write(SIProtocolLog.SENT, b'\x02\x03')
+        deadline = systime.monotonic() + 5
+        while len(self.records()) < 2:
+            self.assertLess(systime.monotonic(), deadline)
+            systime.sleep(0.01)
+        log.close()
+
+    def test_truncated(self):
+        log = SIProtocolLog(self.filename)
+        log.write(SIProtocolLog.RECEIVED, b'\x02\x01\x02\x03')
+        log.close()
+        with open(self.filename, 'rb') as f:
+            buf = f.read()
+        self.assertEqual(len(list(SIProtocolLog.iter_records(buf))), 2)
+        self.assertEqual(len(list(SIProtocolLog.iter_records(buf[:-1]))), 1)
+
+    def test_sync_mode(self):
+        with self.assertRaises(SIReaderException):
+            SIProtocolLog(self.filename, sync='never')
+
+
+class TestReplay(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp(suffix='.silog')
+        os.close(fd)
+
+    def tearDown(self):
+        os.unlink(self.filename)
+
+    def read_card(self, si):
+        deadline = systime.monotonic() + 5
+        while not si.poll_sicard():
+            self.assertLess(systime.monotonic(), deadline)
+            systime.sleep(0.001)
+        return si.read_sicard()
+
+    def record(self, cardnr):
+        """Record a session reading a card.
+        @return: the card data
+        """
+        emu = SIStationEmulator(mode=SIReader.M_READOUT)
+        si = SIReaderReadout(serial=emu, logfile=self.filename)
+        emu.insert_card('SI10', cardnr, course(12))
+        data = self.read_card(si)
+        si._logfile.close()
+        return data
+
+    def test_replay(self):
+        card = self.record(8123456)
+        with open(self.filename, 'rb') as f:
+            ser = SIReplaySerial(SIProtocolLog.iter_records(f.read()))
+        si = SIReaderReadout(serial=ser)
+        self.assertEqual(self.read_card(si), card)
+        self.assertEqual(ser.mismatches, 0)
+        self.assertTrue(ser.done)
+        self.assertIsNone(ser.next_session)
+
+    def test_reply_after_command(self):
+        # The replies are not played back before the command is written
+        self.record(8123456)
+        with open(self.filename, 'rb') as f:
+            ser = SIReplaySerial(SIProtocolLog.iter_records(f.read()))
+        self.assertEqual(ser.inWaiting(), 0)
+        command = ser.pending_writes()[0]
+        ser.write(command)
+        self.assertGreater(ser.inWaiting(), 0)
+        self.assertEqual(ser.mismatches, 0)
+
+    def test_wakeup_ignored(self):
+        # WAKEUP is sent or not depending on the time since the last reply
+        command = b'\x02\xf9\x01\x01\x00\x00\x03'
+        reply = b'\x02\xf9\x03\x00\x1f\x01\x00\x00\x03'
+        ser = SIReplaySerial(iter([(0.0, SIProtocolLog.SENT, SIReader.WAKEUP + command),
+                                   (0.1, SIProtocolLog.RECEIVED, reply),
+                                   (0.2, SIProtocolLog.SENT, command),
+                                   (0.3, SIProtocolLog.RECEIVED, reply),
+                                   (0.4, SIProtocolLog.SENT, command),
+                                   (0.5, SIProtocolLog.RECEIVED, reply)]))
+        for data in (command, SIReader.WAKEUP + command, command[:-1] + b'\x04'):
+            ser.write(data)
+            self.assertEqual(ser.read(len(reply)), reply)
+        self.assertEqual(ser.mismatches, 1)
+        self.assertTrue(ser.done)
+
+    def test_sessions(self):
+        cards = [self.record(8123456), self.record(8123457)]
+        with open(self.filename, 'rb') as f:
+            records = SIProtocolLog.iter_records(f.read())
+        replayed = []
+        while records is not None:
+            ser = SIReplaySerial(records)
+            replayed.append(self.read_card(SIReaderReadout(serial=ser)))
+            self.assertTrue(ser.done)
+            if ser.next_session is None:
+                records = None
+            else:
+                records = chain([ser.next_session], records)
+        self.assertEqual(replayed, cards)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,292 @@
+#
+#    Copyright (C)    2026  Per Magnusson <per.magnusson@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Tests of the clock functions of SIReader: set_time(), measure_time_offset(),
+sync_time() and sync_time_all(), and of status_snapshot() and SIStationStatus.
+"""
+
+from sireader2 import SIReader, SIReaderTimeout, SIStationStatus
+from siemulator import SIStationEmulator
+from datetime import datetime, timedelta
+from unittest import mock
+import siemulator
+import sireader2.reader
+import threading
+import unittest
+
+
+class VirtualClock(object):
+    """Clock of the computer and the emulated stations that only advances with
+    the link delays, so that the tests do not depend on how the threads are
+    scheduled. Each thread has a time of its own."""
+
+    START = datetime(2026, 5, 20, 12, 0, 0, 123456)
+
+    def __init__(self):
+        self._local = threading.local()
+        clock = self
+        class VirtualDatetime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return clock.START + timedelta(seconds=clock.monotonic())
+        self.datetime = VirtualDatetime
+
+    def monotonic(self):
+        return getattr(self._local, 'elapsed', 0.0)
+
+    def advance(self, seconds):
+        self._local.elapsed = self.monotonic() + seconds
+
+
+class DelayLink(object):
+    """Serial link in front of an emulated station with a transfer delay in
+    each direction. The delays are (to station, from station) in seconds, 
+    either the same for all commands or taken from a list, one per command."""
+
+    def __init__(self, emu, clock, delay=(0, 0)):
+        self._emu = emu
+        self._clock = clock
+        self.delay = delay
+        self.dead = False      # Lose all commands
+        self.writes = []
+        self.threads = set()
+
+    def write(self, data):
+        self.writes.append(bytes(data))
+        self.threads.add(threading.current_thread())
+        if self.dead:
+            return len(data)
+        up, down = self.delay.pop(0) if isinstance(self.delay, list) else self.delay
+        self._clock.advance(up)
+        ret = self._emu.write(data)
+        self._clock.advance(down)
+        return ret
+
+    def __getattr__(self, name):
+        return getattr(self._emu, name)
+
+
+class ClockTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = VirtualClock()
+        for patch in (mock.patch.object(sireader2.reader, 'datetime', self.clock.datetime),
+                      mock.patch.object(sireader2.reader, 'monotonic', self.clock.monotonic),
+                      mock.patch.object(siemulator, 'datetime', self.clock.datetime)):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def connect(self, delay=(0, 0), clock_offset=0):
+        """SIReader on a station with the given link delay and the station's 
+        clock clock_offset seconds ahead of the computer's."""
+        emu = SIStationEmulator(mode=SIReader.M_CONTROL, autosend=False, realtime=False)
+        link = DelayLink(emu, self.clock)
+        si = SIReader(serial=link)
+        link.delay = delay
+        emu.clock_offset = timedelta(seconds=clock_offset)
+        emu.timeout = 0.1
+        return si, link, emu
+
+    def station_offset(self, emu):
+        """The actual offset of the station's clock."""
+        return emu._now() - self.clock.datetime.now()
+
+    def assertNear(self, offset, expected, ticks=1):
+        self.assertLessEqual(abs(offset - expected), ticks * SIReader.TIME_TICK,
+                             '%s is not within %g ticks of %s' % (offset, ticks, expected))
+
+
+class TestSetTime(ClockTestCase):
+
+    def setUp(self):
+        ClockTestCase.setUp(self)
+        self.si, self.link, self.emu = self.connect()
+
+    def set_time(self, t):
+        """The parameters of the C_SET_TIME sent for t."""
+        del self.link.writes[:]
+        self.si.set_time(t)
+        frame = self.link.writes[-1].lstrip(SIReader.WAKEUP)
+        self.assertEqual(frame[1:2], SIReader.C_SET_TIME)
+        return list(frame[3:3+frame[2]])
+
+    def test_fraction(self):
+        # Wednesday 17:30:05.5 is 5:30:05 PM, 128/256 s
+        self.assertEqual(self.set_time(datetime(2026, 5, 20, 17, 30, 5, 500000)),
+                         [26, 5, 20, (3 << 1) + 1, 0x4d, 0x5d, 128])
+
+    def test_rounded_to_next_second(self):
+        # 255.9/256 s rounds to tss == 256, which is 0 in the next second
+        self.assertEqual(self.set_time(datetime(2026, 5, 20, 17, 30, 5, 999700)),
+                         [26, 5, 20, (3 << 1) + 1, 0x4d, 0x5e, 0])
+
+    def test_rounded_to_next_year(self):
+        # The rounding carries into the date and the day of the week (Friday)
+        self.assertEqual(self.set_time(datetime(2026, 12, 31, 23, 59, 59, 999999)),
+                         [27, 1, 1, (5 << 1) + 0, 0, 0, 0])
+        self.assertEqual(self.emu._now(), datetime(2027, 1, 1))
+
+
+class TestTimeSync(ClockTestCase):
+
+    DELAY = 0.05
+
+    def test_measure_offset(self):
+        si, link, emu = self.connect((self.DELAY, self.DELAY), -7.3)
+        offset, rtt = si.measure_time_offset(3)
+        self.assertAlmostEqual(rtt, 2 * self.DELAY)
+        self.assertNear(offset, timedelta(seconds=-7.3))
+
+    def test_smallest_rtt_chosen(self):
+        # Only the symmetric probe gives the right offset, the others are off by 0.1 s
+        si, link, emu = self.connect([(0, 0.2), (0.03, 0.03), (0.2, 0)], 3.0)
+        offset, rtt = si.measure_time_offset(3)
+        self.assertAlmostEqual(rtt, 0.06)
+        self.assertNear(offset, timedelta(seconds=3.0))
+
+    def test_sync_time(self):
+        si, link, emu = self.connect((self.DELAY, self.DELAY), 12.5)
+        offset, rtt = si.sync_time()
+        self.assertLessEqual(abs(offset), SIReader.TIME_TICK)
+        self.assertAlmostEqual(rtt, 2 * self.DELAY)
+        self.assertNear(self.station_offset(emu), timedelta(0))
+
+    def test_clock_phases(self):
+        # The station truncates its time to whole ticks, which must not make 
+        # the second round overshoot
+        for i in range(64):
+            with self.subTest(i=i):
+                self.clock.START = VirtualClock.START + timedelta(microseconds=i * 7919)
+                delay = 0.01 + i * 0.00137
+                si, link, emu = self.connect((delay, delay), i * 1.337)
+                offset, rtt = si.sync_time()
+                self.assertLessEqual(abs(offset), SIReader.TIME_TICK)
+                self.assertNear(self.station_offset(emu), timedelta(0))
+
+    def test_compensated_in_first_round(self):
+        # Without the compensation the station would be DELAY behind
+        si, link, emu = self.connect((self.DELAY, self.DELAY), -0.7)
+        si.sync_time(rounds=1)
+        self.assertNear(self.station_offset(emu), timedelta(0))
+
+    def test_residual_corrected(self):
+        # C_SET_TIME takes 0.02 s longer to reach the station than C_GET_TIME,
+        # so the first round leaves the station 0.02 s behind
+        probes = [(self.DELAY, self.DELAY)] * 5
+        delay = probes + ([(self.DELAY + 0.02, self.DELAY - 0.02)] + probes) * 2
+        si, link, emu = self.connect(list(delay), 1.0)
+        offset, rtt = si.sync_time(rounds=1)
+        self.assertNear(offset, timedelta(seconds=-0.02))
+        si, link, emu = self.connect(list(delay), 1.0)
+        offset, rtt = si.sync_time(rounds=2)
+        self.assertLessEqual(abs(offset), SIReader.TIME_TICK)
+        self.assertNear(self.station_offset(emu), timedelta(0))
+
+    def test_sync_time_all(self):
+        readers = [self.connect((self.DELAY, self.DELAY), offset) for offset in (-30, 0.4, 3600)]
+        readers[1][1].dead = True
+        results = SIReader.sync_time_all([r[0] for r in readers])
+        self.assertIsInstance(results[1], SIReaderTimeout)
+        for ii in (0, 2):
+            si, link, emu = readers[ii]
+            offset, rtt = results[ii]
+            self.assertLessEqual(abs(offset), SIReader.TIME_TICK)
+            self.assertNear(self.station_offset(emu), timedelta(0))
+        # One thread per reader
+        threads = [r[1].threads - {threading.current_thread()} for r in readers]
+        self.assertEqual(len(set.union(*threads)), 3)
+
+
+class TestStatusSnapshot(ClockTestCase):
+
+    def test_offset_compensated(self):
+        si, link, emu = self.connect((0.04, 0.04), 2.5)
+        status = si.status_snapshot()
+        self.assertAlmostEqual(status.rtt, 0.08)
+        # The station read its clock halfway through the round trip
+        self.assertNear(status.time - VirtualClock.START, timedelta(seconds=0.04), 0.01)
+        self.assertNear(status.station_time - status.time, timedelta(seconds=2.5))
+        self.assertNear(status.clock_offset, timedelta(seconds=2.5), 0.5)
+
+    def test_clock_phases(self):
+        for i in range(64):
+            with self.subTest(i=i):
+                si, link, emu = self.connect((0.01 + i * 0.00137,) * 2, i * 0.1234)
+                status = si.status_snapshot()
+                self.assertNear(status.clock_offset, timedelta(seconds=i * 0.1234), 0.5)
+
+    def test_sysval(self):
+        si, link, emu = self.connect()
+        status = si.status_snapshot()
+        self.assertEqual((status.serno, status.code, status.mode, status.fwver, status.mem_size),
+                         (123456, 31, 'Control', '656', 128))
+        self.assertEqual(status.backup_end, SIStationEmulator.BACKUP_START)
+
+    def test_csv_row(self):
+        si, link, emu = self.connect((0.04, 0.04), -3.0)
+        row = dict(zip(SIStationStatus.CSV_HEADER, si.status_snapshot().csv_row()))
+        self.assertEqual(len(row), len(SIStationStatus.CSV_HEADER))
+        self.assertEqual(row['Date'], '2026-05-20')
+        self.assertEqual(row['Time'], '12:00:00')
+        self.assertEqual(row['SerialNo'], 123456)
+        self.assertEqual(row['CodeNo'], 31)
+        self.assertRegex(row['TimeDiff'], r'^-0:00:0[23]\.\d{3}$')
+        self.assertEqual(row['Autosend'], '-')
+
+
+class TestCsvRow(unittest.TestCase):
+
+    STATUS = SIStationStatus(datetime(2026, 5, 20, 9, 5, 7, 900000), 
+                             datetime(2026, 5, 20, 9, 5, 9, 400000), timedelta(seconds=1.5),
+                             0.02, 123456, 'BSM8-USB/SRR', '656', '2019-03-14', '2022-06-01',
+                             1399.96, 12.34, 3.349, 128, 31, 'Control', 240, 0b101, False, 
+                             0b101, 0x100)
+
+    def row(self, **kwargs):
+        return dict(zip(SIStationStatus.CSV_HEADER, self.STATUS._replace(**kwargs).csv_row()))
+
+    def test_columns(self):
+        self.assertEqual(self.row(), {
+            'Date': '2026-05-20', 'Time': '09:05:07', 'SerialNo': 123456,
+            'Hardware': 'BSM8-USB/SRR', 'Software': '656', 'BatteryDate': '2022-06-01',
+            'BattUsage': '12.3 %', 'Voltage': '3.35', 'CodeNo': 31, 'Mode': 'Control',
+            'TimeDiff': '0:00:01.500', 'OpTime': '04:00:00', 'Autosend': '-',
+            'LegacyProtocol': '-', 'Card6with192punches': '-', 
+            'AcousticSignal': 'AcousticSignal', 'OpticalSignal1': 'OpticalSignal1',
+            'ProductionDate': '2019-03-14', 'MemorySize': '128 K', 'BatteryCapacity': '1400'})
+
+    def test_time_diff(self):
+        for offset, text in ((timedelta(0), '0:00:00.000'),
+                             (timedelta(seconds=5), '0:00:05.000'),
+                             (timedelta(seconds=5, microseconds=123999), '0:00:05.123'),
+                             (timedelta(microseconds=-1500), '-0:00:00.001'),
+                             (timedelta(seconds=-3600), '-1:00:00.000'),
+                             (timedelta(days=1, seconds=2), '1 day, 0:00:02.000'),
+                             (None, '-')):
+            with self.subTest(offset=offset):
+                self.assertEqual(self.row(clock_offset=offset)['TimeDiff'], text)
+
+    def test_flags(self):
+        row = self.row(protocol=0b010, si6_192=True, feedback=0, active_time=90)
+        self.assertEqual((row['Autosend'], row['LegacyProtocol'], row['Card6with192punches'],
+                          row['AcousticSignal'], row['OpticalSignal1'], row['OpTime']),
+                         ('Autosend', 'LegacyProtocol!', 'Card6With192Records!', '', '', 
+                          '01:30:00'))
+        self.assertEqual(self.row(si6_192=0x55)['Card6with192punches'], '0x55')
+
+
+if __name__ == '__main__':
+    unittest.main()
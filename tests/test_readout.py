@@ -0,0 +1,190 @@
+#
+#    Copyright (C)    2026  Per Magnusson <per.magnusson@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Tests of partial card readout and of SICardCache and its use by SIReaderReadout.
+"""
+
+from sireader2 import SIReader, SIReaderReadout, SICardCache
+from siemulator import SIStationEmulator, course
+from unittest import mock
+import time as systime
+import unittest
+
+
+def header(card_type, punch_count):
+    """The header block of a card with punch_count in the punch counter."""
+    data = bytearray(SIReader.CARD_BLOCK_SIZE)
+    data[SIReader.CARD[card_type]['RC']] = punch_count
+    return bytes(data)
+
+
+class TestCardBlocksNeeded(unittest.TestCase):
+
+    def check(self, card_type, counts):
+        """counts: {punch count: number of blocks}"""
+        for count, blocks in counts.items():
+            self.assertEqual(SIReader._card_blocks_needed(header(card_type, count), card_type),
+                             blocks, '%s with %d punches' % (card_type, count))
+
+    def test_si6(self):
+        self.check('SI6', {0: 1, 1: 2, 32: 2, 33: 3, 64: 3, 200: 3})
+
+    def test_si8(self):
+        self.check('SI8', {0: 1, 1: 2, 50: 2, 200: 2})
+
+    def test_si9(self):
+        self.check('SI9', {0: 1, 1: 1, 18: 1, 19: 2, 50: 2, 200: 2})
+
+    def test_pcard(self):
+        self.check('pCard', {0: 1, 1: 2, 20: 2, 200: 2})
+
+    def test_si10(self):
+        self.check('SI10', {0: 1, 1: 2, 32: 2, 33: 3, 64: 3, 200: 3})
+
+
+class TestPartialReadout(unittest.TestCase):
+
+    CARDS = {'SI6': 600000, 'SI8': 2100000, 'SI9': 1100000, 'pCard': 4100000, 'SI10': 8100000}
+
+    def setUp(self):
+        self.emu = SIStationEmulator(mode=SIReader.M_READOUT, realtime=False)
+        self.si = SIReaderReadout(serial=self.emu)
+
+    def read(self, card_type, punches, partial):
+        self.emu.insert_card(card_type, TestPartialReadout.CARDS[card_type], punches)
+        while not self.si.poll_sicard():
+            systime.sleep(0.001)
+        commands = self.emu.commands
+        data = self.si.read_sicard(partial=partial)
+        commands = self.emu.commands - commands
+        self.emu.remove_card()
+        self.si.poll_sicard()
+        return commands, data
+
+    def test_same_as_full(self):
+        for card_type in TestPartialReadout.CARDS:
+            card = SIReader.CARD[card_type]
+            # Punches that fit in the blocks of the card
+            size = SIReader.CARD_BLOCK_SIZE * len(SIReader.CARD_BLOCKS[card_type])
+            most = min(card['PM'], (size - card['P1']) // card['PL'])
+            for count in sorted({0, 1, 18, 19, 32, 33, most}):
+                if count > most:
+                    continue
+                punches = course(count)
+                full = self.read(card_type, punches, False)[1]
+                partial = self.read(card_type, punches, True)[1]
+                self.assertEqual(partial, full, '%s with %d punches' % (card_type, count))
+                self.assertEqual(len(partial['punches']), count)
+
+    def test_fewer_blocks(self):
+        commands, data = self.read('SI10', course(5), True)
+        self.assertEqual(commands, 2)
+        self.assertEqual(len(data['punches']), 5)
+
+
+class TestCardCache(unittest.TestCase):
+
+    def test_evict_least_recently_used(self):
+        cache = SICardCache(size=2)
+        cache.put('a', b'A')
+        cache.put('b', b'B')
+        self.assertEqual(cache.get('a'), b'A')
+        cache.put('c', b'C')
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), b'A')
+        self.assertEqual(cache.get('c'), b'C')
+
+    def test_put_again(self):
+        cache = SICardCache(size=2)
+        cache.put('a', b'A')
+        cache.put('b', b'B')
+        cache.put('a', b'AA')
+        cache.put('c', b'C')
+        self.assertEqual(cache.get('a'), b'AA')
+        self.assertIsNone(cache.get('b'))
+
+    def test_max_age(self):
+        cache = SICardCache(size=4, max_age=10)
+        with mock.patch('sireader2.readout.monotonic', return_value=1000.0):
+            cache.put('a', b'A')
+        with mock.patch('sireader2.readout.monotonic', return_value=1009.0):
+            self.assertEqual(cache.get('a'), b'A')
+            cache.put('b', b'B')
+        with mock.patch('sireader2.readout.monotonic', return_value=1011.0):
+            self.assertIsNone(cache.get('a'))
+            self.assertEqual(cache.get('b'), b'B')
+        self.assertEqual(len(cache), 1)
+
+    def test_clear(self):
+        cache = SICardCache()
+        cache.put('a', b'A')
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertIsNone(cache.get('a'))
+
+
+class TestReadoutCache(unittest.TestCase):
+
+    def setUp(self):
+        self.emu = SIStationEmulator(mode=SIReader.M_READOUT, realtime=False)
+        self.si = SIReaderReadout(serial=self.emu, card_cache=1)
+        self.commands = []
+        send_command = self.si._send_command
+        def counting(command, parameters, *args, **kwargs):
+            self.commands.append(command)
+            return send_command(command, parameters, *args, **kwargs)
+        self.si._send_command = counting
+
+    def read(self, card_type, cardnr, punches):
+        """Insert a card and read it.
+        @return: (number of commands, card data)
+        """
+        self.emu.insert_card(card_type, cardnr, punches)
+        while not self.si.poll_sicard():
+            systime.sleep(0.001)
+        n = len(self.commands)
+        data = self.si.read_sicard()
+        self.emu.remove_card()
+        self.si.poll_sicard()
+        return len(self.commands) - n, data
+
+    def test_reinserted(self):
+        punches = course(10)
+        n, first = self.read('SI8', 2100000, punches)
+        self.assertGreater(n, 1)
+        n, again = self.read('SI8', 2100000, punches)
+        self.assertEqual(n, 1)
+        self.assertEqual(again['punches'], first['punches'])
+
+    def test_changed(self):
+        punches = course(10)
+        self.read('SI8', 2100000, punches[:5])
+        n, data = self.read('SI8', 2100000, punches)
+        self.assertGreater(n, 1)
+        self.assertEqual(len(data['punches']), 10)
+
+    def test_evicted(self):
+        punches = course(10)
+        self.read('SI8', 2100000, punches)
+        self.read('SI8', 2100001, punches)
+        n, data = self.read('SI8', 2100000, punches)
+        self.assertGreater(n, 1)
+        self.assertEqual(data['card_number'], 2100000)
+
+
+if __name__ == '__main__':
+    unittest.main()
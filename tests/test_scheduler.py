@@ -0,0 +1,112 @@
+#
+#    Copyright (C)    2026  Per Magnusson <per.magnusson@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Tests of SICommandScheduler.
+"""
+
+from sireader2 import SIReader, SIReaderException, SICommandScheduler
+from siemulator import SIStationEmulator
+from datetime import datetime
+import time as systime
+import threading
+import unittest
+
+
+class TestScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.emu = SIStationEmulator(mode=SIReader.M_CONTROL, autosend=False, realtime=False)
+        self.si = SIReader(serial=self.emu, scheduler=True)
+        self.scheduler = self.si._scheduler
+        self.threads = []
+
+    def tearDown(self):
+        self.si.disconnect()
+
+    def hold(self):
+        """Keep the scheduler busy until the returned event is set."""
+        started = threading.Event()
+        release = threading.Event()
+        def busy():
+            started.set()
+            release.wait()
+        self.start(self.scheduler.call, SICommandScheduler.PRIO_HIGH, busy)
+        self.assertTrue(started.wait(5))
+        return release
+
+    def start(self, fn, *args):
+        thread = threading.Thread(target=fn, args=args)
+        thread.start()
+        self.threads.append(thread)
+
+    def wait_queued(self, count):
+        """Wait until count requests are queued while the scheduler is busy."""
+        deadline = systime.monotonic() + 5
+        while self.scheduler._requests.qsize() != count:
+            self.assertLess(systime.monotonic(), deadline)
+            systime.sleep(0.001)
+
+    def join(self):
+        for thread in self.threads:
+            thread.join(5)
+            self.assertFalse(thread.is_alive())
+
+    def test_priority_order(self):
+        order = []
+        release = self.hold()
+        requests = [(SICommandScheduler.PRIO_BULK, 'bulk 1'),
+                    (SICommandScheduler.PRIO_NORMAL, 'normal 1'),
+                    (SICommandScheduler.PRIO_BULK, 'bulk 2'),
+                    (SICommandScheduler.PRIO_HIGH, 'high'),
+                    (SICommandScheduler.PRIO_NORMAL, 'normal 2')]
+        for i, (priority, name) in enumerate(requests):
+            self.start(self.scheduler.call, priority, order.append, name)
+            self.wait_queued(i + 1)
+        release.set()
+        self.join()
+        self.assertEqual(order, ['high', 'normal 1', 'normal 2', 'bulk 1', 'bulk 2'])
+
+    def test_backup_read_is_bulk(self):
+        commands = []
+        handle = self.emu._handle
+        def recording(command, parameters):
+            commands.append(command)
+            return handle(command, parameters)
+        self.emu._handle = recording
+        release = self.hold()
+        self.start(self.si._send_command, SIReader.C_GET_BACKUP, b'\x00\x01\x00\x08')
+        self.wait_queued(1)
+        self.start(self.si.get_time)
+        self.wait_queued(2)
+        release.set()
+        self.join()
+        self.assertEqual(commands, [SIReader.C_GET_TIME, SIReader.C_GET_BACKUP])
+
+    def test_exception(self):
+        def fail():
+            raise SIReaderException('failed')
+        with self.assertRaises(SIReaderException):
+            self.scheduler.call(SICommandScheduler.PRIO_NORMAL, fail)
+        self.assertIsInstance(self.si.get_time(), datetime)
+
+    def test_stop(self):
+        self.scheduler.stop()
+        with self.assertRaises(SIReaderException):
+            self.scheduler.call(SICommandScheduler.PRIO_NORMAL, int)
+
+
+if __name__ == '__main__':
+    unittest.main()
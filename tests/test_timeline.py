@@ -0,0 +1,134 @@
+#
+#    Copyright (C)    2026  Per Magnusson <per.magnusson@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Tests of SIBackupMerger.
+"""
+
+from sireader2 import SIReader, SIReaderException, SIBackupMerger, SIBackupPunch
+from siemulator import SIStationEmulator
+from datetime import datetime, timedelta
+import os
+import tempfile
+import unittest
+
+START = datetime(2026, 5, 17, 10, 0)
+
+
+def at(minutes):
+    return START + timedelta(minutes=minutes)
+
+
+def backup(minutes, card=500000):
+    """Backup data like read_backup() returns, a punch at each of the given minutes."""
+    return [(at(m), card + i, '') for i, m in enumerate(minutes)]
+
+
+class TestBackupMerger(unittest.TestCase):
+
+    def merge(self, *backups, **kwargs):
+        merger = SIBackupMerger(**kwargs)
+        for code, data in backups:
+            merger.add_backup(data, code, 100000 + code)
+        return merger, list(merger)
+
+    def test_time_order(self):
+        merger, punches = self.merge((31, backup([0, 2, 4, 6])), (32, backup([1, 3, 5], 600000)),
+                                     (33, []))
+        self.assertEqual([p.time for p in punches], [at(m) for m in range(7)])
+        self.assertEqual(punches[1], SIBackupPunch(600000, 32, at(1), 100032, ''))
+        self.assertEqual(merger.errors, {})
+        self.assertEqual(merger.out_of_order, {})
+
+    def test_equal_times(self):
+        # Records with the same time keep the order of the backup memory
+        merger, punches = self.merge((31, backup([0, 1, 1, 1, 2])))
+        self.assertEqual([p.card for p in punches], [500000 + i for i in range(5)])
+
+    def test_reordered(self):
+        merger, punches = self.merge((31, backup([0, 2, 1, 3])), (32, backup([1.5], 600000)))
+        self.assertEqual([p.time for p in punches], [at(m) for m in (0, 1, 1.5, 2, 3)])
+        self.assertEqual(merger.out_of_order, {})
+
+    def test_out_of_order(self):
+        # The clock of the station was set back further than can be reordered
+        merger, punches = self.merge((31, backup([10, 11, 12, 0, 13])), (32, backup([5], 600000)),
+                                     reorder=2)
+        self.assertEqual([p.card for p in punches if p.code == 31],
+                         [500000 + i for i in range(5)])
+        self.assertEqual(merger.out_of_order, {(31, 100031): 1})
+        self.assertEqual(punches[0].card, 600000)
+
+    def test_error_record(self):
+        data = backup([0, 2, 4])
+        data.insert(2, (START.replace(hour=0, minute=0), 500099, 'Err3'))
+        data.insert(0, (START.replace(hour=0, minute=0), 500098, 'ErrDate'))
+        merger, punches = self.merge((31, data), (32, backup([1, 3], 600000)))
+        self.assertEqual([p.card for p in punches],
+                         [500098, 500000, 600000, 500001, 500099, 600001, 500002])
+        self.assertEqual(punches[4].error, 'Err3')
+        self.assertEqual(merger.errors, {(31, 100031): 2})
+
+    def test_no_reorder(self):
+        merger, punches = self.merge((31, backup([0, 2, 1, 3])), reorder=0)
+        self.assertEqual([p.card for p in punches], [500000 + i for i in range(4)])
+        self.assertEqual(merger.out_of_order, {(31, 100031): 1})
+
+    def test_consumed(self):
+        merger = SIBackupMerger()
+        merger.add_backup(backup([0, 1]), 31)
+        self.assertEqual(len(list(merger)), 2)
+        self.assertEqual(list(merger), [])
+
+
+class TestBackupMergerCsv(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        emu = SIStationEmulator(mode=SIReader.M_CONTROL, autosend=False, realtime=False)
+        self.si = SIReader(serial=emu)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write(self, data, code, serno):
+        return self.si.write_backup_csv(data, code=code, serno=serno, mode='Control',
+                                        filename=os.path.join(self.dir.name, '%d.csv' % code),
+                                        readtime=at(600))
+
+    def test_csv(self):
+        data = backup([0, 2, 4])
+        data.append((START.replace(hour=0, minute=0), 500099, 'Err3'))
+        merger = SIBackupMerger()
+        merger.add_csv(self.write(data, 31, 100031), serno=100031)
+        merger.add_backup(backup([1, 3], 600000), 32, 100032)
+        punches = list(merger)
+        self.assertEqual([p.card for p in punches],
+                         [500000, 600000, 500001, 600001, 500002, 500099])
+        self.assertEqual(punches[0], SIBackupPunch(500000, 31, at(0), 100031, ''))
+        self.assertEqual(punches[-1].error, 'Err3')
+
+    def test_csv_invalid(self):
+        filename = self.write(backup([0]), 31, 100031)
+        with open(filename, 'a') as f:
+            f.write('x;y;z\n')
+        merger = SIBackupMerger()
+        merger.add_csv(filename)
+        with self.assertRaises(SIReaderException):
+            list(merger)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,199 @@
+#
+#    Copyright (C)    2026  Per Magnusson <per.magnusson@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Tests of SITransport: the layers used on their own, WAKEUP, direct and remote
+mode and adaptive reply timeouts.
+"""
+
+from sireader2 import SIReader, SIReaderTimeout, SITransport, SIBackup
+from siemulator import SIStationEmulator
+from datetime import datetime
+import time as systime
+import unittest
+
+DIRECT = (True, SIReader.C_GET_TIME)
+REMOTE = (False, SIReader.C_GET_TIME)
+
+
+class TestLayers(unittest.TestCase):
+
+    def test_transport(self):
+        emu = SIStationEmulator(mode=SIReader.M_CONTROL, autosend=False, realtime=False)
+        si = SITransport(serial=emu)
+        self.assertEqual(si._send_command(SITransport.C_BEEP, b'\x01')[0], SITransport.C_BEEP)
+
+    def test_backup(self):
+        emu = SIStationEmulator(mode=SIReader.M_CONTROL, autosend=False, realtime=False)
+        emu.punch(500000)
+        si = SIBackup(serial=emu)
+        self.assertEqual([r[1] for r in si.read_backup()], [500000])
+
+
+class TestWakeup(unittest.TestCase):
+
+    def setUp(self):
+        self.emu = SIStationEmulator(mode=SIReader.M_CONTROL, autosend=False, realtime=False)
+        self.si = SIReader(serial=self.emu)
+        self.writes = []
+        write = self.emu.write
+        def recording(data):
+            self.writes.append(bytes(data))
+            return write(data)
+        self.emu.write = recording
+
+    def commands(self):
+        """The commands written, with True for a leading WAKEUP."""
+        return [(w.startswith(SIReader.WAKEUP), w.lstrip(SIReader.WAKEUP)[1:2])
+                for w in self.writes]
+
+    def test_elided_when_awake(self):
+        self.si.beep()
+        self.si.get_time()
+        self.assertEqual(self.commands(), [(False, SIReader.C_BEEP), (False, SIReader.C_GET_TIME)])
+
+    def test_after_idle(self):
+        self.si._last_reply -= SIReader.WAKEUP_IDLE
+        self.si.beep()
+        self.assertEqual(self.commands(), [(True, SIReader.C_BEEP)])
+
+    def test_after_failure(self):
+        self.si._last_reply = None
+        self.si.beep()
+        self.si.beep()
+        self.assertEqual(self.commands(), [(True, SIReader.C_BEEP), (False, SIReader.C_BEEP)])
+
+    def test_after_set_remote(self):
+        # The remote station may be asleep even if the direct one just replied
+        self.si.set_remote()
+        self.si.beep()
+        self.si.set_direct()
+        self.si.beep()
+        self.assertEqual(self.commands(), [(False, SIReader.C_SET_MS), (True, SIReader.C_BEEP),
+                                           (False, SIReader.C_SET_MS), (True, SIReader.C_BEEP)])
+
+    def test_set_ms_skipped(self):
+        self.si.set_direct()
+        self.assertEqual(self.writes, [])
+        self.si.set_direct(force=True)
+        self.si.set_remote()
+        self.si.set_remote()
+        self.assertEqual([c[1] for c in self.commands()], [SIReader.C_SET_MS, SIReader.C_SET_MS])
+        self.assertFalse(self.si.direct)
+        self.assertFalse(self.emu.direct)
+
+    def test_set_ms_unknown_after_failure(self):
+        self.si._direct_known = False
+        self.si.set_direct()
+        self.assertEqual([c[1] for c in self.commands()], [SIReader.C_SET_MS])
+
+
+class TestAdaptiveTimeout(unittest.TestCase):
+
+    def setUp(self):
+        self.emu = SIStationEmulator(mode=SIReader.M_CONTROL, autosend=False, realtime=False)
+        self.si = SIReader(serial=self.emu, adaptive_timeout=True)
+        self.si._rtt_estimates.clear()
+
+    def test_not_measured(self):
+        self.assertIsNone(self.si._command_timeout(DIRECT))
+
+    def test_first_measurement(self):
+        self.si._update_rtt(REMOTE, 0.2)
+        # srtt + 4*rttvar with rttvar = rtt/2
+        self.assertAlmostEqual(self.si._command_timeout(REMOTE), 0.6)
+        self.assertIsNone(self.si._command_timeout(DIRECT))
+
+    def test_smoothing(self):
+        self.si._update_rtt(REMOTE, 0.2)
+        self.si._update_rtt(REMOTE, 0.4)
+        srtt = 0.875*0.2 + 0.125*0.4
+        rttvar = 0.75*0.1 + 0.25*0.2
+        self.assertAlmostEqual(self.si._command_timeout(REMOTE), srtt + 4*rttvar)
+
+    def test_floors(self):
+        self.si._update_rtt(DIRECT, 0.001)
+        self.assertEqual(self.si._command_timeout(DIRECT), SIReader.TIMEOUT_FLOOR_DIRECT)
+        self.si._update_rtt(REMOTE, 0.001)
+        self.assertEqual(self.si._command_timeout(REMOTE), SIReader.TIMEOUT_FLOOR_REMOTE)
+        key = (True, SIReader.C_ERASE_BACKUP)
+        self.si._update_rtt(key, 0.001)
+        self.assertEqual(self.si._command_timeout(key),
+                         SIReader.TIMEOUT_SLOW_COMMANDS[SIReader.C_ERASE_BACKUP])
+
+    def test_backoff(self):
+        self.si._update_rtt(DIRECT, 0.05)
+        timeout = self.si._command_timeout(DIRECT)
+        self.si._backoff_timeout(DIRECT)
+        self.assertAlmostEqual(self.si._command_timeout(DIRECT), 2*timeout)
+        for i in range(10):
+            self.si._backoff_timeout(DIRECT)
+        # Never longer than the timeout of the serial port
+        self.assertEqual(self.si._command_timeout(DIRECT), self.emu.timeout)
+        self.assertEqual(self.si._rtt_estimates[DIRECT][2], SIReader.TIMEOUT_BACKOFF_MAX)
+        # A reply ends the backoff
+        self.si._update_rtt(DIRECT, 0.05)
+        self.assertLess(self.si._command_timeout(DIRECT), 2*timeout)
+
+    def test_measured_per_command(self):
+        self.si.get_time()
+        self.si.beep()
+        self.assertIn(DIRECT, self.si._rtt_estimates)
+        self.assertIn((True, SIReader.C_BEEP), self.si._rtt_estimates)
+        self.assertLess(self.si._command_timeout(DIRECT), self.emu.timeout)
+
+
+class TestLateReply(unittest.TestCase):
+
+    def setUp(self):
+        self.emu = SIStationEmulator(mode=SIReader.M_CONTROL, autosend=False, latency=0.002)
+        self.si = SIReader(serial=self.emu, adaptive_timeout=True)
+        self.si.beep()
+        self.si.get_time()
+
+    def time_out(self, fn, latency=0.3):
+        """Call fn with the reply delayed beyond the adaptive timeout."""
+        self.emu.latency = latency
+        with self.assertRaises(SIReaderTimeout):
+            fn()
+        self.emu.latency = 0.002
+
+    def test_arrived_before_next_command(self):
+        self.time_out(self.si.beep)
+        systime.sleep(0.4)
+        self.assertGreater(self.emu.inWaiting(), 0)
+        for i in range(3):
+            self.si.beep()
+        self.assertIsInstance(self.si.get_time(), datetime)
+        self.assertEqual(self.emu.inWaiting(), 0)
+
+    def test_arrives_after_next_command(self):
+        self.time_out(self.si.beep, 0.15)
+        self.assertIsInstance(self.si.get_time(), datetime)
+        self.si.beep()
+        self.assertEqual(self.emu.inWaiting(), 0)
+
+    def test_retry(self):
+        # The retry takes the late reply, and its own reply is dropped later
+        self.time_out(self.si.beep, 0.15)
+        self.si.beep()
+        systime.sleep(0.1)
+        self.assertIsInstance(self.si.get_time(), datetime)
+        self.assertIsInstance(self.si.get_time(), datetime)
+        self.assertEqual(self.emu.inWaiting(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()